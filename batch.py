@@ -0,0 +1,173 @@
+import os
+import time
+import sqlite3
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="run headless matches on every core and sum up the results")
+    parser.add_argument("chars", nargs=2, metavar="CHAR", help="the characters for player 1 and player 2")
+    parser.add_argument("--policies", nargs=2, default=["random", "random"], choices=["idle", "random", "rush", "easy", "normal", "hard"], metavar="POLICY", help="what plays player 1 and player 2: idle, random or rush, or the cpu at easy, normal or hard")
+    parser.add_argument("--matches", type=int, default=100, help="number of matches to run")
+    parser.add_argument("--frames", type=int, default=3600, help="frame limit for each match")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the first match, each later match uses the next one")
+    parser.add_argument("--tick-rate", type=int, default=60, metavar="HZ", help="updates the matches run a second")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of processes to run matches in, one per core by default")
+    parser.add_argument("--db", metavar="FILE", help="also add every match to an sqlite database")
+    parser.add_argument("--quiet", action="store_true", help="only print the summary")
+    return parser.parse_args()
+
+
+# compiles any sprite sheets missing from the cache before the workers start, so they all only read them
+def warm_cache():
+    os.environ["BLEACH_HEADLESS"] = "1"
+    from data import Loader, Tools
+    Loader.load_all()
+    for char in Tools.CHARS.values():
+        Tools.GFX[char.ART]  # a character's sheets are only read, or compiled, when its art is first built
+
+
+# runs once in each worker process. data is imported here because the headless flag has to be set before
+# pygame starts up, and importing Headless loads every character, so that only happens once per worker.
+# a character's sheets are read when its first match starts and kept for the next ones within budget
+def start_worker(tick_rate):
+    os.environ["BLEACH_HEADLESS"] = "1"
+    from data import Headless, Tools
+    Tools.set_tick_rate(tick_rate)
+
+
+def play(match, chars, policies, seed, frames):
+    from data import Headless, Cpu
+
+    script = Headless.policy_script(policies, seed)
+    cpu = {num: policy for num, policy in enumerate(policies, 1) if policy in Cpu.LEVELS}
+    result = Headless.HeadlessMatch(chars, script, max_frames=frames, cpu=cpu).run()
+    result["match"] = match
+    result["seed"] = seed
+    return result
+
+
+# a win rate, damage and combo tally for each player slot plus the length and cost of the matches
+class Summary:
+    def __init__(self, chars, policies):
+        self.chars = chars
+        self.policies = policies
+        self.matches = 0
+        self.draws = 0
+        self.frames = 0
+        self.seconds = 0.0
+        self.wins = [0] * len(chars)
+        self.damage = [0] * len(chars)
+        self.max_combo = [0] * len(chars)
+        self.best_combo = [0] * len(chars)
+
+    def add(self, result):
+        self.matches += 1
+        self.frames += result["frames"]
+        self.seconds += result["seconds"]
+        # a match that hits the frame limit has no winners
+        if not result["winners"]:
+            self.draws += 1
+        for num in result["winners"]:
+            self.wins[num - 1] += 1
+        for i in range(len(self.chars)):
+            self.damage[i] += result["damage"][i]
+            self.max_combo[i] += result["max_combo"][i]
+            self.best_combo[i] = max(self.best_combo[i], result["max_combo"][i])
+
+    def table(self):
+        matches = max(self.matches, 1)
+        lines = ["%-8s %-12s %-8s %6s %6s %10s %10s %10s" % (
+            "player", "char", "policy", "wins", "win %", "avg dmg", "avg combo", "best combo")]
+        for i, (char, policy) in enumerate(zip(self.chars, self.policies)):
+            lines.append("%-8d %-12s %-8s %6d %6.1f %10.1f %10.2f %10d" % (
+                i + 1, char, policy, self.wins[i], 100 * self.wins[i] / matches, self.damage[i] / matches,
+                self.max_combo[i] / matches, self.best_combo[i]))
+        lines.append("%d matches, %d hit the frame limit, %.0f frames on average" % (
+            self.matches, self.draws, self.frames / matches))
+        lines.append("%.3f ms per frame, %d frames simulated in %.2f cpu seconds" % (
+            1000 * self.seconds / max(self.frames, 1), self.frames, self.seconds))
+        return "\n".join(lines)
+
+
+# one row per match and one per player in each match, under a run so several batches can share a file
+class Database:
+    def __init__(self, path):
+        self.con = sqlite3.connect(path)
+        self.con.executescript('''
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY, started TEXT, chars TEXT, policies TEXT, frame_limit INTEGER);
+            CREATE TABLE IF NOT EXISTS matches (
+                run INTEGER, match INTEGER, seed INTEGER, frames INTEGER, winners TEXT, ms_per_frame REAL);
+            CREATE TABLE IF NOT EXISTS players (
+                run INTEGER, match INTEGER, num INTEGER, char TEXT, policy TEXT, hp INTEGER, damage INTEGER,
+                max_combo INTEGER, win INTEGER);
+        ''')
+        self.run = None
+        self.chars = None
+        self.policies = None
+
+    def start_run(self, chars, policies, frames):
+        self.chars = chars
+        self.policies = policies
+        cursor = self.con.execute("INSERT INTO runs (started, chars, policies, frame_limit) VALUES (?, ?, ?, ?)",
+                                  (time.strftime("%Y-%m-%d %H:%M:%S"), " ".join(chars), " ".join(policies), frames))
+        self.run = cursor.lastrowid
+
+    def add(self, result):
+        self.con.execute("INSERT INTO matches VALUES (?, ?, ?, ?, ?, ?)", (
+            self.run, result["match"], result["seed"], result["frames"],
+            " ".join(str(num) for num in result["winners"]), 1000 * result["seconds"] / max(result["frames"], 1)))
+        self.con.executemany("INSERT INTO players VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", [
+            (self.run, result["match"], num, char, policy, result["hp"][num - 1], result["damage"][num - 1],
+             result["max_combo"][num - 1], num in result["winners"])
+            for num, (char, policy) in enumerate(zip(self.chars, self.policies), 1)])
+
+    def close(self):
+        self.con.commit()
+        self.con.close()
+
+
+# matches are handed out to the workers one at a time and their results are printed as they finish, so a
+# long batch shows progress and a slow match doesn't hold the rest up
+def main(args):
+    summary = Summary(args.chars, args.policies)
+    database = None
+    if args.db:
+        database = Database(args.db)
+        database.start_run(args.chars, args.policies, args.frames)
+
+    warm_cache()
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=start_worker,
+                                 initargs=(args.tick_rate,)) as pool:
+            futures = [pool.submit(play, i + 1, args.chars, args.policies, args.seed + i, args.frames)
+                       for i in range(args.matches)]
+            for future in as_completed(futures):
+                result = future.result()
+                summary.add(result)
+                if database is not None:
+                    database.add(result)
+                if not args.quiet:
+                    winners = ", ".join(str(num) for num in result["winners"]) or "none"
+                    print("match %d: winner %s, %d frames, damage %s, max combo %s, %.3f ms per frame" % (
+                        result["match"], winners, result["frames"], result["damage"], result["max_combo"],
+                        1000 * result["seconds"] / max(result["frames"], 1)))
+    except BrokenProcessPool:
+        # a worker died without a python error to pass back, like being killed or crashing in pygame
+        raise SystemExit("a worker process died after %d of %d matches, the batch was stopped" % (
+            summary.matches, args.matches))
+    finally:
+        if database is not None:
+            database.close()
+    elapsed = time.perf_counter() - start
+
+    print(summary.table())
+    print("%.2fs on %d workers, %.0f simulated fps" % (elapsed, args.workers, summary.frames / elapsed))
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -1,14 +1,198 @@
+import os
+import argparse
+
 import pygame as pg
 
-from data import Main
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="BLEACH: VS ULTIMATE")
+    parser.add_argument("--replay", metavar="FILE", help="open a recorded match in the replay viewer")
+    parser.add_argument("--headless", action="store_true", help="run scripted matches with no window and report simulated fps")
+    parser.add_argument("--latency", type=float, metavar="SECONDS", help="fight for SECONDS while a key is pressed on a timer and report input latency. add --headless to run without a window")
+    parser.add_argument("--check-memory", type=float, nargs="?", const=0, metavar="MB", help="go through the menus and a fight with no window and check the graphics still in memory stay under the budget, or MB if given")
+    parser.add_argument("--chars", nargs="+", default=["dangai", "dangai"], metavar="CHAR", help="characters for headless and latency runs, one for each of 2 to 4 players")
+    parser.add_argument("--teams", nargs="+", type=int, metavar="TEAM", help="team of each player in --chars, e.g. 1 2 1 2 for 2v2. everyone is on their own team by default")
+    parser.add_argument("--cpu", choices=["easy", "normal", "hard"], metavar="LEVEL", help="level of the cpu in VS CPU from the main menu: easy, normal or hard. headless and latency runs hand player 2 to it")
+    parser.add_argument("--matches", type=int, default=1, help="number of headless matches to run")
+    parser.add_argument("--frames", type=int, default=3600, help="frame limit for each headless match")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the first headless match script")
+    parser.add_argument("--tick-rate", type=int, default=60, metavar="HZ", help="updates the game runs a second, e.g. 120. it plays at the same speed at any rate. replays play at the rate they were recorded at and a netplay guest takes the host's")
+    parser.add_argument("--host", type=int, nargs="?", const=7420, metavar="PORT", help="wait for an online opponent on PORT. the first of --chars is your character")
+    parser.add_argument("--join", metavar="HOST[:PORT]", help="fight an opponent hosting on HOST")
+    parser.add_argument("--net-delay", type=float, default=0, metavar="MS", help="hold every packet sent back by MS to try netplay on one machine")
+    parser.add_argument("--net-jitter", type=float, default=0, metavar="MS", help="hold every packet sent back by up to MS more, at random")
+    parser.add_argument("--net-loss", type=float, default=0, metavar="FRACTION", help="drop this fraction of the packets sent")
+    return parser.parse_args()
+
+
+def cpu_players(args):
+    '''the players the cpu plays in headless and latency runs'''
+    return {2: args.cpu} if args.cpu else None
 
 
 # simple function that runs the main game loop
-def main():
+def main(args):
+    from data import Main, Tools
+
+    Tools.set_tick_rate(args.tick_rate)
+    if args.replay:
+        from data import Replay
+        try:
+            replay = Replay.Replay.load(args.replay)
+        except (OSError, ValueError) as e:
+            raise SystemExit("can't open replay %s: %s" % (args.replay, e))
+        Tools.set_tick_rate(round(1000 / replay.step))
+
+    game = Main.GameEngine()
+    if args.replay:
+        game.run("REPLAYVIEWER", {"REPLAY": args.replay})
+    elif args.cpu:
+        game.run("TITLESCREEN", {"CPU_LEVEL": args.cpu})
+    else:
+        game.run()
+    pg.quit()
+
+
+# runs matches from a random script as fast as possible. data is imported here rather than at the
+# top of the file because the headless flag has to be set before pygame starts up
+def headless(args):
+    os.environ["BLEACH_HEADLESS"] = "1"
+    from data import Headless, Tools
+
+    Tools.set_tick_rate(args.tick_rate)
+    total_frames = 0
+    total_seconds = 0.0
+    for i in range(args.matches):
+        script = Headless.random_script(args.seed + i, players=len(args.chars))
+        match = Headless.HeadlessMatch(args.chars, script, max_frames=args.frames, teams=args.teams, cpu=cpu_players(args))
+        result = match.run()
+        total_frames += result["frames"]
+        total_seconds += result["seconds"]
+        winners = ", ".join(str(num) for num in result["winners"]) or "none"
+        print("match %d: winner %s, %d frames, hp %s, %.0f fps" % (i + 1, winners, result["frames"], result["hp"], result["fps"]))
+
+    print("%d frames in %.2fs, %.0f simulated fps" % (total_frames, total_seconds, total_frames / total_seconds))
+    pg.quit()
+
+
+# runs the real game loop in a fight while player 1's light attack is pressed on a timer
+def latency(args):
+    if args.headless:
+        os.environ["BLEACH_HEADLESS"] = "1"
+    from data import Main, Tools, Loader
+
+    Tools.set_tick_rate(args.tick_rate)
+    Loader.load_all()
     game = Main.GameEngine()
-    game.run()
+    light = next(key for key, name in Tools.PLAYER1_CONTROLS.items() if name == "LIGHT")
+    game.latency.start_probe(light)
+    pg.time.set_timer(pg.QUIT, round(args.latency * 1000), 1)
+    game.run("GAMESTATE", {"CHARS": [Tools.CHARS[name] for name in args.chars], "TEAMS": args.teams, "CPU": cpu_players(args)})
+    game.latency.stop_probe()
+    print(game.latency.summary())
+    pg.quit()
+    if game.latency.probes and not game.latency.probe_hits:
+        # nothing measured went through the input the fight reads, so the numbers above mean nothing
+        raise SystemExit("none of the %d probe presses showed up in player 1's buttons" % game.latency.probes)
+
+
+# goes from the title screen through the menus, a fight with a pause and the end screen, drawing each state,
+# then checks that the graphics GFX decoded and are still in memory fit the budget. a state that keeps an
+# evicted asset shows up as leaked. only the pinned assets of the states still on the stack, and the
+# characters held for the run, may take it over a budget smaller than they are
+def check_memory(args):
+    os.environ["BLEACH_HEADLESS"] = "1"
+    import gc
+    from data import Main, Tools, Headless
+
+    Tools.set_tick_rate(args.tick_rate)
+    if args.check_memory:
+        Tools.GFX.budget = round(args.check_memory * 1024 * 1024)
+        Tools.GFX.evict()
+    manager = Main.StateManager("TITLESCREEN", {})
+    manager.get_state("GAMESTATE").record_replays = False
+    script = Headless.ScriptedInput(Headless.policy_script(["rush", "idle"], args.seed))
+    route = [("switch", "MAINMENU", {}), ("switch", "CHARSELECT", {}),
+             ("switch", "GAMESTATE", {"CHARS": [Tools.CHARS[name] for name in args.chars[:2]], "TEAMS": None, "CPU": None,
+                                         "EXIT_NOSAVE": False}),
+             ("push", "PAUSEMENU", None), ("pop", 1, None), ("switch", "ENDSCREEN", None), ("switch", "STATSMENU", {}),
+             ("switch", "MAINMENU", {})]
+    current_time = 0.0
+    for action, name, persist in route:
+        if action == "pop":
+            manager.pop(name, current_time)
+        else:
+            if persist is not None:
+                manager.peek().persist.update(persist)
+            getattr(manager, action)(name, current_time)
+        state = manager.peek()
+        state.wrap = None
+        if name == "GAMESTATE":
+            frame = 0
+            while not state.end_game and frame < args.frames:
+                keys, events = script.poll(frame, state)
+                for event in events:
+                    state.get_event(event)
+                current_time += Tools.STEP
+                state.update(Tools.SCREEN, keys, current_time, Tools.STEP)
+                frame += 1
+        state.render(Tools.SCREEN, 1.0)
+
+    gc.collect()
+    registry = Tools.GFX
+    budget = registry.budget
+    mib = 1024 * 1024
+    print("gfx budget %.1fMB, %.1fMB resident, %.1fMB of it pinned, %.1fMB evicted but still kept" % (
+        budget / mib, registry.resident_bytes / mib, registry.pinned_bytes() / mib, registry.leaked_bytes / mib))
+    pg.quit()
+    if registry.leaked_bytes:
+        raise SystemExit("evicted graphics still in memory: " + ", ".join(registry.dropped))
+    art = [key for key in registry.pins if key.endswith("/art")]
+    if art:
+        raise SystemExit("character art still pinned after the match: " + ", ".join(art))
+    if registry.resident_bytes > max(budget, registry.pinned_bytes()):
+        raise SystemExit("resident graphics are over the budget")
+
+
+# plays a two player match against another copy of the game over udp. with --headless both sides play a
+# random script in real time with no window and report how much rollback the match needed
+def netplay(args):
+    if args.headless:
+        os.environ["BLEACH_HEADLESS"] = "1"
+    from data import Main, Tools, Loader, Netplay
+
+    Tools.set_tick_rate(args.tick_rate)
+    Loader.load_all()
+    link = Netplay.make_link(args.host or 0, args.net_delay, args.net_jitter, args.net_loss)
+    if args.host is not None:
+        print("waiting for an opponent on port %d" % args.host)
+        connection = Netplay.host(link, args.chars[0], Tools.STEP)
+    else:
+        address, _, port = args.join.partition(":")
+        connection = Netplay.join(link, (address, int(port or Netplay.DEFAULT_PORT)), args.chars[0])
+        Tools.set_tick_rate(round(1000 / connection["STEP"]))
+
+    if args.headless:
+        from data import Headless
+        result = Headless.NetplayMatch(connection, Headless.random_script(args.seed, players=1), args.frames).run()
+        print("%d updates, %d confirmed in %.1fs, hp %s" % (result["frames"], result["confirmed"], result["seconds"], result["hp"]))
+        print("%d rollbacks resimulating %d updates, %d waits" % (result["rollbacks"], result["resimulated"], result["waits"]))
+        print("%d checksums compared, %s" % (result["checks"], "no desync" if result["desync"] is None else "desync at update %d" % result["desync"]))
+    else:
+        game = Main.GameEngine()
+        game.run("NETGAME", {"NET": connection})
     pg.quit()
 
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    if args.host is not None or args.join:
+        netplay(args)
+    elif args.check_memory is not None:
+        check_memory(args)
+    elif args.latency:
+        latency(args)
+    elif args.headless:
+        headless(args)
+    else:
+        main(args)
@@ -0,0 +1,193 @@
+import time
+
+from . import Tools
+
+
+# what each difficulty is allowed. budget is how many microseconds the cpu may spend thinking each frame,
+# lookahead how many ms of the match it plays each choice forward for and reaction how many ms it sticks with
+# a choice before thinking again. easy never looks ahead and only goes by its rules
+LEVELS = {
+    "easy": {"budget": 0, "lookahead": 0, "reaction": 200},
+    "normal": {"budget": 1000, "lookahead": 133, "reaction": 67},
+    "hard": {"budget": 4000, "lookahead": 200, "reaction": 17},
+}
+
+CLOSE = 110  # how near an opponent has to be, in pixels between positions, for a light attack to reach them
+FAR = 400  # further than this the cpu dashes in rather than walking
+
+# counts the frames the engine renders, see new_frame. None when nothing is rendered, like a headless run,
+# and then every update gets a budget of its own
+FRAME = None
+
+
+def new_frame():
+    '''called by the engine once per rendered frame, before its updates. when it is catching up it runs several
+    updates in one frame, and they share one budget so a hard cpu can't spend its budget on each of them'''
+    global FRAME
+    FRAME = 0 if FRAME is None else FRAME + 1
+
+
+# drives a player in place of its keyboard. GameState.read_input asks it for a button mask every update
+# like it would a Tools.Buttons. its rules always give an answer straight away, then while there is budget
+# left it plays the match forward from a snapshot for each possible choice, best first, and keeps the one
+# that comes out ahead. when the budget runs out it goes with the best choice found so far
+class Controller:
+    def __init__(self, state, player, level="normal", budget=None, step=None):
+        '''budget in microseconds overrides the one the level gives. step is the length of an update in ms,
+        Tools.STEP if not given'''
+        settings = LEVELS[level]
+        self.state = state
+        self.player = player
+        self.level = level
+        self.budget = settings["budget"] if budget is None else budget
+        self.step = Tools.STEP if step is None else step
+        self.lookahead = round(settings["lookahead"] / self.step)  # in updates
+        self.reaction = max(1, round(settings["reaction"] / self.step))
+        self.held = 0
+        self.wait = 0
+        self.frame = None  # the frame "left" was handed out for
+        self.left = 0  # nanoseconds of the budget still unspent this frame
+        self.cost = 0  # nanoseconds the last choice took to play forward, to tell if another one fits
+        self.undo = 0  # nanoseconds the last restore took, kept free so a choice cut short can still be undone
+        self.tick = 0  # nanoseconds the last update played forward took, to tell if another one fits
+        self.thinks = 0
+        self.searched = 0  # choices played forward, over every update
+        self.overruns = 0  # updates where thinking went over what was left of the budget
+
+    def pack(self, keys):
+        '''the mask of buttons the cpu holds this update. "keys" is ignored'''
+        if self.wait > 0:
+            self.wait -= 1
+        else:
+            self.held = self.think()
+            self.wait = self.reaction - 1
+        return self.held
+
+    def target(self):
+        '''the nearest opponent still standing'''
+        targets = [other for other in self.state.fighters if other.team != self.player.team and other.hp > 0]
+        if not targets:
+            return None
+        return min(targets, key=lambda other: abs(other.pos.x - self.player.pos.x))
+
+    def choices(self):
+        '''every mask worth trying this update, with the one the rules pick first'''
+        target = self.target()
+        if target is None:
+            return [0]
+        gap = target.pos.x - self.player.pos.x
+        toward = Tools.BTN_RIGHT if gap > 0 else Tools.BTN_LEFT
+        away = Tools.BTN_LEFT if gap > 0 else Tools.BTN_RIGHT
+        # light only starts an attack on the update it goes down, so it is let go for one in between
+        light = Tools.BTN_LIGHT if not self.held & Tools.BTN_LIGHT else 0
+
+        if abs(gap) <= CLOSE:
+            if target.is_attack() and not self.player.is_attack():
+                rule = Tools.BTN_DOWN
+            elif target.is_guard():
+                rule = away
+            else:
+                rule = light
+        elif target.is_aerial() or target.is_hit() or target.is_knocked():
+            # waits for them to come down or get up
+            rule = 0
+        elif abs(gap) > FAR:
+            rule = toward | Tools.BTN_DASH
+        else:
+            rule = toward
+
+        choices = [rule]
+        for mask in (light, toward, away, Tools.BTN_DOWN, 0, toward | Tools.BTN_DASH, Tools.BTN_JUMP):
+            if mask not in choices:
+                choices.append(mask)
+        return choices
+
+    def allowance(self):
+        '''nanoseconds the cpu may think for on this update, the whole budget unless it is sharing one frame's
+        budget with updates before it'''
+        if FRAME is None:
+            return self.budget * 1000
+        if self.frame != FRAME:
+            self.frame = FRAME
+            self.left = self.budget * 1000
+        return self.left
+
+    def think(self):
+        start = time.perf_counter_ns()
+        allowance = self.allowance()
+        deadline = start + allowance
+        choices = self.choices()
+        self.thinks += 1
+        if self.lookahead and allowance and len(choices) > 1 and not self.state.end_game:
+            choice = self.search(choices, deadline)
+        else:
+            choice = choices[0]
+        end = time.perf_counter_ns()
+        if end > deadline and allowance:
+            self.overruns += 1
+        self.left = max(0, allowance - (end - start))
+        return choice
+
+    def search(self, choices, deadline):
+        '''plays each choice forward from where the match is now, with everyone else holding what they hold now,
+        and returns the best one that could be played out in full before the deadline'''
+        state = self.state
+        snapshot = state.snapshot()
+        me = state.fighters.index(self.player)
+        inputs = [player.buttons.held for player in state.fighters]
+        best = choices[0]
+        best_score = None
+        for mask in choices:
+            begin = time.perf_counter_ns()
+            if begin + self.cost > deadline:
+                break
+            inputs[me] = mask
+            current_time = state.current_time
+            finished = True
+            for _ in range(self.lookahead):
+                tick = time.perf_counter_ns()
+                if tick + self.tick + self.undo > deadline:
+                    finished = False
+                    break
+                current_time += self.step
+                state.step(inputs, current_time, self.step)
+                self.tick = time.perf_counter_ns() - tick
+                if state.end_game:
+                    break
+            score = self.score(snapshot)
+            undo = time.perf_counter_ns()
+            state.restore(snapshot)
+            end = time.perf_counter_ns()
+            self.undo = end - undo
+            self.cost = end - begin
+            if not finished:
+                break
+            self.searched += 1
+            if best_score is None or score > best_score:
+                best = mask
+                best_score = score
+        return best
+
+    def score(self, snapshot):
+        '''how much better off the cpu is than at the snapshot. getting hit counts for more than hitting, and
+        being further away breaks ties so it closes in when nothing lands either way'''
+        score = 0
+        for player, before in zip(self.state.fighters, snapshot["players"]):
+            lost = before["char"]["hp"] - player.hp
+            if player is self.player:
+                score -= 1.5 * lost
+            elif player.team != self.player.team:
+                score += lost
+        target = self.target()
+        if target is not None:
+            score -= abs(target.pos.x - self.player.pos.x) / 1000
+        return score
+
+    def stats(self):
+        return {
+            "level": self.level,
+            "budget": self.budget,
+            "thinks": self.thinks,
+            "searched": self.searched,
+            "overruns": self.overruns,
+        }
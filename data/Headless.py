@@ -0,0 +1,195 @@
+import time
+import random
+
+import pygame as pg
+
+from . import Tools
+from . import Loader
+from . import Cpu
+from .game_states import GameState, NetGame
+
+Loader.load_all()  # nothing is drawn, so there is no point loading in the background
+
+
+# buttons a script is allowed to hold. pause is left out so a script never stalls a match
+SCRIPT_BUTTONS = ("LEFT", "RIGHT", "UP", "DOWN", "LIGHT", "DASH", "JUMP")
+
+
+def random_script(seed=0, hold=12, players=2):
+    '''returns a script where each player picks a random set of buttons and holds it for "hold" frames.
+    the same seed always produces the same match'''
+    rng = random.Random(seed)
+    keymaps = [{val: key for key, val in controls.items()} for controls in Tools.CONTROLS[:players]]
+    held = [set() for _ in keymaps]
+
+    def script(frame, state):
+        if frame % hold == 0:
+            for i, keys in enumerate(keymaps):
+                held[i] = {keys[name] for name in rng.sample(SCRIPT_BUTTONS, rng.randint(0, 2))}
+        return set().union(*held)
+
+    return script
+
+
+# policies play a single player. each is made from the player's number and a seed and returns a callable
+# taking (frame, state) and returning the names of the buttons that player holds on that frame
+def idle_policy(num, seed):
+    '''stands still, a punching bag for checking damage and combos'''
+    return lambda frame, state: ()
+
+
+def random_policy(num, seed, hold=12):
+    '''holds a random set of buttons for "hold" frames at a time, like random_script does for everyone'''
+    rng = random.Random(seed * Tools.MAX_PLAYERS + num)
+    held = ()
+
+    def policy(frame, state):
+        nonlocal held
+        if frame % hold == 0:
+            held = rng.sample(SCRIPT_BUTTONS, rng.randint(0, 2))
+        return held
+
+    return policy
+
+
+def rush_policy(num, seed, reach=100):
+    '''walks at the nearest opponent still standing and taps light once in reach of them. the seed picks
+    when in its rhythm the taps fall, so two rushing players don't always swing on the same frame'''
+    offset = random.Random(seed * Tools.MAX_PLAYERS + num).randrange(10)
+
+    def policy(frame, state):
+        player = state.fighters[num - 1]
+        targets = [other for other in state.fighters if other.team != player.team and other.hp > 0]
+        if not targets:
+            return ()
+        target = min(targets, key=lambda other: abs(other.pos.x - player.pos.x))
+        gap = target.pos.x - player.pos.x
+        if abs(gap) > reach:
+            return ("RIGHT",) if gap > 0 else ("LEFT",)
+        # let go every few frames so each tap is a new press
+        return ("LIGHT",) if (frame + offset) % 10 < 5 else ()
+
+    return policy
+
+
+POLICIES = {
+    "idle": idle_policy,
+    "random": random_policy,
+    "rush": rush_policy,
+}
+
+
+def policy_script(policies, seed=0):
+    '''returns a script where player n is played by the policy named policies[n - 1]. a policy can also be a
+    cpu level from Cpu.LEVELS, which the script leaves alone since the match hands that player to the cpu'''
+    keymaps = [{val: key for key, val in controls.items()} for controls in Tools.CONTROLS[:len(policies)]]
+    players = [idle_policy(num, seed) if name in Cpu.LEVELS else POLICIES[name](num, seed)
+               for num, name in enumerate(policies, 1)]
+
+    def script(frame, state):
+        keys = set()
+        for policy, keys_of in zip(players, keymaps):
+            keys.update(keys_of[name] for name in policy(frame, state))
+        return keys
+
+    return script
+
+
+# turns a script into the keys and events a state would normally get from the main event loop
+class ScriptedInput:
+    def __init__(self, script):
+        '''script is a callable taking (frame, state) and returning the key codes held on that frame'''
+        self.script = script
+        self.keys = Tools.KeyState()
+
+    def poll(self, frame, state):
+        '''returns the held keys for this frame plus KEYDOWN/KEYUP events for any that changed'''
+        pressed = frozenset(self.script(frame, state))
+        events = [pg.event.Event(pg.KEYDOWN, key=key) for key in pressed - self.keys]
+        events += [pg.event.Event(pg.KEYUP, key=key) for key in self.keys - pressed]
+        self.keys = Tools.KeyState(pressed)
+        return self.keys, events
+
+
+# runs a single match as fast as the cpu allows with no rendering, display flips or frame cap
+class HeadlessMatch:
+    def __init__(self, chars, script, max_frames=3600, record=False, teams=None, cpu=None):
+        '''cpu maps the number of each player the cpu plays to its level'''
+        self.chars = [Tools.CHARS[name] for name in chars]
+        self.teams = teams
+        self.cpu = cpu
+        self.input = ScriptedInput(script)
+        self.step = Tools.STEP
+        self.max_frames = max_frames
+        self.state = GameState()
+        self.state.record_replays = record
+        self.frame = 0
+        self.current_time = 0.0
+
+    def start(self):
+        self.state.startup({"CHARS": self.chars, "TEAMS": self.teams, "CPU": self.cpu}, self.current_time)
+        self.state.wrap = None  # skip the fade in, nothing is watching
+
+    def step_frame(self):
+        '''advances the match by one fixed update'''
+        keys, events = self.input.poll(self.frame, self.state)
+        for event in events:
+            self.state.get_event(event)
+        self.state.suspend = False
+        self.current_time += self.step
+        self.state.update(Tools.SCREEN, keys, self.current_time, self.step)
+        self.frame += 1
+
+    def run(self):
+        self.start()
+        start = time.perf_counter()
+        while not self.state.end_game and self.frame < self.max_frames:
+            self.step_frame()
+        elapsed = time.perf_counter() - start
+
+        result = {
+            "winners": [player.num for player in self.state.winners],
+            "frames": self.frame,
+            "hp": tuple(player.hp for player in self.state.fighters),
+            "damage": tuple(player.damage for player in self.state.fighters),
+            "max_combo": tuple(player.max_combo for player in self.state.fighters),
+            "seconds": elapsed,
+            "fps": self.frame / elapsed if elapsed else 0.0,
+        }
+        self.state.persist["EXIT_NOSAVE"] = True
+        self.state.cleanup()
+        return result
+
+
+# plays one side of a netplay match from a script with no window. unlike HeadlessMatch it runs in real time,
+# since how much rollback is needed depends on how fast input arrives from the other side
+class NetplayMatch:
+    def __init__(self, connection, script, max_frames=3600):
+        self.input = ScriptedInput(script)
+        self.step = connection["STEP"]
+        self.max_frames = max_frames
+        self.state = NetGame()
+        self.state.startup({"NET": connection}, 0.0)
+        self.state.wrap = None
+        self.frame = 0
+
+    def run(self):
+        session = self.state.session
+        start = time.perf_counter()
+        current_time = 0.0
+        while session.frame < self.max_frames and self.state.over_time is None and not session.disconnected:
+            keys, _ = self.input.poll(self.frame, self.state)
+            current_time += self.step
+            self.state.update(Tools.SCREEN, keys, current_time, self.step)
+            self.frame += 1
+            delay = start + current_time / 1000 - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        session.finish()
+
+        result = session.stats()
+        result["hp"] = tuple(player.hp for player in self.state.fighters)
+        result["seconds"] = time.perf_counter() - start
+        self.state.persist["EXIT_NOSAVE"] = True
+        self.state.cleanup()
+        return result
@@ -0,0 +1,139 @@
+import time
+import collections
+
+import pygame as pg
+
+from . import Tools
+from .Profiler import percentile
+
+
+# the key state sampled from the keyboard with the probe key held down on top of it, so the probe reaches
+# GameState.read_input through the same Buttons.pack a real press does
+class ProbedKeys:
+    def __init__(self, keys, key):
+        self.keys = keys
+        self.key = key
+
+    def __getitem__(self, key):
+        return key == self.key or self.keys[key]
+
+
+# measures input latency: the time from a key press arriving to the display update that first shows an
+# update whose button mask for that player has the pressed button set. real key events are stamped when
+# they are pulled off the queue, so time they spent waiting in it is not counted. probe presses are
+# scheduled ahead, so for them it is. presses of keys that are not a player's controls aren't measured
+class LatencyMonitor:
+    def __init__(self, size=600, timeout=1000):
+        self.samples = collections.deque(maxlen=size)  # (ms, frames) for each press
+        self.frame = 0
+        self.timeout = timeout * 1000000  # presses no update picks up within this many ms are given up on
+        self.pending = []  # (stamp ns, frame, player number, button bit) of presses no update has picked up yet
+        self.handled = []  # (stamp ns, frame) of presses an update has picked up that are not on screen yet
+        self.missed = 0
+        self.buttons = {key: (num, Tools.BUTTON_BITS[name])
+                        for num, controls in enumerate(Tools.CONTROLS, 1) for key, name in controls.items()}
+        self.probe_key = None
+        self.probe_interval = 0
+        self.probe_next = 0
+        self.probe = None  # the probe press being held, until an update picks it up
+        self.probe_release = False
+        self.probes = 0
+        self.probe_hits = 0
+
+    def start_probe(self, key, interval=97):
+        '''presses "key", one of a player's controls, every "interval" ms so the measurement runs with nobody
+        at the keyboard. a press is held in the sampled key state from the first pump after its time, as if it
+        sat in the queue, until an update picks it up. the interval should not be a multiple of the frame time
+        or every press lands at the same point of the frame'''
+        self.probe_key = key
+        self.probe_interval = interval * 1000000
+        self.probe_next = time.perf_counter_ns() + self.probe_interval
+
+    def stop_probe(self):
+        self.probe_key = None
+        self.probe = None
+
+    def key_event(self, kind):
+        return pg.event.Event(kind, key=self.probe_key, mod=0, scancode=0, unicode="")
+
+    def stamp(self, events):
+        '''stamps the key presses in a frame's events and presses the probe key if it is due. the probe
+        is let go on the frame after an update picks it up'''
+        now = time.perf_counter_ns()
+        for event in events:
+            if event.type == pg.KEYDOWN and event.key in self.buttons:
+                self.pending.append((now, self.frame, *self.buttons[event.key]))
+
+        if self.probe_release:
+            events = [self.key_event(pg.KEYUP)] + events
+            self.probe_release = False
+        if self.probe_key is not None and self.probe is None and self.probe_next <= now:
+            self.probe = (self.probe_next, self.frame, *self.buttons[self.probe_key])
+            self.pending.append(self.probe)
+            self.probes += 1
+            events = events + [self.key_event(pg.KEYDOWN)]
+            # a press still held when the next one is due is not pressed again
+            while self.probe_next <= now:
+                self.probe_next += self.probe_interval
+        return events
+
+    def keys(self, keys):
+        '''the key state the updates of this frame read, with the probe key held if a probe press is'''
+        if self.probe is not None:
+            return ProbedKeys(keys, self.probe_key)
+        return keys
+
+    def updated(self, state):
+        '''called after every simulation update. a press is picked up by the first update after which its
+        player's button mask has its button set. presses made outside a fight are not measured'''
+        fighters = getattr(state, "fighters", None)
+        now = time.perf_counter_ns()
+        pending = []
+        for press in self.pending:
+            stamp, frame, num, bit = press
+            if not fighters or num > len(fighters):
+                pass
+            elif fighters[num - 1].buttons.held & bit:
+                self.handled.append((stamp, frame))
+                if press is self.probe:
+                    self.probe_hits += 1
+            elif now - stamp > self.timeout:
+                self.missed += 1
+            else:
+                pending.append(press)
+                continue
+            if press is self.probe:
+                self.probe = None
+                self.probe_release = True
+        self.pending = pending
+
+    def displayed(self):
+        '''called straight after the display update of every frame'''
+        now = time.perf_counter_ns()
+        for stamp, frame in self.handled:
+            self.samples.append(((now - stamp) / 1e6, self.frame - frame))
+        self.handled = []
+        self.frame += 1
+
+    def report(self):
+        '''returns {"presses", "ms": (p50, p99, max), "frames": (p50, p99, max)}, or None with no samples'''
+        if not self.samples:
+            return None
+        ms = sorted(sample[0] for sample in self.samples)
+        frames = sorted(sample[1] for sample in self.samples)
+        return {
+            "presses": len(self.samples),
+            "ms": (percentile(ms, 50), percentile(ms, 99), ms[-1]),
+            "frames": (percentile(frames, 50), percentile(frames, 99), frames[-1]),
+        }
+
+    def summary(self):
+        report = self.report()
+        if report is None:
+            line = "input latency: no presses measured"
+        else:
+            line = "input latency over %d presses  p50 %.1fms  p99 %.1fms  max %.1fms  (%d / %d / %d frames waited)" % (
+                report["presses"], *report["ms"], *report["frames"])
+        if self.missed:
+            line += "\n%d presses never reached their player's buttons" % self.missed
+        return line
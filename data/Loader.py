@@ -0,0 +1,124 @@
+import os
+import time
+import queue
+import concurrent.futures
+
+import pygame as pg
+
+from . import Tools
+
+IMAGE_TYPES = (".png",)
+
+_loaded = False
+
+
+def loaded():
+    '''whether CHARS in Tools has been filled'''
+    return _loaded
+
+
+def load_all():
+    '''loads everything on the spot. used when there is no loading screen, e.g. headless runs'''
+    if not _loaded:
+        loader = AssetLoader()
+        loader.start()
+        loader.pump()
+
+
+def image_files(directory):
+    '''every image below "directory" as (folder, name, path)'''
+    files = []
+    for folder, _, names in os.walk(directory):
+        for filename in names:
+            name, ext = os.path.splitext(filename)
+            if not filename.startswith(".") and ext.lower() in IMAGE_TYPES:
+                files.append((folder, name, os.path.join(folder, filename)))
+    return files
+
+
+# loads the game's assets on worker threads while the main thread keeps drawing and pumping events.
+# workers only read and decode files. surfaces are converted to the display format and stored on the main
+# thread in pump(), and the character modules are imported there too once their images are decoded.
+# GFX and SFX would decode anything on first use anyway, this only gets ahead of it while within budget
+class AssetLoader:
+    def __init__(self, workers=4):
+        self.workers = workers
+        self.results = queue.SimpleQueue()
+        self.total = 0
+        self.handled = 0
+        self.chars = []
+
+    @property
+    def progress(self):
+        '''fraction of the work done, from 0 to 1'''
+        return self.handled / self.total if self.total else 1.0
+
+    @property
+    def done(self):
+        return self.handled == self.total
+
+    def start(self):
+        jobs = []
+        for key, path in Tools.GFX.paths.items():
+            if not Tools.GFX.resident(key):
+                jobs.append((self.store_gfx, key, pg.image.load, path))
+        self.chars = Tools.char_names(Tools.CHARS_FOLDER)
+        for char in self.chars:
+            for _, _, path in image_files(os.path.join(Tools.CHARS_FOLDER, char)):
+                # sprite sheets, the images with an atlas xml, come from their compiled copy instead
+                if not os.path.exists(os.path.splitext(path)[0] + ".xml"):
+                    jobs.append((self.store_decoded, os.path.normpath(path), pg.image.load, path))
+        for key, path in Tools.SFX.paths.items():
+            if not Tools.SFX.resident(key):
+                jobs.append((self.store_sfx, key, pg.mixer.Sound, path))
+
+        self.total = len(jobs) + len(self.chars)
+        executor = concurrent.futures.ThreadPoolExecutor(self.workers, thread_name_prefix="loader")
+        for job in jobs:
+            executor.submit(self.run_job, *job)
+        executor.shutdown(wait=False)
+
+    def run_job(self, store, key, load, path):
+        '''runs on a worker thread. errors are passed back so they are raised on the main thread'''
+        try:
+            result = load(path)
+        except Exception as error:
+            result = error
+        self.results.put((store, key, result))
+
+    def store_gfx(self, key, img):
+        if not (Tools.GFX.full or Tools.GFX.resident(key)):
+            Tools.GFX.put(key, Tools.convert_image(img))
+
+    def store_decoded(self, key, img):
+        Tools.DECODED[key] = img
+
+    def store_sfx(self, key, sound):
+        if not (Tools.SFX.full or Tools.SFX.resident(key)):
+            Tools.SFX.put(key, sound)
+
+    def pump(self, budget=None):
+        '''handles finished work on the main thread for up to "budget" ms, or until everything is loaded
+        when budget is None. the characters are imported last so their images are already decoded'''
+        global _loaded
+        start = time.perf_counter()
+        while not self.done:
+            if budget is not None and (time.perf_counter() - start) * 1000 >= budget:
+                break
+            if self.handled < self.total - len(self.chars):
+                try:
+                    store, key, result = self.results.get(block=budget is None)
+                except queue.Empty:
+                    break
+                if isinstance(result, Exception):
+                    raise result
+                store(key, result)
+            else:
+                name = self.chars.pop(0)
+                Tools.CHARS[name] = Tools.import_char(name)
+            self.handled += 1
+
+        if self.done:
+            Tools.DECODED.clear()
+            _loaded = True
+        return self.done
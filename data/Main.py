@@ -9,45 +9,80 @@ import pygame as pg
 import sgc
 
 from . import Tools
+from . import Profiler
+from . import Latency
+from . import Loader
+from . import Cpu
 from . import game_states
 
 
 class StateManager:
-    def __init__(self):
+    def __init__(self, start="TITLESCREEN", persistent=None):
+        self.factories = {}
         self.state_dict = {}
         self.states = []
-        self.setup_states()
+        self.setup_states(start, persistent)
 
-    def setup_states(self):
+    def setup_states(self, start, persistent):
+        '''registers every state class as a factory. states are only built the first time they are needed.
+        the first state is only started up when it is given persistent data'''
         for name, obj in inspect.getmembers(game_states, inspect.isclass):
             if issubclass(obj, Tools.State):
-                self.state_dict[name.upper()] = obj()
-
-        self.states.append(self.state_dict["TITLESCREEN"])
+                self.factories[name.upper()] = obj
+
+        self.enter(start)
+        if persistent is not None:
+            self.peek().startup(persistent, 0.0)
+
+    def get_state(self, name):
+        if name not in self.state_dict:
+            self.state_dict[name] = self.factories[name]()
+        return self.state_dict[name]
+
+    def enter(self, name):
+        '''puts a state on top of the stack. the graphics it lists stay loaded until it leaves'''
+        state = self.get_state(name)
+        Tools.GFX.pin(*state.assets)
+        self.states.append(state)
+
+    def leave(self):
+        state = self.states.pop()
+        Tools.GFX.unpin(*state.assets)
+        return state
+
+    def prewarm(self):
+        '''builds one state the current state can move to next so the switch does not stall.
+        returns False when there is nothing left to build'''
+        state = self.peek()
+        for name in (state.next_state, state.higher_state):
+            if name in self.factories and name not in self.state_dict:
+                self.get_state(name)
+                return True
+        return False
 
     def clear(self):
         while len(self.states) > 0:
             self.peek().cleanup()
-            self.states.pop()
+            self.leave()
 
     def switch(self, name, current_time):
         persistent = self.peek().cleanup()
         if len(self.states) > 0:
-            old_state = self.states.pop().__class__.__name__.upper()
-        self.states.append(self.state_dict[name])
+            old_state = self.leave().__class__.__name__.upper()
+        self.enter(name)
         self.peek().prev_state = old_state
         self.peek().startup(persistent, current_time)
 
     def push(self, name, current_time):
         persistent = self.peek().pause()
-        self.states.append(self.state_dict[name])
+        self.enter(name)
         self.peek().startup(persistent, current_time)
 
     def pop(self, amount, current_time):
 
         for _ in range(amount):
             persistent = self.peek().cleanup()
-            old_state = self.states.pop().__class__.__name__.upper()
+            old_state = self.leave().__class__.__name__.upper()
         
         self.peek().prev_state = old_state
         self.peek().resume(persistent, current_time)
@@ -57,30 +92,40 @@ class StateManager:
 
 
 class GameEngine:
-    def __init__(self):
+    def __init__(self, fps=60):
+        '''the simulation runs at Tools.TICK_RATE, which is set before the engine is made. fps only caps how often
+        it is drawn'''
         self.done = False
         self.screen = pg.display.get_surface()
         self.clock = pg.time.Clock()
-        self.fps = 60
+        self.fps = fps  # cap on rendered frames per second, 0 for uncapped
+        self.step = Tools.STEP  # length of one simulation update in ms
+        self.max_frame_time = 250  # longest frame that is caught up on before time is dropped
+        self.prewarm = True  # build upcoming states in frames that finish with time to spare
         self.current_time = 0.0
         self.keys = pg.key.get_pressed()
+        self.profiler = Profiler.FrameProfiler()
+        self.latency = Latency.LatencyMonitor()
+        self.profiler.latency = self.latency
     
     @property
     def state(self):
         return self.manager.peek()
 
     def event_loop(self):
-        for event in pg.event.get():
+        '''pumps the event queue once and samples the held keys straight after, right before the updates run'''
+        for event in self.latency.stamp(pg.event.get()):
             sgc.event(event)
             if event.type == pg.QUIT:
                 self.done = True
 
-            self.keys = pg.key.get_pressed()
-
+            self.profiler.get_event(event)
             self.state.get_event(event)
 
+        self.keys = self.latency.keys(pg.key.get_pressed())
+
     def update(self, dt):
-        self.current_time = pg.time.get_ticks()
+        self.current_time += dt
         if self.state.quit:
             self.done = True
         elif self.state.done:
@@ -91,15 +136,49 @@ class GameEngine:
             self.pop(self.state.pop_amount, self.current_time)
         self.state.update(self.screen, self.keys, self.current_time, dt)
 
-    def run(self):
-        self.manager = StateManager()
-        # main loop for game
+    def run(self, start="TITLESCREEN", persistent=None):
+        if not Loader.loaded():
+            # the loading screen goes on to "start" once the assets are in
+            persistent = {"START": start, "PERSIST": persistent}
+            start = "LOADINGSCREEN"
+        self.manager = StateManager(start, persistent)
+        accumulator = 0.0
+        # main loop for game. the simulation is stepped in fixed updates of self.step ms and
+        # rendered once per loop, so a long frame runs extra updates instead of slowing the match
         while not self.done:
-            delta_time = self.clock.tick(self.fps)
+            self.profiler.begin_frame(self.state.__class__.__name__)
+            frame_time = self.clock.tick(self.fps)
+            frame_start = pg.time.get_ticks()
+            accumulator += min(frame_time, self.max_frame_time)
+            self.profiler.mark("tick")
             self.event_loop()
-            self.update(delta_time)
-            sgc.update(delta_time)
-            pg.display.update()
+            self.profiler.mark("event_loop")
+            Cpu.new_frame()
+            while accumulator >= self.step and not self.done:
+                self.update(self.step)
+                self.latency.updated(self.state)
+                accumulator -= self.step
+            self.profiler.mark("update")
+            rects = self.state.render(self.screen, min(accumulator / self.step, 1.0))
+            self.profiler.mark("render")
+            sgc.update(frame_time)
+            self.profiler.mark("sgc")
+            overlay = self.profiler.draw(self.screen)
+            if overlay is not None:
+                self.state.invalidate(overlay)
+                if rects is not None:
+                    rects.append(overlay)
+            self.profiler.mark("overlay")
+            if rects is None:
+                pg.display.update()
+            else:
+                pg.display.update(rects)
+            self.latency.displayed()
+            self.profiler.mark("display")
+            if self.prewarm and pg.time.get_ticks() - frame_start < self.step / 2:
+                self.manager.prewarm()
+            self.profiler.mark("prewarm")
+            self.profiler.end_frame()
 
     def __getattr__(self, name):
         return getattr(self.manager, name)
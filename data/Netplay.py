@@ -0,0 +1,382 @@
+import time
+import heapq
+import zlib
+import random
+import socket
+import struct
+
+DEFAULT_PORT = 7420
+INPUT_DELAY = 2  # updates the local input is held back by. hides that much latency with no rollback at all
+MAX_ROLLBACK = 8  # furthest back a misprediction is corrected. the local side waits rather than run further ahead
+CHECKSUM_INTERVAL = 30  # confirmed updates between desync checks
+TIMESYNC_INTERVAL = 10  # fewest updates between two waits taken to let a peer that is behind catch up
+MAX_RESEND = 64  # most unacknowledged inputs carried by one packet
+HANDSHAKE_RESEND = 100  # ms between handshake packets
+TIMEOUT = 5000  # ms without hearing from the peer before the match is dropped
+
+MAGIC = b"BLNP"
+PROTOCOL = 1
+HELLO, WELCOME, INPUTS, QUIT = range(4)
+
+# packet layouts, little endian. every packet starts with MAGIC and its kind (u8)
+#   HELLO: protocol (u8), name length (u8), guest character name
+#   WELCOME: protocol (u8), step ms (f64), input delay (u8), then the host and guest character names as in HELLO
+#   INPUTS: first frame (u32), last frame received from the peer (i32), frame advantage (i8),
+#           checksum frame (i32), checksum (u32), mask count (u8), then a u16 button mask for each frame from first
+#   QUIT: nothing else
+INPUTS_HEADER = struct.Struct("<IibiIB")
+
+
+def now():
+    return time.monotonic() * 1000
+
+
+def checksum(snapshot):
+    '''crc of a state snapshot. repr is used rather than pickle so two processes holding equal values
+    always produce the same bytes'''
+    return zlib.crc32(repr(snapshot).encode())
+
+
+def pack_name(name):
+    data = name.encode()
+    return struct.pack("<B", len(data)) + data
+
+
+def unpack_name(data, offset):
+    '''returns the name at "offset" and the offset after it'''
+    length = data[offset]
+    return data[offset + 1:offset + 1 + length].decode(), offset + 1 + length
+
+
+# a non-blocking udp socket that talks to a single peer
+class Link:
+    def __init__(self, port=0, host=""):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.setblocking(False)
+        self.peer = None
+
+    def send(self, data, address=None):
+        try:
+            self.sock.sendto(data, address or self.peer)
+        except OSError:
+            pass  # a full buffer or unreachable peer is the same as a lost packet
+
+    def receive(self):
+        '''every datagram waiting on the socket as (data, address)'''
+        packets = []
+        while True:
+            try:
+                packets.append(self.sock.recvfrom(2048))
+            except BlockingIOError:
+                return packets
+            except ConnectionResetError:
+                continue  # windows reports an earlier send that bounced here
+
+    def close(self):
+        self.sock.close()
+
+
+# wraps a Link and holds every outgoing packet back by "delay" ms plus up to "jitter" more, dropping "loss" of
+# them. lets two processes on one machine play as if they were on a bad connection
+class LossyLink:
+    def __init__(self, link, delay=0, jitter=0, loss=0.0, seed=None):
+        self.link = link
+        self.delay = delay
+        self.jitter = jitter
+        self.loss = loss
+        self.rng = random.Random(seed)
+        self.queue = []
+        self.count = 0
+
+    @property
+    def peer(self):
+        return self.link.peer
+
+    @peer.setter
+    def peer(self, address):
+        self.link.peer = address
+
+    def send(self, data, address=None):
+        if self.rng.random() < self.loss:
+            return
+        due = now() + self.delay + self.rng.uniform(0, self.jitter)
+        self.count += 1
+        heapq.heappush(self.queue, (due, self.count, data, address or self.peer))
+        self.flush()
+
+    def flush(self):
+        '''sends the held back packets that are due'''
+        current = now()
+        while self.queue and self.queue[0][0] <= current:
+            _, _, data, address = heapq.heappop(self.queue)
+            self.link.send(data, address)
+
+    def receive(self):
+        self.flush()
+        return self.link.receive()
+
+    def close(self):
+        self.link.close()
+
+    def __getattr__(self, name):
+        return getattr(self.link, name)
+
+
+def make_link(port=0, delay=0, jitter=0, loss=0.0, seed=None):
+    '''a Link on "port", wrapped in a LossyLink when any latency or loss is asked for'''
+    link = Link(port)
+    if delay or jitter or loss:
+        link = LossyLink(link, delay, jitter, loss, seed)
+    return link
+
+
+def host(link, char, step, delay=INPUT_DELAY, timeout=None):
+    '''waits for a guest to say hello and welcomes it. the host is player 1. returns the connection
+    details RollbackSession and the NETGAME state take'''
+    start = now()
+    while timeout is None or now() - start < timeout:
+        for data, address in link.receive():
+            if data[:5] == MAGIC + bytes([HELLO]) and data[5] == PROTOCOL:
+                guest, _ = unpack_name(data, 6)
+                link.peer = address
+                welcome = MAGIC + struct.pack("<BBdB", WELCOME, PROTOCOL, step, delay) + pack_name(char) + pack_name(guest)
+                link.send(welcome)
+                return {"LINK": link, "LOCAL": 0, "CHARS": [char, guest], "STEP": step, "DELAY": delay, "WELCOME": welcome}
+        time.sleep(0.001)
+    raise TimeoutError("no one joined")
+
+
+def join(link, address, char, timeout=TIMEOUT):
+    '''says hello to a host at "address" until it answers. the guest is player 2 and takes the host's
+    update length and input delay'''
+    link.peer = address
+    hello = MAGIC + struct.pack("<BB", HELLO, PROTOCOL) + pack_name(char)
+    start = now()
+    last_sent = None
+    while now() - start < timeout:
+        if last_sent is None or now() - last_sent >= HANDSHAKE_RESEND:
+            link.send(hello)
+            last_sent = now()
+        for data, reply in link.receive():
+            if data[:5] == MAGIC + bytes([WELCOME]):
+                link.peer = reply  # the address the host answers from, with any host name resolved
+                protocol, step, delay = struct.unpack_from("<BdB", data, 5)
+                if protocol != PROTOCOL:
+                    raise ValueError("host runs netplay protocol %d, this is %d" % (protocol, PROTOCOL))
+                host_char, offset = unpack_name(data, 15)
+                guest_char, _ = unpack_name(data, offset)
+                return {"LINK": link, "LOCAL": 1, "CHARS": [host_char, guest_char], "STEP": step, "DELAY": delay, "WELCOME": None}
+        time.sleep(0.001)
+    raise TimeoutError("no answer from %s:%d" % address)
+
+
+# runs a two player fight over a link with rollback. both sides simulate every update straight away, using
+# the last input heard from the peer as the guess for any update its input hasn't arrived for yet. when the
+# real input turns out different the state is put back to the first wrong update and simulated forward again.
+# only button masks cross the network, and confirmed updates are compared by checksum to catch a desync
+class RollbackSession:
+    def __init__(self, state, connection, max_rollback=MAX_ROLLBACK):
+        self.state = state
+        self.link = connection["LINK"]
+        self.local = connection["LOCAL"]
+        self.remote = 1 - self.local
+        self.step = connection["STEP"]
+        self.delay = connection["DELAY"]
+        self.welcome = connection["WELCOME"]  # sent again if the guest missed it
+        self.max_rollback = max_rollback
+        self.frame = 0  # next update to simulate
+        # the first "delay" updates have no input on either side
+        self.inputs = [{frame: 0 for frame in range(self.delay)} for _ in range(2)]
+        self.local_frame = self.delay - 1  # last update given local input
+        self.remote_frame = self.delay - 1  # last update the peer's input is known for, with none missing before it
+        self.acked = -1  # last local input the peer has
+        self.predictions = {}  # update: peer input it was simulated with before the real one arrived
+        self.saved = {}  # update: snapshot of the state before it was simulated
+        self.remote_advantage = 0
+        self.last_wait = 0
+        self.checked = -1  # last update whose checksum was taken
+        self.local_check = (-1, 0)
+        self.checksums = {}
+        self.remote_checksums = {}
+        self.desync = None  # first update the two sides disagree on
+        self.disconnected = False
+        self.last_heard = now()
+        self.rollbacks = 0
+        self.resimulated = 0
+        self.waits = 0
+        self.checks = 0
+
+    @property
+    def confirmed(self):
+        '''last update simulated with both players' real input'''
+        return min(self.remote_frame, self.frame - 1)
+
+    def advance(self, held):
+        '''called once per update with the local player's button mask. simulates the next update unless the
+        session has to wait for the peer, and returns whether it did'''
+        self.poll()
+        if self.disconnected:
+            return False
+        if self.frame - self.remote_frame > self.max_rollback or self.time_sync():
+            self.waits += 1
+            self.send()
+            return False
+
+        self.local_frame += 1
+        self.inputs[self.local][self.local_frame] = held
+        self.send()
+        self.simulate(self.frame)
+        self.frame += 1
+        self.check()
+        return True
+
+    def poll(self):
+        '''reads the peer's packets and rolls back if they show a prediction was wrong'''
+        first_wrong = None
+        for data, address in self.link.receive():
+            if data[:4] != MAGIC or address != self.link.peer:
+                continue
+            self.last_heard = now()
+            kind = data[4]
+            if kind == INPUTS:
+                wrong = self.read_inputs(data)
+                if wrong is not None and (first_wrong is None or wrong < first_wrong):
+                    first_wrong = wrong
+            elif kind == HELLO and self.welcome is not None:
+                self.link.send(self.welcome)
+            elif kind == QUIT:
+                self.disconnected = True
+        if now() - self.last_heard > TIMEOUT:
+            self.disconnected = True
+
+        if first_wrong is not None:
+            self.rollback(first_wrong)
+        self.prune()
+
+    def read_inputs(self, data):
+        '''stores the peer's inputs from an INPUTS packet. returns the first update that was simulated with a
+        wrong guess, if any'''
+        first, ack, self.remote_advantage, check_frame, check, count = INPUTS_HEADER.unpack_from(data, 5)
+        self.acked = max(self.acked, ack)
+        if check_frame >= 0:
+            self.remote_checksums[check_frame] = check
+            self.compare(check_frame)
+
+        masks = struct.unpack_from("<%dH" % count, data, 5 + INPUTS_HEADER.size)
+        remote = self.inputs[self.remote]
+        wrong = None
+        for frame, mask in enumerate(masks, first):
+            if frame != self.remote_frame + 1:
+                continue  # already known, or a gap from a lost packet that a later one fills
+            remote[frame] = mask
+            self.remote_frame = frame
+            guess = self.predictions.pop(frame, None)
+            if guess is not None and guess != mask and wrong is None:
+                wrong = frame
+        return wrong
+
+    def send(self):
+        '''sends every local input the peer hasn't acknowledged, the latest checksum and the frame advantage'''
+        first = max(self.acked + 1, 0)
+        local = self.inputs[self.local]
+        masks = [local[frame] for frame in range(first, min(self.local_frame, first + MAX_RESEND - 1) + 1)]
+        advantage = max(-128, min(127, self.local_frame - self.remote_frame))
+        header = INPUTS_HEADER.pack(first, self.remote_frame, advantage, *self.local_check, len(masks))
+        self.link.send(MAGIC + bytes([INPUTS]) + header + struct.pack("<%dH" % len(masks), *masks))
+
+    def time_sync(self):
+        '''whether to skip this update so a peer that is running behind can catch up. each side compares how
+        far ahead of the other it thinks it is with what the other reports, and the one that is ahead waits'''
+        advantage = self.local_frame - self.remote_frame
+        if (advantage - self.remote_advantage) // 2 >= 1 and self.frame - self.last_wait >= TIMESYNC_INTERVAL:
+            self.last_wait = self.frame
+            return True
+        return False
+
+    def input_for(self, player, frame):
+        inputs = self.inputs[player]
+        if frame in inputs:
+            return inputs[frame]
+        # the peer is guessed to still be holding what it held last
+        guess = inputs.get(self.remote_frame, 0)
+        self.predictions[frame] = guess
+        return guess
+
+    def simulate(self, frame):
+        self.saved[frame] = self.state.snapshot()
+        inputs = [self.input_for(player, frame) for player in range(2)]
+        # match time comes from the update number so both sides see the same times
+        self.state.step(inputs, (frame + 1) * self.step, self.step)
+
+    def rollback(self, frame):
+        '''puts the state back to before "frame" and simulates up to the present again with the input now known'''
+        self.rollbacks += 1
+        self.resimulated += self.frame - frame
+        self.state.restore(self.saved[frame])
+        for old in range(frame, self.frame):
+            self.predictions.pop(old, None)
+            self.simulate(old)
+        self.check()
+
+    def check(self):
+        '''takes the checksum of every confirmed update due one. an update's saved snapshot is final once
+        every update before it is confirmed'''
+        last = min(self.remote_frame + 1, self.frame - 1)
+        frame = self.checked + 1
+        frame += -frame % CHECKSUM_INTERVAL
+        while frame <= last:
+            self.checksums[frame] = checksum(self.saved[frame])
+            self.local_check = (frame, self.checksums[frame])
+            self.compare(frame)
+            frame += CHECKSUM_INTERVAL
+        self.checked = max(self.checked, last)
+
+    def compare(self, frame):
+        if frame in self.checksums and frame in self.remote_checksums:
+            self.checks += 1
+            if self.checksums.pop(frame) != self.remote_checksums.pop(frame) and self.desync is None:
+                self.desync = frame
+                print("netplay desync at update %d" % frame)
+
+    def prune(self):
+        '''drops snapshots and input nothing can roll back to or resend any more'''
+        for frame in [frame for frame in self.saved if frame <= min(self.remote_frame, self.checked)]:
+            del self.saved[frame]
+        # anything from the first update that could still be simulated again is kept
+        oldest = min(self.remote_frame + 1, self.frame)
+        local = self.inputs[self.local]
+        for frame in [frame for frame in local if frame < oldest and frame <= self.acked]:
+            del local[frame]
+        remote = self.inputs[self.remote]
+        for frame in [frame for frame in remote if frame < min(oldest, self.remote_frame)]:
+            del remote[frame]
+
+    def finish(self, timeout=1000):
+        '''keeps sending until the peer has every local input or "timeout" ms pass, then says goodbye'''
+        start = now()
+        while self.acked < self.local_frame and not self.disconnected and now() - start < timeout:
+            self.poll()
+            self.send()
+            time.sleep(self.step / 1000)
+        self.close()
+
+    def close(self):
+        if not self.disconnected:
+            # straight past any LossyLink, there is nothing left to hold it back for
+            link = getattr(self.link, "link", self.link)
+            for _ in range(3):
+                link.send(MAGIC + bytes([QUIT]))
+        self.disconnected = True
+        self.link.close()
+
+    def stats(self):
+        return {
+            "frames": self.frame,
+            "confirmed": self.confirmed,
+            "rollbacks": self.rollbacks,
+            "resimulated": self.resimulated,
+            "waits": self.waits,
+            "checks": self.checks,
+            "desync": self.desync,
+        }
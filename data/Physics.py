@@ -0,0 +1,106 @@
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, without it the world moves its bodies one at a time
+    np = None
+
+# the fewest bodies the world moves with numpy. reading the bodies' vectors into the arrays and back costs
+# about as much as the loop itself, so the arrays only catch up at around this many bodies, far more than a
+# fight has
+ARRAY_BODIES = 128
+
+
+# moves every body in a fight once per update. actions only say how a body should move, by setting its
+# horizontal speed and turning its gravity on or off, and the world integrates all of them in one pass,
+# keeps them on the floor and inside the screen and tells each one whether it is standing on the floor.
+# a body is anything with pos, vel and acc vectors, a gravity flag, a grounded flag and a rect
+class World:
+    def __init__(self, floor, left, right):
+        self.floor = floor
+        self.left = left
+        self.right = right  # the right edge of a body's rect can't go past this
+        self.bodies = []
+        self.resize()
+
+    def add(self, body):
+        self.bodies.append(body)
+        body.grounded = body.pos.y >= self.floor
+        self.resize()
+
+    def remove(self, body):
+        self.bodies.remove(body)
+        self.resize()
+
+    def clear(self):
+        self.bodies = []
+        self.resize()
+
+    def resize(self):
+        '''one row per field with a column for every body, which the numpy step works on'''
+        if np is not None:
+            self.arrays = np.zeros((7, len(self.bodies)))
+
+    def step(self):
+        '''integrates every body over one update. a rising body has its velocity updated before its position
+        and a falling one the other way around, so a jump hangs at the top for an update before it falls.
+        both steps do the same sums in the same order, so they move the bodies exactly alike'''
+        if np is not None and len(self.bodies) >= ARRAY_BODIES:
+            self.step_arrays()
+        else:
+            self.step_bodies()
+
+    def step_bodies(self):
+        floor = self.floor
+        left = self.left
+        right = self.right
+        for body in self.bodies:
+            pos = body.pos
+            vel = body.vel
+            if body.gravity:
+                if vel.y < 0:
+                    vel.y += body.acc.y
+                    pos.y += vel.y
+                else:
+                    pos.y += vel.y
+                    vel.y += body.acc.y
+            pos.x += vel.x
+
+            if pos.x < left:
+                pos.x = left
+            elif pos.x > right - body.rect.w:
+                pos.x = right - body.rect.w
+
+            if pos.y >= floor:
+                pos.y = floor
+                if vel.y > 0:
+                    vel.y = 0
+                body.grounded = True
+            else:
+                body.grounded = False
+
+    def step_arrays(self):
+        bodies = self.bodies
+        # actions change the bodies' vectors, so they are read into the arrays here and written back after
+        arrays = self.arrays
+        arrays.T[:] = [(body.pos.x, body.pos.y, body.vel.x, body.vel.y, body.acc.y, body.rect.w, body.gravity)
+                       for body in bodies]
+        x, y, vx, vy, ay, width, gravity = arrays
+        gravity = gravity != 0
+        rising = gravity & (vy < 0)
+        np.add(y, vy, out=y, where=gravity & ~rising)
+        np.add(vy, ay, out=vy, where=gravity)
+        np.add(y, vy, out=y, where=rising)
+        x += vx
+
+        edge = self.right - width
+        x[:] = np.where(x < self.left, self.left, np.where(x > edge, edge, x))
+
+        grounded = y >= self.floor
+        y[grounded] = self.floor
+        vy[grounded & (vy > 0)] = 0
+
+        for body, body_x, body_y, body_vy, body_grounded in zip(bodies, x.tolist(), y.tolist(), vy.tolist(),
+                                                                 grounded.tolist()):
+            body.pos.x = body_x
+            body.pos.y = body_y
+            body.vel.y = body_vy
+            body.grounded = body_grounded
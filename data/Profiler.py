@@ -0,0 +1,126 @@
+import os
+import csv
+import time
+import datetime
+import collections
+
+import pygame as pg
+
+from . import Tools
+
+PROFILES_FOLDER = os.path.join(Tools.GAME_DIR, "profiles")
+
+# phases of GameEngine.run in the order they happen each frame
+PHASES = ("tick", "event_loop", "update", "render", "sgc", "overlay", "display", "prewarm")
+
+TOGGLE_KEY = pg.K_F3  # shows and hides the overlay
+EXPORT_KEY = pg.K_F4  # writes the ring buffer to a csv file
+
+
+def percentile(values, pct):
+    '''nearest rank percentile of an already sorted list'''
+    return values[min(len(values) - 1, round(pct / 100 * (len(values) - 1)))]
+
+
+# times each phase of every frame with perf_counter_ns and keeps the last "size" frames in a ring buffer
+class FrameProfiler:
+    def __init__(self, size=600, phases=PHASES):
+        self.phases = phases
+        self.frames = collections.deque(maxlen=size)
+        self.count = 0
+        self.visible = False
+        self.state = None
+        self.times = dict.fromkeys(self.phases, 0)
+        self.start = 0
+        self.last = 0
+        self.width = 420
+        self.graph_h = 100
+        self.refresh = 15  # the overlay is only re-rendered every few frames
+        self.built_at = None
+        self.overlay = None
+        self.latency = None  # a Latency.LatencyMonitor whose summary is shown under the phases
+        self.font = Tools.FONT.get("kenvector_future_thin", 14)
+
+    def get_event(self, event):
+        if event.type == pg.KEYDOWN:
+            if event.key == TOGGLE_KEY:
+                self.visible = not self.visible
+                self.built_at = None
+            elif event.key == EXPORT_KEY:
+                print("profile written to", self.export_csv())
+
+    def begin_frame(self, state):
+        self.state = state
+        for phase in self.phases:
+            self.times[phase] = 0
+        self.start = self.last = time.perf_counter_ns()
+
+    def mark(self, phase):
+        '''adds the time since the previous mark to "phase"'''
+        now = time.perf_counter_ns()
+        self.times[phase] += now - self.last
+        self.last = now
+
+    def end_frame(self):
+        self.frames.append((self.state, self.last - self.start, *(self.times[phase] for phase in self.phases)))
+        self.count += 1
+
+    def stats(self, state=None):
+        '''returns {column: (p50, p99, max)} in ms over the buffered frames, optionally only those of one state'''
+        rows = [row for row in self.frames if state is None or row[0] == state]
+        result = {}
+        if rows:
+            for i, name in enumerate(("frame",) + self.phases, 1):
+                values = sorted(row[i] for row in rows)
+                result[name] = tuple(v / 1e6 for v in (percentile(values, 50), percentile(values, 99), values[-1]))
+        return result
+
+    def build_overlay(self):
+        lines = ["%s  (%d frames)" % (self.state, len(self.frames)), "phase          p50     p99     max  ms"]
+        for name, (p50, p99, peak) in self.stats().items():
+            lines.append("%-12s %7.2f %7.2f %7.2f" % (name, p50, p99, peak))
+        state_stats = self.stats(self.state)
+        if state_stats:
+            lines.append("this state     %7.2f %7.2f %7.2f" % state_stats["frame"])
+        lines.append("text cache     %d hits  %d misses" % (Tools.TEXT.hits, Tools.TEXT.misses))
+        report = self.latency.report() if self.latency is not None else None
+        if report is not None:
+            lines.append("input latency  %7.2f %7.2f %7.2f" % report["ms"])
+
+        line_h = self.font.get_linesize()
+        self.overlay = pg.Surface((self.width, len(lines) * line_h + self.graph_h + 20)).convert_alpha()
+        self.overlay.fill((0, 0, 0, 180))
+        for i, line in enumerate(lines):
+            self.overlay.blit(self.font.render(line, True, Tools.SPACE_GREY), (10, 5 + i * line_h))
+
+        # frame time graph, scaled so the top of the graph is two 60 fps frames
+        top = len(lines) * line_h + 10
+        scale = self.graph_h / 33.3
+        budget_y = top + self.graph_h - round(16.7 * scale)
+        pg.draw.line(self.overlay, Tools.RED, (10, budget_y), (self.width - 10, budget_y))
+        totals = [row[1] / 1e6 for row in self.frames][-(self.width - 20):]
+        if len(totals) > 1:
+            points = [(10 + x, top + self.graph_h - min(self.graph_h, round(ms * scale))) for x, ms in enumerate(totals)]
+            pg.draw.lines(self.overlay, Tools.GREEN, False, points)
+        self.built_at = self.count
+
+    def draw(self, surface):
+        '''draws the overlay in the top left corner and returns the rect it covers, or None when hidden'''
+        if not (self.visible and self.frames):
+            return None
+        if self.built_at is None or self.count - self.built_at >= self.refresh:
+            self.build_overlay()
+        return surface.blit(self.overlay, (0, 0))
+
+    def export_csv(self, path=None):
+        if path is None:
+            os.makedirs(PROFILES_FOLDER, exist_ok=True)
+            name = datetime.datetime.now().strftime("profile_%Y%m%d_%H%M%S.csv")
+            path = os.path.join(PROFILES_FOLDER, name)
+
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(("state", "frame_ms") + tuple(phase + "_ms" for phase in self.phases))
+            for row in self.frames:
+                writer.writerow((row[0],) + tuple("%.3f" % (ns / 1e6) for ns in row[1:]))
+        return path
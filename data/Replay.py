@@ -0,0 +1,296 @@
+import os
+import io
+import zlib
+import struct
+import bisect
+import datetime
+
+
+from . import Tools
+
+REPLAYS_FOLDER = os.path.join(Tools.GAME_DIR, "replays")
+
+MAGIC = b"BLRP"
+VERSION = 10
+KEYFRAME_INTERVAL = 120  # frames between full state snapshots, the most that is re-simulated on a seek
+
+# replay file layout, all integers are unsigned LEB128 varints unless noted
+#   MAGIC, version (u8), step ms (f64), keyframe interval, player count, character names, teams
+#   frame count, input section length, input section
+#   keyframe count, then for each keyframe: frame, time (f64), blob length, zlib compressed snapshot
+# the input section is a list of runs: run length followed by each player's button mask XOR the previous frame's
+# a snapshot is written as tagged values, see write_value. replays are passed around to settle disputed matches,
+# so nothing in one is ever more than plain data and a file that doesn't parse is rejected with ValueError
+MAX_DEPTH = 16  # deepest nesting of containers a snapshot is allowed
+MAX_SNAPSHOT = 1 << 20  # most bytes a keyframe may decompress to, a 4 player snapshot is about 14KB
+
+
+def write_varint(out, num):
+    while True:
+        byte = num & 0x7F
+        num >>= 7
+        if num:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+
+def read_varint(stream):
+    num = 0
+    shift = 0
+    while True:
+        byte = stream.read(1)
+        if not byte:
+            raise ValueError("replay file is truncated")
+        num |= (byte[0] & 0x7F) << shift
+        if not byte[0] & 0x80:
+            return num
+        shift += 7
+        if shift > 63:
+            raise ValueError("replay file has a varint that is too long")
+
+
+def read_exact(stream, size):
+    data = stream.read(size)
+    if len(data) != size:
+        raise ValueError("replay file is truncated")
+    return data
+
+
+def write_value(out, value):
+    '''appends a snapshot value: None, a bool, int, float or str, or a list, tuple or str keyed dict of those.
+    each is a tag byte followed by its data, ints zigzag encoded so negative ones stay small'''
+    if value is None:
+        out += b"N"
+    elif value is True:
+        out += b"T"
+    elif value is False:
+        out += b"F"
+    elif type(value) is int:
+        out += b"i"
+        write_varint(out, value * 2 if value >= 0 else -value * 2 - 1)
+    elif type(value) is float:
+        out += b"f" + struct.pack("<d", value)
+    elif type(value) is str:
+        data = value.encode()
+        out += b"s"
+        write_varint(out, len(data))
+        out += data
+    elif type(value) in (list, tuple):
+        out += b"l" if type(value) is list else b"t"
+        write_varint(out, len(value))
+        for item in value:
+            write_value(out, item)
+    elif type(value) is dict:
+        out += b"d"
+        write_varint(out, len(value))
+        for key, item in value.items():
+            write_value(out, key)
+            write_value(out, item)
+    else:
+        raise TypeError("can't write %s in a replay snapshot" % type(value).__name__)
+
+
+def read_value(stream, depth=0):
+    '''reads back one value written by write_value. anything malformed raises ValueError'''
+    if depth > MAX_DEPTH:
+        raise ValueError("replay snapshot is nested too deeply")
+    tag = read_exact(stream, 1)
+    if tag == b"N":
+        return None
+    if tag == b"T":
+        return True
+    if tag == b"F":
+        return False
+    if tag == b"i":
+        num = read_varint(stream)
+        return num >> 1 if not num & 1 else -(num >> 1) - 1
+    if tag == b"f":
+        return struct.unpack("<d", read_exact(stream, 8))[0]
+    if tag == b"s":
+        return read_exact(stream, read_varint(stream)).decode()
+    if tag in (b"l", b"t"):
+        items = [read_value(stream, depth + 1) for _ in range(read_varint(stream))]
+        return items if tag == b"l" else tuple(items)
+    if tag == b"d":
+        value = {}
+        for _ in range(read_varint(stream)):
+            key = read_value(stream, depth + 1)
+            if type(key) is not str:
+                raise ValueError("replay snapshot has a key that is not a string")
+            value[key] = read_value(stream, depth + 1)
+        return value
+    raise ValueError("replay snapshot has an unknown tag %r" % tag)
+
+
+def encode_snapshot(snapshot):
+    out = bytearray()
+    write_value(out, snapshot)
+    return zlib.compress(bytes(out))
+
+
+def decode_snapshot(blob, players):
+    '''the snapshot in a keyframe blob, which has to be a whole one for "players" players'''
+    inflate = zlib.decompressobj()
+    try:
+        data = inflate.decompress(blob, MAX_SNAPSHOT)
+    except zlib.error:
+        raise ValueError("replay keyframe is not compressed data")
+    if inflate.unconsumed_tail or not inflate.eof:
+        raise ValueError("replay keyframe is too big or cut short")
+    stream = io.BytesIO(data)
+    snapshot = read_value(stream)
+    if stream.read(1):
+        raise ValueError("replay keyframe has data after its snapshot")
+    if (type(snapshot) is not dict or type(snapshot.get("players")) is not list or len(snapshot["players"]) != players
+            or not all(type(player) is dict for player in snapshot["players"])):
+        raise ValueError("replay keyframe is not a snapshot of the match")
+    return snapshot
+
+
+# collects a match's input and periodic state snapshots while it is played
+class Recorder:
+    def __init__(self, chars, teams, interval=KEYFRAME_INTERVAL):
+        self.chars = chars
+        self.teams = teams
+        self.step = None
+        self.interval = interval
+        self.masks = [[] for _ in chars]
+        self.keyframes = []
+        self.frame = 0
+        self.last_time = None
+
+    def record(self, inputs, state, current_time, delta_time):
+        '''called once per update before the state steps. a keyframe is also taken whenever the match
+        time jumps, e.g. after the pause menu, so playback can pick the time back up'''
+        if self.step is None:
+            self.step = delta_time
+        if self.frame % self.interval == 0 or current_time != self.last_time + self.step:
+            blob = encode_snapshot(state.snapshot())
+            self.keyframes.append((self.frame, current_time, blob))
+
+        for masks, mask in zip(self.masks, inputs):
+            masks.append(mask)
+        self.last_time = current_time
+        self.frame += 1
+
+    def encode(self):
+        out = bytearray(MAGIC)
+        out += struct.pack("<Bd", VERSION, self.step)
+        write_varint(out, self.interval)
+        write_varint(out, len(self.chars))
+        for name in self.chars:
+            write_varint(out, len(name))
+            out += name.encode()
+        for team in self.teams:
+            write_varint(out, team)
+
+        section = bytearray()
+        prev = [0] * len(self.masks)
+        frame = 0
+        while frame < self.frame:
+            current = [masks[frame] for masks in self.masks]
+            run = 1
+            while frame + run < self.frame and [masks[frame + run] for masks in self.masks] == current:
+                run += 1
+            write_varint(section, run)
+            for mask, old in zip(current, prev):
+                write_varint(section, mask ^ old)
+            prev = current
+            frame += run
+
+        write_varint(out, self.frame)
+        write_varint(out, len(section))
+        out += section
+
+        write_varint(out, len(self.keyframes))
+        for frame, current_time, blob in self.keyframes:
+            write_varint(out, frame)
+            out += struct.pack("<d", current_time)
+            write_varint(out, len(blob))
+            out += blob
+        return bytes(out)
+
+    def save(self, path=None):
+        if path is None:
+            os.makedirs(REPLAYS_FOLDER, exist_ok=True)
+            name = datetime.datetime.now().strftime("replay_%Y%m%d_%H%M%S.rpl")
+            path = os.path.join(REPLAYS_FOLDER, name)
+
+        with open(path, "wb") as f:
+            f.write(self.encode())
+        return path
+
+
+# a decoded replay file. input is expanded to per frame masks so any frame can be looked up directly.
+# every field is checked as it is read and each keyframe is decoded once up front, so a damaged or doctored
+# file is turned away with ValueError when it is opened rather than part way through watching it
+class Replay:
+    def __init__(self, data):
+        stream = io.BytesIO(data)
+        if stream.read(4) != MAGIC:
+            raise ValueError("not a replay file")
+        version, self.step = struct.unpack("<Bd", read_exact(stream, 9))
+        if version != VERSION:
+            raise ValueError("unsupported replay version %d" % version)
+        if not self.step > 0:
+            raise ValueError("replay has a bad update length")
+        self.interval = read_varint(stream)
+        players = read_varint(stream)
+        if not 2 <= players <= Tools.MAX_PLAYERS:
+            raise ValueError("replay has %d players" % players)
+        self.chars = []
+        for _ in range(players):
+            try:
+                self.chars.append(read_exact(stream, read_varint(stream)).decode())
+            except UnicodeDecodeError:
+                raise ValueError("replay has a bad character name")
+        self.teams = [read_varint(stream) for _ in self.chars]
+
+        self.frames = read_varint(stream)
+        size = read_varint(stream)
+        if size > len(data):
+            raise ValueError("replay file is truncated")
+        section = io.BytesIO(read_exact(stream, size))
+        self.masks = [[] for _ in self.chars]
+        prev = [0] * len(self.chars)
+        while len(self.masks[0]) < self.frames:
+            run = read_varint(section)
+            if not 0 < run <= self.frames - len(self.masks[0]):
+                raise ValueError("replay input runs past the end of the match")
+            prev = [p ^ read_varint(section) for p in prev]
+            for masks, mask in zip(self.masks, prev):
+                masks.extend([mask] * run)
+
+        self.keyframes = []
+        for _ in range(read_varint(stream)):
+            frame = read_varint(stream)
+            current_time, = struct.unpack("<d", read_exact(stream, 8))
+            size = read_varint(stream)
+            if size > len(data):
+                raise ValueError("replay file is truncated")
+            blob = read_exact(stream, size)
+            if frame > self.frames or (self.keyframes and frame < self.keyframes[-1][0]):
+                raise ValueError("replay keyframes are out of order")
+            decode_snapshot(blob, players)
+            self.keyframes.append((frame, current_time, blob))
+        if not self.keyframes or self.keyframes[0][0] != 0:
+            raise ValueError("replay has no keyframe at its start")
+        self.keyframe_frames = [frame for frame, _, _ in self.keyframes]
+        self.times = {frame: current_time for frame, current_time, _ in self.keyframes}
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls(f.read())
+
+    def keyframe_before(self, frame):
+        '''returns (frame, time, snapshot) of the last keyframe at or before "frame"'''
+        index = bisect.bisect_right(self.keyframe_frames, frame) - 1
+        key_frame, current_time, blob = self.keyframes[max(index, 0)]
+        return key_frame, current_time, decode_snapshot(blob, len(self.chars))
+
+    def input_at(self, frame):
+        '''every player's button mask on a frame'''
+        return [masks[frame] for masks in self.masks]
@@ -5,9 +5,24 @@ import pathlib
 import xml.etree.ElementTree as ET
 import sqlite3
 import importlib
+import hashlib
+import json
+import struct
+import tempfile
+import sys
+import collections
+import collections.abc
+import weakref
 import sgc
 import datetime
 
+# headless mode runs matches with no window or sound device, e.g. for balance checks on CI boxes.
+# must be set before pygame is initialised so SDL picks up the dummy drivers
+HEADLESS = os.environ.get("BLEACH_HEADLESS") == "1"
+if HEADLESS:
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
 pg.init()  # initiates pygame
 
 TITLE = "BLEACH VS ULTIMATE"
@@ -28,6 +43,9 @@ SPACE_GREY = (218, 218, 218)
 NICE_GREY = (69, 69, 69)
 PLAYER_1_BLUE = (0, 154, 255)
 PLAYER_2_PURPLE = (255, 81, 163)
+PLAYER_3_ORANGE = (255, 150, 30)
+PLAYER_4_GREEN = (70, 200, 90)
+PLAYER_COLOURS = [PLAYER_1_BLUE, PLAYER_2_PURPLE, PLAYER_3_ORANGE, PLAYER_4_GREEN]
 
 # dictionary of controls for each player
 PLAYER1_CONTROLS = {
@@ -58,7 +76,86 @@ PLAYER2_CONTROLS = {
     pg.K_KP0: "JUMP",
 }
 
-CONTROLS = [PLAYER1_CONTROLS, PLAYER2_CONTROLS]
+PLAYER3_CONTROLS = {
+    pg.K_f: "LEFT",
+    pg.K_h: "RIGHT",
+    pg.K_t: "UP",
+    pg.K_g: "DOWN",
+    pg.K_z: "LIGHT",
+    pg.K_x: "MEDIUM",
+    pg.K_c: "HEAVY",
+    pg.K_v: "DASH",
+    pg.K_b: "SPECIAL",
+    pg.K_TAB: "PAUSE",
+    pg.K_n: "JUMP",
+}
+
+PLAYER4_CONTROLS = {
+    pg.K_KP1: "LEFT",
+    pg.K_KP3: "RIGHT",
+    pg.K_KP5: "UP",
+    pg.K_KP2: "DOWN",
+    pg.K_7: "LIGHT",
+    pg.K_8: "MEDIUM",
+    pg.K_9: "HEAVY",
+    pg.K_0: "DASH",
+    pg.K_MINUS: "SPECIAL",
+    pg.K_EQUALS: "PAUSE",
+    pg.K_KP_ENTER: "JUMP",
+}
+
+CONTROLS = [PLAYER1_CONTROLS, PLAYER2_CONTROLS, PLAYER3_CONTROLS, PLAYER4_CONTROLS]
+MAX_PLAYERS = len(CONTROLS)
+
+# every logical button in a fixed order, used when input is packed into bits
+BUTTONS = ("LEFT", "RIGHT", "UP", "DOWN", "LIGHT", "MEDIUM", "HEAVY", "DASH", "SPECIAL", "PAUSE", "JUMP")
+BUTTON_BITS = {name: 1 << bit for bit, name in enumerate(BUTTONS)}
+BTN_LEFT = BUTTON_BITS["LEFT"]
+BTN_RIGHT = BUTTON_BITS["RIGHT"]
+BTN_UP = BUTTON_BITS["UP"]
+BTN_DOWN = BUTTON_BITS["DOWN"]
+BTN_LIGHT = BUTTON_BITS["LIGHT"]
+BTN_MEDIUM = BUTTON_BITS["MEDIUM"]
+BTN_HEAVY = BUTTON_BITS["HEAVY"]
+BTN_DASH = BUTTON_BITS["DASH"]
+BTN_SPECIAL = BUTTON_BITS["SPECIAL"]
+BTN_PAUSE = BUTTON_BITS["PAUSE"]
+BTN_JUMP = BUTTON_BITS["JUMP"]
+
+# the simulation runs this many fixed updates a second, see set_tick_rate. nothing moves or counts down by a
+# fixed amount each update: speeds are given a second and divided by TICK_RATE, and timers are in ms and
+# turned into updates with "updates", so the game plays at the same speed at any rate. always read these
+# through the module, they change when the rate is set
+TICK_RATE = 60
+STEP = 1000 / TICK_RATE  # length of one update in ms
+FADE_TIME = 117  # ms a fade between states takes
+FRAME_TIME = 17  # ms a frame of a character's timeline shows for when the timelines file doesn't say
+
+
+def set_tick_rate(rate):
+    '''makes the simulation run "rate" updates a second. characters' timelines are counted in updates when they
+    are loaded, so any already built are dropped to be built again at the new rate'''
+    global TICK_RATE, STEP
+    TICK_RATE = rate
+    STEP = 1000 / rate
+    for key in [key for key in GFX.loaders if key.endswith("/art")]:
+        GFX.discard(key)
+
+
+def updates(ms):
+    '''the whole number of updates that lasts closest to "ms", at least one for anything longer than nothing'''
+    return max(1, round(ms / STEP)) if ms > 0 else 0
+
+
+DIRTY_RECTS = True  # states that support it only redraw and push the parts of the screen that changed
+
+# bytes of decoded assets kept in memory before the least recently used are dropped. GFX counts the menu and
+# stage art and each character's sprite sheets, which are all decoded again when needed after being dropped,
+# and every character's thumbnail and portrait, which the menus show and are held for the whole run. surfaces
+# a state makes from these, like the scaled stage or the hud panels, are its own
+GFX_BUDGET = 64 * 1024 * 1024
+SFX_BUDGET = 32 * 1024 * 1024
+TEXT_CACHE_SIZE = 256  # rendered strings kept before the least recently used are dropped
 
 
 os.environ["SDL_VIDEO_CENTERED"] = "TRUE"
@@ -79,6 +176,13 @@ FONTS_FOLDER = os.path.join(ASSETS_FOLDER, "fonts")
 SFX_FOLDER = os.path.join(ASSETS_FOLDER, "sound")
 MUSIC_FOLDER = os.path.join(ASSETS_FOLDER, "music")
 DATABASE_FOLDER = os.path.join(ASSETS_FOLDER, "databases")
+SHEET_CACHE_FOLDER = os.path.join(GAME_DIR, "cache", "sheets")
+
+# compiled sprite sheet layout: SHEET_MAGIC, then SHEET_HEADER (version, pixel format, width, height,
+# frame table length), then the frame table as utf-8 json, then the raw pixels at 4 bytes each
+SHEET_MAGIC = b"BLSS"
+SHEET_HEADER = "<B4sHHI"
+SHEET_VERSION = 3
 
 # simply abbreviates the Vector2 class object from pygame for use as 2D vectors
 VEC = pg.math.Vector2
@@ -231,12 +335,22 @@ class State:
         self.prev_state = None
         self.persist = {}
         self.pop_amount = 1
-        self.bg = GFX["bg"]
-        self.logo = GFX["logo"]
+        self.bg_key = "bg"
+        self.assets = ["bg", "logo"]  # GFX keys kept in memory while the state is on the stack
         self.fade_ins = None
         self.fade_outs = None
+        self.wrap = None
         self._flags = {}
 
+    @property
+    def bg(self):
+        '''looked up every time rather than kept, so it is freed if it is evicted after the state leaves'''
+        return GFX[self.bg_key]
+
+    @property
+    def logo(self):
+        return GFX["logo"]
+
     def get_event(self, event):
         '''process events passed on from main event loop and carry out logic to be updated
         in update(). Must be overriden'''
@@ -244,21 +358,34 @@ class State:
 
     def update(self, surface, keys, current_time, delta_time):
         '''logic to update changes based on events. Main function that controls the state and called
-        every game tick. Must be overriden'''
+        every fixed game tick, possibly several times between rendered frames. Must be overriden'''
         pass
 
-    def draw(self):
+    def draw(self, surface):
         '''draw updated changes onto screen. Must be overriden if used'''
         pass
 
+    def render(self, surface, alpha):
+        '''called by the engine once per rendered frame. alpha is how far (0 to 1) the frame sits
+        between the last two updates. fade animations draw themselves so the state is skipped while one runs.
+        if draw returns a list of rects only those are pushed to the display, otherwise the whole screen is'''
+        if self.wrap is None:
+            return self.draw(surface)
+
+    def invalidate(self, rect):
+        '''marks an area of the screen drawn over by something other than the state so it is redrawn next frame.
+        only needed by states that return dirty rects from draw'''
+        pass
+
     def screen_fade_out(self):
         '''global animation used to fade between states. raises custom exception that the update
         method tests for and exits the state and switches. Ran last in the exiting animation queue'''
         temp_surf = pg.Surface(SCREEN_RECT.size).convert()
         temp_surf.fill(BLACK)
         temp_surf.set_alpha(0)
-        for i in range(7):
-            temp_surf.set_alpha(temp_surf.get_alpha() + 36)
+        steps = updates(FADE_TIME)
+        for i in range(steps):
+            temp_surf.set_alpha(252 * (i + 1) // steps)
             pg.display.get_surface().blit(self.bg, (0, 0))
             pg.display.get_surface().blit(temp_surf, (0, 0))
             yield
@@ -270,8 +397,9 @@ class State:
         temp_surf = pg.Surface(SCREEN_RECT.size).convert()
         temp_surf.fill(BLACK)
         temp_surf.set_alpha(252)
-        for i in range(7):
-            temp_surf.set_alpha(temp_surf.get_alpha() - 36)
+        steps = updates(FADE_TIME)
+        for i in range(steps):
+            temp_surf.set_alpha(252 - 252 * (i + 1) // steps)
             pg.display.get_surface().blit(self.bg, (0, 0))
             pg.display.get_surface().blit(temp_surf, (0, 0))
             yield
@@ -320,11 +448,205 @@ class State:
         self.resume_time = current_time
 
 
+# a state whose screen is a Layout of widgets built once, like a menu. the whole screen is only painted after
+# a fade or when the state comes back to the top, otherwise just the widgets that changed are redrawn
+class MenuState(State):
+    def __init__(self):
+        super().__init__()
+        self.ui = Layout()
+
+    def render(self, surface, alpha):
+        if self.wrap is not None:
+            # a fade is painting the screen so it all has to be put back once it ends
+            self.ui.invalidate()
+        return super().render(surface, alpha)
+
+    def draw(self, surface):
+        if self.ui.background is None:
+            # the first state is only started up when it is given persistent data
+            self.ui.background = self.bg
+        return self.ui.draw(surface)
+
+    def invalidate(self, rect):
+        self.ui.invalidate(rect)
+
+    def startup(self, persistent, current_time):
+        super().startup(persistent, current_time)
+        self.ui.background = self.bg
+        self.ui.invalidate()
+
+    def cleanup(self):
+        # the background is only pinned while the state is on the stack
+        self.ui.background = None
+        return super().cleanup()
+
+    def resume(self, persistent, current_time):
+        super().resume(persistent, current_time)
+        self.ui.invalidate()
+
+
+# a menu drawn over the state it was pushed on, like the pause menu. the screen it was pushed over is dimmed
+# once on startup and used as the background of its widgets
+class OverlayState(MenuState):
+    def __init__(self):
+        super().__init__()
+        self.dim = 50  # alpha of the black drawn over the screen underneath
+
+    def freeze(self):
+        '''dims a copy of what is on screen now into the background'''
+        background = pg.display.get_surface().copy()
+        shade = pg.Surface(background.get_size()).convert_alpha()
+        shade.fill((*BLACK, self.dim))
+        background.blit(shade, (0, 0))
+        self.ui.background = background
+        self.ui.invalidate()
+
+    def startup(self, persistent, current_time):
+        super().startup(persistent, current_time)
+        self.freeze()
+
+    def resume(self, persistent, current_time):
+        '''the background is not frozen again here. the state underneath doesn't run while this one is on top,
+        so the frozen copy still shows it, while the screen now holds whatever was pushed over this one'''
+        super().resume(persistent, current_time)
+
+
+# one player's logical buttons packed into an int with a bit from BUTTON_BITS for each. the raw key state is
+# packed once per update and the buttons that went down or up since the update before are kept as edges
+class Buttons:
+    def __init__(self, controls):
+        self.bits = tuple((key, BUTTON_BITS[name]) for key, name in controls.items())
+        self.held = 0
+        self.pressed = 0
+        self.released = 0
+
+    def pack(self, keys):
+        '''the mask of buttons held in "keys", pygame's key state or a KeyState'''
+        mask = 0
+        for key, bit in self.bits:
+            if keys[key]:
+                mask |= bit
+        return mask
+
+    def update(self, held):
+        self.pressed = held & ~self.held
+        self.released = self.held & ~held
+        self.held = held
+
+
+# stands in for the sequence returned by pg.key.get_pressed() when input comes from a script.
+# the held key codes are the set itself, so looking a key up stays in C when buttons are packed
+class KeyState(frozenset):
+    __getitem__ = frozenset.__contains__
+
+
+# base for the widgets the retained ui is built from. a widget renders its image when it is made or when what
+# it shows changes rather than every frame, and sets dirty when it does so the Layout it is in redraws it.
+# subclasses set rect to where the widget is on screen. draw returns the rect it covered
+class Widget:
+    def __init__(self):
+        self.image = None
+        self.show = True
+        self.dirty = True
+
+    def update(self):
+        '''called every update, widgets that animate change here'''
+        pass
+
+    def toggle(self):
+        self.show = not self.show
+
+    def draw(self, surface):
+        if self.show:
+            return surface.blit(self.image, self.rect)
+
+
+# the widgets of a state drawn in order over a background. the first draw, and any after invalidate() is
+# called without a rect, paints the whole screen. after that only the areas of widgets that changed, moved,
+# appeared or were hidden are put back from the background and redrawn with whatever overlaps them
+class Layout:
+    def __init__(self, background=None, widgets=()):
+        self.background = background
+        self.widgets = list(widgets)
+        self.drawn = {}  # the rect each widget covered when last drawn, None if it was hidden
+        self.invalid = []  # areas drawn over by something else since last frame
+        self.repaint = True
+
+    def add(self, *widgets):
+        self.widgets.extend(widgets)
+
+    def update(self):
+        for widget in self.widgets:
+            widget.update()
+
+    def invalidate(self, rect=None):
+        '''marks an area to be redrawn next frame, or the whole screen if no rect is given'''
+        if rect is None:
+            self.repaint = True
+        else:
+            self.invalid.append(pg.Rect(rect))
+
+    def changed(self):
+        '''the areas that have to be redrawn this frame. forgets what was drawn before'''
+        areas = self.invalid
+        self.invalid = []
+        for widget in self.widgets:
+            rect = pg.Rect(widget.rect) if widget.show else None
+            old = self.drawn.get(widget)
+            if widget.dirty or rect != old:
+                for area in (old, rect):
+                    if area is not None and area not in areas:
+                        areas.append(area)
+            self.drawn[widget] = rect
+            widget.dirty = False
+        return areas
+
+    def draw(self, surface):
+        '''returns the rects drawn in, or None if the whole screen was'''
+        if self.repaint or not DIRTY_RECTS:
+            self.changed()
+            self.repaint = False
+            surface.blit(self.background, (0, 0))
+            for widget in self.widgets:
+                widget.draw(surface)
+            return None
+
+        areas = self.changed()
+        for area in areas:
+            surface.set_clip(area)
+            surface.blit(self.background, area, area)
+            for widget in self.widgets:
+                if widget.show and widget.rect.colliderect(area):
+                    widget.draw(surface)
+        surface.set_clip(None)
+        return areas
+
+
+# a surface drawn where it is anchored, like a panel or a portrait. anchor is any keyword get_rect takes
+class Image(Widget):
+    def __init__(self, image, **anchor):
+        super().__init__()
+        self.anchor = anchor
+        self.rect = pg.Rect(0, 0, 0, 0)
+        self.set(image)
+
+    def set(self, image):
+        '''swaps in another surface at the same anchor. None hides the widget'''
+        if image is not self.image:
+            self.image = image
+            self.show = image is not None
+            if image is not None:
+                self.rect = image.get_rect(**self.anchor)
+            self.dirty = True
+
+
 # class that creates label objects used for on screen UI graphics
-class Label:
+class Label(Widget):
     def __init__(self, x, y, w, h, text, font, fg, bg=None, *, centred=False, show=True, blink=False):
+        super().__init__()
         self.alpha = 255
-        self.dalpha = 5
+        self.speed = 300 / TICK_RATE  # alpha the blink fades by each update, 300 a second
+        self.dalpha = self.speed
         self.x = x
         self.y = y
         self.w = w
@@ -338,56 +660,61 @@ class Label:
             bg = (0, 0, 0, 0)
         self.image.fill(bg)
         self.text.draw(self.image)
+        if self.centred:
+            self.rect = self.image.get_rect(center=(self.x, self.y))
+        else:
+            self.rect = self.image.get_rect(topleft=(self.x, self.y))
     
     def update(self):
         if self.blink:
             if self.alpha < 5:
-                self.dalpha = 5
+                self.dalpha = self.speed
             elif self.alpha > 250:
-                self.dalpha = -5
+                self.dalpha = -self.speed
 
             self.alpha += self.dalpha
             self.image.set_alpha(self.alpha)
-
-    def toggle(self):
-        self.show = not self.show
-
-    def draw(self, surface):
-        if self.show:
-            if self.centred:
-                rect = self.image.get_rect(center=(self.x, self.y))
-            else:
-                rect = (self.x, self.y)
-            surface.blit(self.image, rect)
+            self.dirty = True
 
 
 # simplfies creating and drawing text by allowing
-class Text:
+class Text(Widget):
     def __init__(self, x, y, text, font, colour, *, centred=False):
+        super().__init__()
         self.x = x
         self.y = y
         self.centred = centred
-        self.image = font.render(text, True, colour)
-    
-    def update(self):
-        pass
-
-    def draw(self, surface):
-        if self.centred:
-            rect = self.image.get_rect(center=(self.x, self.y))
-        else:
-            rect = (self.x, self.y)
-        surface.blit(self.image, rect)
+        self.font = font
+        self.text = None
+        self.colour = None
+        self.set(text, colour)
+
+    def set(self, text, colour=None):
+        '''renders new text, only if it or the colour differ from what is shown'''
+        if colour is None:
+            colour = self.colour
+        if text != self.text or colour != self.colour:
+            self.text = text
+            self.colour = colour
+            self.image = TEXT.render(self.font, text, colour)
+            if self.centred:
+                self.rect = self.image.get_rect(center=(self.x, self.y))
+            else:
+                self.rect = self.image.get_rect(topleft=(self.x, self.y))
+            self.dirty = True
 
 
 # custom menu pointer used for all menus. blinks rapidly like the MUGEN menu
-class MenuPointer:
+class MenuPointer(Widget):
     def __init__(self, colour, buttons):
+        super().__init__()
         self.colour = colour
         self.buttons = buttons
         self.index = (0, 0)
-        self.dalpha = 15
+        self.speed = 900 / TICK_RATE  # alpha the blink fades by each update, 900 a second
+        self.dalpha = self.speed
         self.alpha = 0
+        self.images = {}  # the highlight for each size of button, made the first time one is pointed at
 
     @property
     def index(self):
@@ -396,20 +723,30 @@ class MenuPointer:
     @index.setter
     def index(self, value):
         self._index = VEC(value)
+
+    @property
+    def rect(self):
+        '''the highlight covers the button pointed at'''
+        return self.get_item().rect
     
     def update(self):
         if self.alpha > 75:
-            self.dalpha = -15
+            self.dalpha = -self.speed
         elif self.alpha < 15:
-            self.dalpha = 15
+            self.dalpha = self.speed
         
         self.alpha += self.dalpha
+        self.dirty = True
 
     def draw(self, surface):
-        img = pg.Surface((self.get_item().width, self.get_item().height))
-        img.fill(self.colour)
+        item = self.get_item()
+        if item.size not in self.images:
+            img = pg.Surface(item.size)
+            img.fill(self.colour)
+            self.images[item.size] = img
+        img = self.images[item.size]
         img.set_alpha(self.alpha)
-        surface.blit(img, img.get_rect(center=(self.get_item().x, self.get_item().y)))
+        return surface.blit(img, item.rect)
     
     def get_item(self):
         y = int(self.index.y) % len(self.buttons)
@@ -422,11 +759,12 @@ class MenuPointer:
 
 # creates button objects to be used for on screen UI
 # doesnt actually do anything inherit from it and override
-class BasicButton:
+class BasicButton(Widget):
     def __init__(self, x, y, text, font, fg, bg, alpha, w=None, h=None):
+        super().__init__()
         self.x = x
         self.y = y
-        self.label = font.render(text, True, fg)
+        self.label = TEXT.render(font, text, fg)
         if w is None:
             w = self.label.get_width()
         if h is None:
@@ -437,14 +775,11 @@ class BasicButton:
         self.image = pg.Surface(self.size).convert_alpha()
         self.image.fill((*bg, alpha))
         self.image.blit(self.label, self.label.get_rect(center=(self.width // 2, self.height // 2)))
+        self.rect = self.image.get_rect(center=(self.x, self.y))
     
     def click(self):
         """must be overridden in a custom class if used"""
         pass
-    
-    def draw(self, surface):
-        pos = self.image.get_rect(center=(self.x, self.y))
-        surface.blit(self.image, pos)
 
 
 # impleneted button object that returns its name when clicked
@@ -457,18 +792,31 @@ class NamedBtn(BasicButton):
         return self.name
         
 
-# class used to create a sprite sheet loader object that handles splitting sprite sheets and loading their XML info files
+def find_frame(all_frames, key):
+    '''the frame dict from a SpriteSheet's all_frames that "key", a (sheet, animation, index, flipped) tuple, names'''
+    sheet, name, index, flipped = key
+    frame = all_frames[sheet][name][index]
+    return frame["flip"] if flipped else frame
+
+
+# class used to create a sprite sheet loader object that handles splitting sprite sheets and loading their XML info files.
+# a split sheet is compiled into SHEET_CACHE_FOLDER with its frame table and display format pixels, so later
+# launches read one file instead of decoding the png and parsing the xml. the file name holds a hash of the
+# png, the xml and the scale, so editing either one makes a new file
 class SpriteSheet:
     def __init__(self, sprites, scale=2):
         self.scale = scale
         self.sheets = {}
+        self.flipped = {}  # each sheet mirrored, so left facing frames never need flipping while drawing
+        self.pngs = {}
         self.xmls = {}
         self.all_frames = {}
+        self.owner = os.path.basename(os.path.dirname(os.path.abspath(sprites)))  # the character folder
         self.load_spritesheets(sprites)
         self.split_sheets()
 
     def load_spritesheets(self, directory):
-        '''ind and load all spritesheets and their respective xml data file related to character with name "self.name'''
+        '''find all spritesheets and their respective xml data file in "directory"'''
         with os.scandir(directory) as it:
             for entry in it:
                 if not entry.name.startswith(".") and entry.is_file():
@@ -476,60 +824,488 @@ class SpriteSheet:
                     if ext.lower() == ".xml":
                         self.xmls[name] = entry.path
                     elif ext.lower() == ".png":
-                        img = pg.image.load(entry.path)
-                        img.convert_alpha()
-                        self.sheets[name] = img
+                        self.pngs[name] = entry.path
 
     def split_sheets(self):
-        '''simultaneously parse xml files of every loaded sprite sheet and split said sheet into subsurfaces'''
-        if self.sheets:
-            for sheet in self.sheets:
+        '''loads every sheet that has an xml file from its compiled copy, compiling it first if needed,
+        and splits it into subsurfaces'''
+        if self.pngs:
+            for sheet in self.pngs:
+                if sheet not in self.xmls:
+                    continue
+
+                with open(self.pngs[sheet], "rb") as f:
+                    png = f.read()
+                with open(self.xmls[sheet], "rb") as f:
+                    xml = f.read()
+                digest = hashlib.sha1(png + xml + struct.pack("<BB", SHEET_VERSION, self.scale)).hexdigest()[:16]
+                path = os.path.join(SHEET_CACHE_FOLDER, "%s.%s.%s.sheet" % (self.owner, sheet, digest))
+
                 try:
-                    tree = ET.parse(self.xmls[sheet])
-                except KeyError:
-                    return
+                    self.sheets[sheet], table = self.read_compiled(path)
+                except (OSError, ValueError, struct.error):
+                    # missing, out of date or damaged, any of which is fixed by compiling it again
+                    self.sheets[sheet], table = self.compile(sheet, png, xml, path)
 
-                atlas = tree.getroot()
+                self.flipped[sheet] = pg.transform.flip(self.sheets[sheet], True, False)
                 temp_dict = {}
+                for name, sprites in table.items():
+                    temp_dict[name] = [self.make_frame(sheet, (sheet, name, i), *sprite) for i, sprite in enumerate(sprites)]
+                self.all_frames[sheet] = temp_dict
+        else:
+            print("no loaded sprite sheets available")
 
-                for sub in atlas.findall("SubTexture"):
-                    temp_list = []
-                    for sprite in sub.iter("sprite"):
-                        x = int(sprite.attrib["x"]) * self.scale
-                        y = int(sprite.attrib["y"]) * self.scale
-                        w = int(sprite.attrib["w"]) * self.scale
-                        h = int(sprite.attrib["h"]) * self.scale
+    def make_frame(self, sheet, key, x, y, w, h, dx, dy, ow, oh, hitboxes, hurtboxes):
+        '''a frame dict for all_frames. "flip" holds the same frame facing left, cut from the mirrored
+        sheet, with dx and the boxes mirrored so it is anchored the same way as the right facing one.
+        "key" names the frame in snapshots, see find_frame'''
+        flip_x = self.flipped[sheet].get_width() - x - w
+        frame = self.cut_frame(self.sheets[sheet], (x, y, w, h), {"dx": dx, "dy": dy, "off_w": ow, "off_h": oh}, hitboxes, hurtboxes)
+        frame["flip"] = self.cut_frame(self.flipped[sheet], (flip_x, y, w, h), {"dx": w - dx - ow, "dy": dy, "off_w": ow, "off_h": oh},
+                                       [(w - bx - bw, by, bw, bh) for bx, by, bw, bh in hitboxes],
+                                       [(w - bx - bw, by, bw, bh) for bx, by, bw, bh in hurtboxes])
+        frame["key"] = key + (False,)
+        frame["flip"]["key"] = key + (True,)
+        return frame
+
+    def cut_frame(self, sheet, rect, meta, hitboxes, hurtboxes):
+        '''hitboxes are where the frame can hit and hurtboxes where it can be hit, as rects relative to the frame.
+        reach is the rect around all of them, which is all the collision broadphase looks at'''
+        hitboxes = [pg.Rect(box) for box in hitboxes]
+        hurtboxes = [pg.Rect(box) for box in hurtboxes]
+        return {"img": sheet.subsurface(rect), "meta": meta, "hitboxes": hitboxes, "hurtboxes": hurtboxes,
+                "reach": hurtboxes[0].unionall(hitboxes + hurtboxes[1:])}
+
+    def parse_boxes(self, sprite, tag):
+        '''the (x, y, w, h) of every "tag" element inside a sprite, relative to the sprite and scaled up'''
+        return tuple(tuple(int(box.attrib[key]) * self.scale for key in ("x", "y", "w", "h")) for box in sprite.iter(tag))
+
+    def parse_xml(self, xml):
+        '''returns {animation: [(x, y, w, h, dx, dy, off_w, off_h, hitboxes, hurtboxes) for each frame]} scaled up
+        by self.scale. a sprite can hold <hitbox> and <hurtbox> elements with x, y, w and h relative to the sprite.
+        without any hurtbox the body box given by ox, oy, ow and oh is used, and without any hitbox it can't hit'''
+        atlas = ET.fromstring(xml)
+        table = {}
+        for sub in atlas.findall("SubTexture"):
+            temp_list = []
+            for sprite in sub.iter("sprite"):
+                x = int(sprite.attrib["x"]) * self.scale
+                y = int(sprite.attrib["y"]) * self.scale
+                w = int(sprite.attrib["w"]) * self.scale
+                h = int(sprite.attrib["h"]) * self.scale
+
+                dx = int(sprite.attrib["ox"]) * self.scale - x
+                dy = int(sprite.attrib["oy"]) * self.scale - y
+                ow = int(sprite.attrib["ow"]) * self.scale
+                oh = int(sprite.attrib["oh"]) * self.scale
+
+                hitboxes = self.parse_boxes(sprite, "hitbox")
+                hurtboxes = self.parse_boxes(sprite, "hurtbox") or ((dx, dy, ow, oh),)
+
+                temp_list.append((x, y, w, h, dx, dy, ow, oh, hitboxes, hurtboxes))
+
+            table[sub.attrib["n"]] = temp_list
+        return table
+
+    def compile(self, sheet, png, xml, path):
+        '''decodes and parses a sheet the slow way and writes its compiled copy to "path"'''
+        table = self.parse_xml(xml)
+        if table:
+            img = load_image(self.pngs[sheet]).convert_alpha()
+        else:
+            img = pg.Surface((0, 0), pg.SRCALPHA).convert_alpha()  # no frames use the sheet so it is not decoded
+        fmt = pixel_format()
+        meta = json.dumps(table, separators=(",", ":")).encode()
+        os.makedirs(SHEET_CACHE_FOLDER, exist_ok=True)
+        # other processes may be compiling the same sheet right now, so only stale compiled copies of it are
+        # removed, never the one being written or anyone's temp file, and one already gone is fine
+        prefix = "%s.%s." % (self.owner, sheet)
+        for old in os.listdir(SHEET_CACHE_FOLDER):
+            if old.startswith(prefix) and old.endswith(".sheet") and old != os.path.basename(path):
+                try:
+                    os.remove(os.path.join(SHEET_CACHE_FOLDER, old))
+                except FileNotFoundError:
+                    pass
+
+        # each process writes its own temp file and swaps it in whole, so a reader never sees half a sheet
+        with tempfile.NamedTemporaryFile(dir=SHEET_CACHE_FOLDER, prefix=prefix, suffix=".tmp", delete=False) as f:
+            try:
+                f.write(SHEET_MAGIC + struct.pack(SHEET_HEADER, SHEET_VERSION, fmt.encode(), *img.get_size(), len(meta)))
+                f.write(meta)
+                f.write(pg.image.tobytes(img, fmt))
+            except BaseException:
+                f.close()
+                os.remove(f.name)
+                raise
+        os.replace(f.name, path)
+        return img, table
+
+    def read_compiled(self, path):
+        '''reads a compiled sheet with a single read. the surface is made straight on top of the read buffer.
+        raises ValueError for a file that is out of date or doesn't hold what its header says it does'''
+        data = bytearray(os.path.getsize(path))
+        with open(path, "rb") as f:
+            f.readinto(data)
+        header = len(SHEET_MAGIC) + struct.calcsize(SHEET_HEADER)
+        if len(data) < header or data[:len(SHEET_MAGIC)] != SHEET_MAGIC:
+            raise ValueError("not a compiled sprite sheet")
+        version, fmt, w, h, meta_len = struct.unpack_from(SHEET_HEADER, data, len(SHEET_MAGIC))
+        if version != SHEET_VERSION or fmt != pixel_format().encode():
+            raise ValueError("compiled sprite sheet is out of date")
+        if len(data) != header + meta_len + w * h * 4:
+            raise ValueError("compiled sprite sheet is the wrong size")
+
+        table = self.check_table(json.loads(data[header:header + meta_len].decode()), w, h)
+        if not table:
+            return pg.Surface((w, h), pg.SRCALPHA).convert_alpha(), table
+        img = pg.image.frombuffer(memoryview(data)[header + meta_len:], (w, h), fmt.decode())
+        if img.get_masks() != alpha_masks():
+            img = img.convert_alpha()
+        return img, table
+
+    def check_table(self, table, w, h):
+        '''returns a frame table read back from json if it is shaped like one parse_xml makes, as lists in
+        place of tuples, with every frame inside the w x h sheet. anything else raises ValueError'''
+        def ints(values, count):
+            return isinstance(values, list) and len(values) == count and all(type(v) is int for v in values)
+
+        def boxes(values):
+            return isinstance(values, list) and all(ints(box, 4) for box in values)
+
+        if not isinstance(table, dict):
+            raise ValueError("compiled sprite sheet frame table is not a dict")
+        for sprites in table.values():
+            if not isinstance(sprites, list):
+                raise ValueError("compiled sprite sheet frame table is malformed")
+            for sprite in sprites:
+                if not (isinstance(sprite, list) and len(sprite) == 10 and ints(sprite[:8], 8)
+                        and boxes(sprite[8]) and sprite[9] and boxes(sprite[9])):
+                    raise ValueError("compiled sprite sheet frame table is malformed")
+                x, y, frame_w, frame_h = sprite[:4]
+                if x < 0 or y < 0 or x + frame_w > w or y + frame_h > h:
+                    raise ValueError("compiled sprite sheet frame is outside the sheet")
+        return table
+
+
+# an animation played by a character's actions, loaded from the timelines file next to its sprite sheets.
+# each entry shows a frame for a number of ticks (updates, counted from the ms the file gives it when it is
+# loaded) and can also set the character's status while it shows, anchor the frame to the character's position
+# instead of its dx, move the character on when entered, keep its last tick until "hold" ms into the timeline,
+# allow the timeline's combo to be chained from it, and name its first tick with a mark. timelines are shared
+# by every instance of a character
+class Timeline:
+    def __init__(self, name, entries, loop=False, next=None, combo=None, dmg=None, marks=None):
+        self.name = name
+        self.entries = entries
+        self.loop = loop
+        self.next = next  # timeline that plays once this one finishes
+        self.combo = combo  # timeline that can be chained into from entries marked cancel
+        self.dmg = dmg  # starting a timeline with dmg starts a new attack
+        self.marks = marks or {}
+        self.frames = tuple(entry for entry in entries for _ in range(entry["ticks"]))  # entry shown on each tick
+        self.length = len(self.frames)
+        self.end = self.length - 1
+        starts = [0]
+        for entry in entries:
+            starts.append(starts[-1] + entry["ticks"])
+        self.first_ticks = frozenset(starts[:-1])
+        self.last_ticks = frozenset(start - 1 for start in starts[1:])
+
+    def clamp(self, tick):
+        '''wraps a tick round a looping timeline, or keeps it on the last tick of one that doesn't loop'''
+        return tick % self.length if self.loop else min(tick, self.end)
+
+    def __getitem__(self, tick):
+        return self.frames[tick]
+
+
+def load_timelines(path, all_frames):
+    '''reads a character's timeline file into {name: Timeline}, taking the frames from its split sprite sheets.
+    a frame element can give a range of sprites like i="0-3", which adds one entry for each'''
+    root = ET.parse(path).getroot()
+    timelines = {}
+    for node in root.findall("Timeline"):
+        sheet = all_frames[node.attrib.get("sheet", root.attrib.get("sheet"))]
+        entries = []
+        marks = {}
+        tick = 0
+        for frame in node.findall("frame"):
+            first, _, last = frame.attrib["i"].partition("-")
+            for i in range(int(first), int(last or first) + 1):
+                if "mark" in frame.attrib:
+                    marks[frame.attrib["mark"]] = tick
+                entry = {
+                    "frame": sheet[frame.attrib["sprite"]][i],
+                    "ticks": updates(int(frame.attrib.get("ms", FRAME_TIME))),
+                    "status": frame.attrib.get("status"),
+                    "anchor": frame.attrib.get("anchor", "dx"),
+                    "move": int(frame.attrib.get("move", 0)),
+                    "hold": int(frame.attrib.get("hold", 0)),
+                    "cancel": frame.attrib.get("cancel") == "true",
+                }
+                entries.append(entry)
+                tick += entry["ticks"]
+
+        dmg = node.attrib.get("dmg")
+        timelines[node.attrib["n"]] = Timeline(node.attrib["n"], entries, loop=node.attrib.get("loop") == "true",
+                                               next=node.attrib.get("next"), combo=node.attrib.get("combo"),
+                                               dmg=None if dmg is None else int(dmg), marks=marks)
+    return timelines
+
+
+# a character's sprite sheets split into frames, with the timelines its actions play from them. it is built
+# from the compiled sheets the first time a fight needs the character and kept in GFX like any other graphic,
+# see register_art, so it is dropped once no fight pins it and the budget needs the room
+class CharacterArt:
+    def __init__(self, sprites, timelines):
+        sheet = SpriteSheet(sprites)
+        self.surfaces = list(sheet.sheets.values()) + list(sheet.flipped.values())
+        self.all_frames = sheet.all_frames
+        self.timelines = load_timelines(timelines, self.all_frames)
+
+    def size(self):
+        '''bytes of every sheet and its mirrored copy, which the frames are all cut from'''
+        return sum(surface_size(surface) for surface in self.surfaces)
+
+
+def register_art(owner, sprites, timelines):
+    '''makes GFX["owner/art"] the CharacterArt of a character's sprites folder and timelines file, built on first
+    use, and returns the key. a character module calls this rather than splitting its sheets when imported'''
+    key = "%s/art" % owner
+    # the frames are cut from the sheets, so the art is only gone once nothing keeps the sheets either
+    GFX.register(key, lambda: CharacterArt(sprites, timelines), CharacterArt.size, lambda art: art.surfaces)
+    return key
+
+
+# dict like store of assets that are only decoded when first used. keeps the decoded size of every entry
+# and drops the least recently used ones once the total goes over "budget" bytes. pinned entries are never
+# dropped. a dropped asset is only freed once nothing else refers to it, so anything that keeps one should
+# look it up again on use instead, and resident_bytes counts the dropped ones still alive to catch any that
+# don't. only used from the main thread, background loading decodes elsewhere and hands results to put()
+class AssetRegistry(collections.abc.Mapping):
+    def __init__(self, paths, load, size, budget=None):
+        self.paths = dict(paths)  # every known key and the file it is decoded from
+        self.load = load
+        self.size = size
+        self.loaders = {}  # key: (load, size, parts) of assets built by something other than decoding a file
+        self.budget = budget
+        self.cache = collections.OrderedDict()  # resident assets, least recently used first
+        self.sizes = {}
+        self.pins = collections.Counter()
+        self.used = 0
+        self.dropped = {}  # key: (weak references, size) of every asset evicted, to tell if it was freed
+
+    def __getitem__(self, key):
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        if key in self.loaders:
+            return self.put(key, self.loaders[key][0]())
+        return self.put(key, self.load(self.paths[key]))
+
+    def __iter__(self):
+        yield from self.paths
+        yield from self.loaders
+
+    def __len__(self):
+        return len(self.paths) + len(self.loaders)
+
+    def __contains__(self, key):
+        return key in self.paths or key in self.loaders
+
+    def register(self, key, load, size, parts=None):
+        '''adds an entry that is made by calling "load()" instead of decoding a file, with "size(asset)" giving
+        its bytes and "parts(asset)" the objects that hold them, if not the asset itself. like any other entry
+        it is made again if it is needed after being dropped'''
+        self.discard(key)
+        self.loaders[key] = (load, size, parts)
+
+    def resident(self, key):
+        return key in self.cache
 
-                        dx = int(sprite.attrib["ox"]) * self.scale - x
-                        dy = int(sprite.attrib["oy"]) * self.scale - y
-                        ow = int(sprite.attrib["ow"]) * self.scale
-                        oh = int(sprite.attrib["oh"]) * self.scale
+    @property
+    def full(self):
+        return self.budget is not None and self.used >= self.budget
 
-                        new_sheet = self.sheets[sheet]
-                        
-                        temp_list.append({"img": new_sheet.subsurface((x, y, w, h)), "meta": {"dx": dx, "dy": dy, "off_w": ow, "off_h": oh}})
+    @property
+    def resident_bytes(self):
+        '''bytes of every asset this has decoded that is still in memory, evicted or not'''
+        return self.used + self.leaked_bytes
+
+    @property
+    def leaked_bytes(self):
+        '''bytes of evicted assets that something still refers to'''
+        self.dropped = {key: (refs, size) for key, (refs, size) in self.dropped.items()
+                        if any(ref() is not None for ref in refs)}
+        return sum(size for refs, size in self.dropped.values())
+
+    def pinned_bytes(self):
+        return sum(size for key, size in self.sizes.items() if self.pins[key])
+
+    def put(self, key, asset):
+        '''stores an already decoded asset and returns it'''
+        self.discard(key)
+        self.dropped.pop(key, None)
+        self.cache[key] = asset
+        self.sizes[key] = self.loaders[key][1](asset) if key in self.loaders else self.size(asset)
+        self.used += self.sizes[key]
+        self.evict()
+        return asset
+
+    def hold(self, key, asset):
+        '''stores an asset that can't be decoded again on demand, like a character's portrait, for the rest of
+        the run. it is counted against the budget but never dropped'''
+        self.pin(key)
+        return self.put(key, asset)
+
+    def discard(self, key):
+        if key in self.cache:
+            asset = self.cache.pop(key)
+            size = self.sizes.pop(key)
+            self.used -= size
+            parts = self.loaders[key][2] if key in self.loaders else None
+            try:
+                self.dropped[key] = ([weakref.ref(part) for part in (parts(asset) if parts else [asset])], size)
+            except TypeError:
+                pass  # can't be tracked, so it is taken to be freed
+
+    def evict(self):
+        '''drops least recently used entries that are not pinned until the budget is met'''
+        if self.budget is None:
+            return
+        for key in list(self.cache):
+            if self.used <= self.budget:
+                break
+            if not self.pins[key]:
+                self.discard(key)
+
+    def pin(self, *keys):
+        for key in keys:
+            self.pins[key] += 1
+
+    def unpin(self, *keys):
+        for key in keys:
+            self.pins[key] -= 1
+            if self.pins[key] <= 0:
+                del self.pins[key]
+        self.evict()
+
+
+# pg.font.Font objects keyed by (face, size), where face is a name from FONTS. a font file is only parsed
+# the first time a face and size are asked for, after that everything using them shares the one font
+class FontRegistry:
+    def __init__(self, paths):
+        self.paths = paths
+        self.fonts = {}
+
+    def get(self, face, size):
+        key = (face, size)
+        if key not in self.fonts:
+            self.fonts[key] = pg.font.Font(self.paths[face], size)
+        return self.fonts[key]
+
+
+# rendered text keyed by (font, text, colour, antialias), keeping the "size" most recently used. the surfaces
+# are shared by everything that asked for the same text so they must only be blitted from, never drawn on
+class TextCache:
+    def __init__(self, size):
+        self.size = size
+        self.cache = collections.OrderedDict()  # least recently used first
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, colour, antialias=True):
+        key = (font, text, tuple(colour), antialias)
+        if key in self.cache:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        self.misses += 1
+        surface = font.render(text, antialias, colour)
+        self.cache[key] = surface
+        if len(self.cache) > self.size:
+            self.cache.popitem(last=False)
+        return surface
+
+    def clear(self):
+        self.cache.clear()
+
+
+def alpha_masks():
+    '''colour masks of surfaces made by convert_alpha()'''
+    return pg.Surface((1, 1), pg.SRCALPHA).convert_alpha().get_masks()
+
+
+def pixel_format():
+    '''the pg.image.tobytes format with the same byte order as surfaces made by convert_alpha()'''
+    if alpha_masks() == (0xFF0000, 0xFF00, 0xFF, 0xFF000000):
+        return "BGRA" if sys.byteorder == "little" else "ARGB"
+    return "RGBA"
+
+
+def surface_size(surface):
+    return surface.get_pitch() * surface.get_height()
+
+
+def sound_size(sound):
+    frequency, size, channels = pg.mixer.get_init()
+    return round(sound.get_length() * frequency) * channels * abs(size) // 8
+
+
+def index_gfx(directory, accept=(".png",)):
+    '''finds every image below "directory" without loading it, keyed the same way as recur_load_gfx'''
+    paths = {}
+    with os.scandir(directory) as it:
+        for entry in it:
+            if not entry.name.startswith(".") and entry.is_dir():
+                paths.update(index_gfx(entry.path, accept))
+            elif not entry.name.startswith(".") and entry.is_file():
+                name, ext = os.path.splitext(entry.name)
+                if ext.lower() in accept:
+                    paths[gfx_name(directory, name)] = entry.path
+    return paths
 
-                    temp_dict[sub.attrib["n"]] = temp_list
 
-                self.all_frames[sheet] = temp_dict
-        else:
-            print("no loaded sprite sheets available")
+def load_image(path):
+    '''loads an image file, or takes the copy the background loader already decoded if there is one'''
+    img = DECODED.pop(os.path.normpath(path), None)
+    if img is None:
+        img = pg.image.load(path)
+    return img
 
 
-def load_chars(directory):
-    '''search chars folder for files with the same name as the character list in characters.txt file and load their classes'''
-    char_dict = {}
-    
+def convert_image(img, colorkey=(255, 0, 255)):
+    '''converts a loaded image to the display format. images without alpha get "colorkey" as transparent'''
+    if img.get_alpha():
+        return img.convert_alpha()
+    img = img.convert()
+    img.set_colorkey(colorkey)
+    return img
+
+
+def gfx_name(directory, name):
+    '''key of an image in GFX. images in subfolders of graphics are prefixed with the folder name'''
+    if os.path.basename(directory) == "graphics":
+        return name
+    return os.path.basename(directory) + "/" + name
+
+
+def char_names(directory):
+    '''names in characters.txt that have a folder in the chars folder'''
     with open(os.path.join(directory, "characters.txt"), "r") as f:
         names = [line.strip() for line in f]
-    
+
     with os.scandir(directory) as it:
-        for entry in it:
-            if entry.name in names and entry.is_dir():
-                char = importlib.import_module("." + "chars." + entry.name + "." + entry.name, "data")
-                char_dict[entry.name] = char
-    
-    return char_dict
+        return [entry.name for entry in it if entry.name in names and entry.is_dir()]
+
+
+def import_char(name):
+    return importlib.import_module("." + "chars." + name + "." + name, "data")
+
+
+def load_chars(directory):
+    '''search chars folder for files with the same name as the character list in characters.txt file and load their classes'''
+    return {name: import_char(name) for name in char_names(directory)}
 
 
 def recur_load_gfx(directory, graphics={}, colorkey=(255, 0, 255), accept=(".png")):
@@ -542,24 +1318,15 @@ def recur_load_gfx(directory, graphics={}, colorkey=(255, 0, 255), accept=(".png
                 # print(entry.path, entry.name)
                 name, ext = os.path.splitext(entry.name)
                 if ext.lower() in accept:
-                    img = pg.image.load(entry.path)
-                    if img.get_alpha():
-                        img = img.convert_alpha()
-                    else:
-                        img = img.convert()
-                        img.set_colorkey(colorkey)
-
-                    if os.path.basename(directory) == "graphics":
-                        graphics[name] = img
-                    else:
-                        graphics[os.path.basename(directory) + "/" + name] = img
+                    graphics[gfx_name(directory, name)] = convert_image(load_image(entry.path), colorkey)
 
     return graphics
 
 
 def load_gfx(directory, colorkey=(255, 0, 255), accept=(".png")):
     '''similar to generic asset loading but loads image as a pygame image object and converts the
-    format to a pygame readable version. Then adds them to a dictionary adn returns it'''
+    format to a pygame readable version. Then adds them to a dictionary adn returns it. each image is also
+    held in GFX, keyed by its path under the game folder, so it counts against the budget'''
     graphics = {}
 
     with os.scandir(directory) as it:
@@ -567,14 +1334,14 @@ def load_gfx(directory, colorkey=(255, 0, 255), accept=(".png")):
             if not entry.name.startswith(".") and entry.is_file():
                 name, ext = os.path.splitext(entry.name)
                 if ext.lower() in accept:
-                    img = pg.image.load(entry.path)
+                    img = load_image(entry.path)
                     if img.get_alpha():
                         img = img.convert_alpha()
                     else:
                         img = img.convert()
                         img.set_colorkey
                         
-                    graphics[name] = img
+                    graphics[name] = GFX.hold(os.path.relpath(os.path.splitext(entry.path)[0], GAME_DIR), img)
     
     return graphics
 
@@ -604,8 +1371,14 @@ def load_sfx(directory, accept=(".wav", ".mp3", ".ogg", ".mdi")):
 
 
 FONTS = load_generic_asset(FONTS_FOLDER, (".ttf",))
+FONT = FontRegistry(FONTS)
+TEXT = TextCache(TEXT_CACHE_SIZE)
 MUSIC = load_generic_asset(MUSIC_FOLDER, (".wav", ".mp3", ".ogg", ".mdi"))
-SFX = load_sfx(SFX_FOLDER)
-GFX = recur_load_gfx(GFX_FOLDER)
-CHARS = load_chars(CHARS_FOLDER)
 MASTER_DB = MasterDB(DATABASE_FOLDER, "master")
+
+GFX = AssetRegistry(index_gfx(GFX_FOLDER), lambda path: convert_image(load_image(path)), surface_size, GFX_BUDGET)
+SFX = AssetRegistry(load_generic_asset(SFX_FOLDER, (".wav", ".mp3", ".ogg", ".mdi")), pg.mixer.Sound, sound_size, SFX_BUDGET)
+
+# filled in by Loader, either in the background behind the loading screen or all at once with Loader.load_all()
+CHARS = {}
+DECODED = {}  # decoded but unconverted images waiting to be picked up by load_image
@@ -1,4 +1,3 @@
-import pygame as pg
 import os
 
 from ... import Tools
@@ -7,16 +6,26 @@ FILE = os.path.dirname(__file__)
 GFX_FOLDER = os.path.join(FILE, "gfx")
 SPRITES_FOLDER = os.path.join(FILE, "sprites")
 
-SPRITES = Tools.SpriteSheet(SPRITES_FOLDER).all_frames
+ART = Tools.register_art("dangai", SPRITES_FOLDER, os.path.join(SPRITES_FOLDER, "timelines.xml"))  # sheets and timelines
 GFX = Tools.load_gfx(GFX_FOLDER)
 THUMB = GFX["dangai_thumb"]
 PORTRAIT = GFX["dangai_portrait"]
 NAME = "Ichigo Kurosaki (Post Dangai Ver.)"
 
-MAX_SPEED = 12
+# in pixels a second, and pixels a second each second for gravity. they are divided by Tools.TICK_RATE for
+# what the character moves each update
+MAX_SPEED = 720
+JUMP_SPEED = 1200
+DASH_SPEED = 2400
+DRIFT_SPEED = 180  # falling while hurt
+GRAVITY = 3600
 
 
 class Action:
+    # attributes that never change after construction and are left out of snapshots
+    static_attrs = ("char",)
+    track = None  # name of the timeline the action plays
+
     def __init__(self, char):
         self.char = char
         self.suspend = False
@@ -30,23 +39,81 @@ class Action:
         self.prev_action = None
     
     @property
-    def keys(self):
-        return self.char.keys
-
-    def btn(self, name):
-        return self.char.controls[name]
+    def timeline(self):
+        return self.char.timelines[self.track]
 
-    def get_event(self, event):
+    def press(self, pressed):
+        '''called before the update with the mask of buttons that went down since the last one'''
         pass
 
     def draw(self):
         pass
 
+    def place(self, frame, x=None):
+        '''shows a frame from all_frames facing the way the character faces, with its left edge at "x" or
+        anchored by its dx. left facing frames come pre-flipped from the sprite sheet with dx already mirrored'''
+        if self.char.facing == "left":
+            frame = frame["flip"]
+        if x is None:
+            x = self.char.pos.x - frame["meta"]["dx"]
+        self.char.frame = frame
+        self.char.image = frame["img"]
+        self.char.rect = frame["img"].get_rect(bottomleft=(x, self.char.pos.y))
+
+    def show(self):
+        '''places the timeline's frame for animation_frame, which is wrapped or kept on the last tick first,
+        and sets the status the timeline gives it'''
+        self.animation_frame = self.timeline.clamp(self.animation_frame)
+        entry = self.timeline[self.animation_frame]
+        if entry["anchor"] == "pos":
+            self.place(entry["frame"], self.char.pos.x)
+        else:
+            self.place(entry["frame"])
+        if entry["status"] is not None:
+            self.char.status = entry["status"]
+
+    def advance(self):
+        '''moves the timeline on by a tick. the last tick of an entry with a hold is kept until that many ms
+        have passed since start_time, and a timeline that doesn't loop stays on its last tick'''
+        timeline = self.timeline
+        tick = self.animation_frame
+        entry = timeline[tick]
+        if entry["hold"] and tick in timeline.last_ticks and self.char.current_time - self.start_time <= entry["hold"]:
+            return
+        if tick < timeline.end:
+            tick += 1
+        elif timeline.loop:
+            tick = 0
+        else:
+            return
+        self.animation_frame = tick
+        if tick in timeline.first_ticks:
+            self.enter(timeline[tick])
+
+    def finished(self):
+        '''whether a timeline that doesn't loop is on its last tick and past any hold there'''
+        timeline = self.timeline
+        if timeline.loop or self.animation_frame < timeline.end:
+            return False
+        return self.char.current_time - self.start_time > timeline[timeline.end]["hold"]
+
+    def enter(self, entry):
+        '''called when the timeline reaches a new entry'''
+        if entry["move"]:
+            self.char.pos.x += entry["move"] if self.char.facing == "right" else -entry["move"]
+
+    def play(self):
+        self.show()
+        self.advance()
+
     def update(self):
         pass
 
     def startup(self, presistent):
         self.presist = presistent
+        # an action stands still until it says otherwise
+        self.char.vel.x = 0
+        self.char.gravity = False
 
     def cleanup(self):
         self.done = False
@@ -59,6 +126,19 @@ class Action:
 
     def resume(self, presistent):
         self.presist = presistent
+        self.char.vel.x = 0
+        self.char.gravity = False
+
+    def snapshot(self):
+        '''copies the mutable state of the action so it can be restored later'''
+        return {key: (dict(val) if isinstance(val, dict) else val) for key, val in vars(self).items() if key not in self.static_attrs}
+
+    def restore(self, snapshot):
+        # attributes set after the snapshot was taken did not exist yet
+        for key in [key for key in vars(self) if key not in snapshot and key not in self.static_attrs]:
+            delattr(self, key)
+        for key, val in snapshot.items():
+            setattr(self, key, dict(val) if isinstance(val, dict) else val)
 
 
 class GroundedAction(Action):
@@ -67,15 +147,16 @@ class GroundedAction(Action):
     
     def update(self):
         super().update()
-        if self.keys[self.btn("JUMP")]:
+        held = self.char.buttons.held
+        if held & Tools.BTN_JUMP:
             self.done = True
             self.next_action = "jumping"
         
-        if self.keys[self.btn("DASH")]:
+        if held & Tools.BTN_DASH:
             self.done = True
             self.next_action = "dash"
         
-        if self.keys[self.btn("LIGHT")]:
+        if held & Tools.BTN_LIGHT:
             self.done = True
             self.next_action = "lightneutral"
 
@@ -84,79 +165,57 @@ class AerialAction(Action):
     def __init__(self, char):
         super().__init__(char)
     
-    def get_event(self, event):
-        super().get_event(event)
-        if event.type == pg.KEYDOWN:
-            if event.key == self.btn("DASH"):
-                self.next_action = "dash"
-                self.suspend = True
-        
-            if event.key == self.btn("LIGHT"):
-                self.next_action = "lightaerial"
-                self.suspend = True
+    def press(self, pressed):
+        super().press(pressed)
+        if pressed & Tools.BTN_LIGHT:
+            self.next_action = "lightaerial"
+            self.suspend = True
+
+        # a dash pressed on the same update as an attack wins
+        if pressed & Tools.BTN_DASH:
+            self.next_action = "dash"
+            self.suspend = True
 
     def update(self):
         super().update()
-        if self.keys[self.btn("RIGHT")]:
-            self.char.vel.x = MAX_SPEED
+        held = self.char.buttons.held
+        if held & Tools.BTN_RIGHT:
+            self.char.vel.x = MAX_SPEED / Tools.TICK_RATE
 
-        if self.keys[self.btn("LEFT")]:
-            self.char.vel.x = -MAX_SPEED
+        if held & Tools.BTN_LEFT:
+            self.char.vel.x = -MAX_SPEED / Tools.TICK_RATE
 
-        if not (self.keys[self.btn("RIGHT")] or self.keys[self.btn("LEFT")]):
+        if not held & (Tools.BTN_RIGHT | Tools.BTN_LEFT):
             self.char.vel.x = 0
     
 
 class Idle(Action):
-    def __init__(self, char):
-        super().__init__(char)
-        self.frames = [
-            frame
-            for frame in self.char.all_frames["dangai"]["stand"]
-            for _ in range(4)
-        ]
-        self.sprites = [frame["img"] for frame in self.frames]
-        self.meta = [frame["meta"] for frame in self.frames]
-    
+    track = "idle"
+
     def update(self):
-        if self.keys[self.btn("LEFT")] or self.keys[self.btn("RIGHT")]:
+        held = self.char.buttons.held
+        if held & (Tools.BTN_LEFT | Tools.BTN_RIGHT):
             self.suspend = True
             self.next_action = "walking"
 
-        if self.keys[self.btn("JUMP")]:
+        if held & Tools.BTN_JUMP:
             self.suspend = True
             self.next_action = "jumping"
 
-        if self.keys[self.btn("DOWN")]:
+        if held & Tools.BTN_DOWN:
             self.suspend = True
             self.next_action = "guarding"
         
-        if self.keys[self.btn("DASH")]:
+        if held & Tools.BTN_DASH:
             self.suspend = True
             self.next_action = "dash"
 
-        if self.keys[self.btn("LIGHT")]:
+        if held & Tools.BTN_LIGHT:
             self.suspend = True
             self.next_action = "lightneutral"
 
     def draw(self):
-        self.animation_frame = self.animation_frame % 16
-        meta = self.meta[self.animation_frame]
-        if self.char.facing == "right":
-            img = self.sprites[self.animation_frame]
-            rect = img.get_rect(
-                bottomleft=(
-                    self.char.pos.x - meta["dx"],
-                    self.char.pos.y,
-                )
-            )
-        elif self.char.facing == "left":
-            img = pg.transform.flip(self.sprites[self.animation_frame], True, False)
-            rect = img.get_rect(
-                bottomright=(self.char.pos.x + meta["dx"] + meta["off_w"], self.char.pos.y))
-        self.char.image = img
-        self.char.rect = rect
-        self.animation_frame += 1
+        self.play()
 
     def startup(self, presistent):
         super().startup(presistent)
@@ -168,47 +227,25 @@ class Idle(Action):
 
 
 class Jumping(AerialAction):
-    def __init__(self, char):
-        super().__init__(char)
-        self.frames = self.char.all_frames["dangai"]["jump"][:5]
-        self.sprites = [frame["img"] for frame in self.frames]
-        self.meta = [frame["meta"] for frame in self.frames]
+    track = "jump"
 
     def update(self):
         super().update()
-        if self.animation_frame == 4:
-            self.char.status = "AERIAL"
-            if self.char.vel.y > 0:
-                self.char.vel.y -= self.char.acc.y
-                self.char.pos.y -= self.char.vel.y
-            else:
+        if self.animation_frame == self.timeline.end:
+            if self.char.status != "AERIAL":
+                # leaves the ground on the last frame of the take off
+                self.char.status = "AERIAL"
+                self.char.vel.y = -JUMP_SPEED / Tools.TICK_RATE
+                self.char.gravity = True
+            elif self.char.vel.y >= 0:
+                self.char.gravity = False  # hangs at the top for the update it finishes in
                 self.done = True
                 self.next_action = "falling"
         else:
-            self.animation_frame += 1
-
-        self.char.pos.x += self.char.vel.x
+            self.advance()
 
     def draw(self):
-        self.animation_frame = self.animation_frame % 5
-        meta = self.meta[self.animation_frame]
-        if self.char.facing == "right":
-            img = self.sprites[self.animation_frame]
-            rect = img.get_rect(
-                bottomleft=(self.char.pos.x - meta["dx"], self.char.pos.y)
-            )
-        elif self.char.facing == "left":
-            img = pg.transform.flip(self.sprites[self.animation_frame], True, False)
-            rect = img.get_rect(
-                bottomright=(self.char.pos.x + meta["dx"] + meta["off_w"], self.char.pos.y)
-            )
-
-        self.char.rect = rect
-        self.char.image = img
-        
-    def startup(self, presistent):
-        super().startup(presistent)
-        self.char.vel = Tools.VEC(0, 20)
+        self.show()
 
     def cleanup(self):
         self.animation_frame = 0
@@ -216,225 +253,124 @@ class Jumping(AerialAction):
     
     def resume(self, presistent):
         super().resume(presistent)
+        # still rises for the update it gives up in, like before it was interrupted
+        self.char.gravity = self.char.status == "AERIAL" and self.char.vel.y < 0
         self.next_action = "vulfall"
         self.done = True
 
 
-class Falling(AerialAction):
-    def __init__(self, char):
-        super().__init__(char)
-        self.frames = self.char.all_frames["dangai"]["jump"][4:9]
-        self.sprites = [frame["img"] for frame in self.frames]
-        self.meta = [frame["meta"] for frame in self.frames]
+# falling back to the ground after a jump
+class FallAction(AerialAction):
+    track = "fall"
 
     def update(self):
         super().update()
-        if self.char.status == "AERIAL":
-            if self.char.pos.y < self.char.ground.y:
-                self.char.pos.y += self.char.vel.y
-                self.char.vel.y += self.char.acc.y
-            else:
-                self.char.status = "GROUND"
-
-        self.char.pos.x += self.char.vel.x
+        if self.char.status == "AERIAL" and self.char.grounded:
+            self.char.status = "GROUND"
+            self.char.gravity = False
 
-        if self.animation_frame == 4 and self.char.status == "GROUND":
+        if self.animation_frame == self.timeline.end and self.char.status == "GROUND":
             self.withdraw = True
 
     def draw(self):
-        self.animation_frame = self.animation_frame % 5
-        meta = self.meta[self.animation_frame]
-        if self.char.facing == "right":
-            img = self.sprites[self.animation_frame]
-            rect = img.get_rect(
-                bottomleft=(self.char.pos.x - meta["dx"], self.char.pos.y))
-        elif self.char.facing == "left":
-            img = pg.transform.flip(self.sprites[self.animation_frame], True, False)
-            rect = img.get_rect(
-                bottomright=(self.char.pos.x + meta["dx"] + meta["off_w"], self.char.pos.y))
-
-        self.char.rect = rect
-        self.char.image = img
+        self.show()
 
+        # the landing only plays once the character is on the ground
         if self.char.status == "AERIAL":
             self.animation_frame = 0
         else:
-            self.animation_frame += 1
+            self.advance()
 
     def cleanup(self):
         self.animation_frame = 0
         return super().cleanup()
 
+    def startup(self, presistent):
+        super().startup(presistent)
+        # an interrupted jump falls as fast as it was still rising
+        self.char.vel.y = abs(self.char.vel.y)
+        self.char.gravity = True
+
     def resume(self, presistent):
         super().resume(presistent)
         self.char.status = "AERIAL"
+        self.char.gravity = True
 
 
-class VulFall(AerialAction):
-    def __init__(self, char):
-        super().__init__(char)
-        self.frames = self.char.all_frames["dangai"]["jump"][4:9]
-        self.sprites = [frame["img"] for frame in self.frames]
-        self.meta = [frame["meta"] for frame in self.frames]
-
-    def get_event(self, event):
-        pass
-
-    def update(self):
-        super().update()
-        if self.char.status == "AERIAL":
-            if self.char.pos.y < self.char.ground.y:
-                self.char.pos.y += self.char.vel.y
-                self.char.vel.y += self.char.acc.y
-            else:
-                self.char.status = "GROUND"
-
-        self.char.pos.x += self.char.vel.x
-
-        if self.animation_frame == 4 and self.char.status == "GROUND":
-            self.withdraw = True
-
-    def draw(self):
-        self.animation_frame = self.animation_frame % 5
-        meta = self.meta[self.animation_frame]
-        if self.char.facing == "right":
-            img = self.sprites[self.animation_frame]
-            rect = img.get_rect(
-                bottomleft=(self.char.pos.x - meta["dx"], self.char.pos.y))
-        elif self.char.facing == "left":
-            img = pg.transform.flip(self.sprites[self.animation_frame], True, False)
-            rect = img.get_rect(
-                bottomright=(self.char.pos.x + meta["dx"] + meta["off_w"], self.char.pos.y))
-
-        self.char.rect = rect
-        self.char.image = img
-
-        if self.char.status == "AERIAL":
-            self.animation_frame = 0
-        else:
-            self.animation_frame += 1
+class Falling(FallAction):
+    pass
 
-    def cleanup(self):
-        self.animation_frame = 0
-        return super().cleanup()
 
-    def resume(self, presistent):
-        super().resume(presistent)
-        self.char.status = "AERIAL"
+# falling after a jump was interrupted, which can't be acted out of
+class VulFall(FallAction):
+    def press(self, pressed):
+        pass
 
 
 class Walking(GroundedAction):
-    def __init__(self, char):
-        super().__init__(char)
-        self.frames = [frame for frame in self.char.all_frames["dangai"]["run"] for _ in range(2)]
-        self.accepted = ["RIGHT", "LEFT"]
-        self.sprites = [frame["img"] for frame in self.frames]
-        self.meta = [frame["meta"] for frame in self.frames]
+    track = "run"
+    accepted = ("RIGHT", "LEFT")
     
     def update(self):
         super().update()
-        if self.keys[self.btn("RIGHT")]:
+        held = self.char.buttons.held
+        if held & Tools.BTN_RIGHT:
             self.char.facing = "right"
-            self.char.vel.x = MAX_SPEED
+            self.char.vel.x = MAX_SPEED / Tools.TICK_RATE
 
-        if self.keys[self.btn("LEFT")]:
+        if held & Tools.BTN_LEFT:
             self.char.facing = "left"
-            self.char.vel.x = -MAX_SPEED
+            self.char.vel.x = -MAX_SPEED / Tools.TICK_RATE
 
-        if not self.keys[self.btn("RIGHT")] and not self.keys[self.btn("LEFT")]:
+        if not held & (Tools.BTN_RIGHT | Tools.BTN_LEFT):
             self.char.vel.x = 0
             self.withdraw = True
-        
-        self.char.pos.x += self.char.vel.x
 
-        self.animation_frame += 1
+        self.advance()
 
     def draw(self):
-        self.animation_frame = self.animation_frame % 16
-        if self.char.facing == "right":
-            img = self.sprites[self.animation_frame]
-            rect = img.get_rect(bottomleft=(self.char.pos.x, self.char.pos.y))
-        elif self.char.facing == "left":
-            img = pg.transform.flip(self.sprites[self.animation_frame], True, False)
-            rect = img.get_rect(bottomright=(self.char.pos.x + img.get_width(), self.char.pos.y))
-
-        self.char.image = img
-        self.char.rect = rect
+        self.show()
 
 
 class Guarding(Action):
-    def __init__(self, char):
-        super().__init__(char)
-        self.frames = self.char.all_frames["dangai"]["guard"]
-        self.sprites = [frame["img"] for frame in self.frames]
-        self.meta = [frame["meta"] for frame in self.frames]
+    track = "guard"
 
     def update(self):
-        if self.keys[self.btn("DOWN")] and self.animation_frame == 1:
+        held = self.char.buttons.held
+        if held & Tools.BTN_DOWN and self.animation_frame == self.timeline.marks["guard"]:
             self.char.status = "GUARD"
-        elif not self.keys[self.btn("DOWN")]:
+        elif not held & Tools.BTN_DOWN:
             self.char.status = "GROUND"
-            if self.animation_frame == 2:
+            if self.animation_frame == self.timeline.end:
                 self.withdraw = True
 
     def draw(self):
-        self.animation_frame = self.animation_frame % 3
-        meta = self.meta[self.animation_frame]
-        if self.char.facing == "right":
-            img = self.sprites[self.animation_frame]
-            rect = img.get_rect(
-                bottomleft=(
-                    self.char.pos.x - meta["dx"],
-                    self.char.pos.y,
-                )
-            )
-        elif self.char.facing == "left":
-            img = pg.transform.flip(self.sprites[self.animation_frame], True, False)
-            rect = img.get_rect(bottomright=(self.char.pos.x + meta["dx"] + meta["off_w"], self.char.pos.y))
-
-        self.char.image = img
-        self.char.rect = rect
+        self.show()
 
         if self.char.status == "GUARD":
-            self.animation_frame = 1
-
+            self.animation_frame = self.timeline.marks["guard"]
         else:
-            self.animation_frame += 1
+            self.advance()
 
 
 class Dash(Action):
-    def __init__(self, char):
-        super().__init__(char)
-        self.frames = self.char.all_frames["dangai"]["dash"]
-        self.sprites = [frame["img"] for frame in self.frames]
-        self.meta = [frame["meta"] for frame in self.frames]
-        
+    track = "dash"
+
     def update(self):
-        if self.animation_frame == 0:
-            self.animation_frame += 1
-        elif self.animation_frame == 1:
+        if self.animation_frame == self.timeline.marks["dash"]:
             if self.char.current_time - self.start_time < 300:
-                if self.char.facing == "right":
-                    self.char.pos.x += 40
-                elif self.char.facing == "left":
-                    self.char.pos.x -= 40
-                self.animation_frame = 1
+                speed = DASH_SPEED / Tools.TICK_RATE
+                self.char.vel.x = speed if self.char.facing == "right" else -speed
             else:
-                self.animation_frame += 1
-        elif self.animation_frame == 2:
+                self.char.vel.x = 0
+                self.advance()
+        elif self.animation_frame == self.timeline.end:
             self.withdraw = True
+        else:
+            self.advance()
     
     def draw(self):
-        meta = self.meta[self.animation_frame]
-        if self.char.facing == "right":
-            img = self.sprites[self.animation_frame]
-            rect = img.get_rect(bottomleft=(self.char.pos.x - meta["dx"], self.char.pos.y))
-        elif self.char.facing == "left":
-            img = pg.transform.flip(self.sprites[self.animation_frame], True, False)
-            rect = img.get_rect(bottomright=(self.char.pos.x + meta["dx"] + meta["off_w"], self.char.pos.y))
-        
-        self.char.image = img
-        self.char.rect = rect
+        self.show()
 
     def startup(self, presistent):
         super().startup(presistent)
@@ -446,11 +382,7 @@ class Dash(Action):
 
 
 class Hurt(Action):
-    def __init__(self, char):
-        super().__init__(char)
-        self.frames = self.char.all_frames["dangai"]["hit"]
-        self.sprites = [frame["img"] for frame in self.frames]
-        self.meta = [frame["meta"] for frame in self.frames]
+    track = "hurt"
 
     def update(self):
         if self.char.hit_count:
@@ -459,21 +391,12 @@ class Hurt(Action):
                 self.withdraw = True
             else:
                 self.animation_frame = self.char.hit_count - 1
+                # drifts down when hit out of a fall, the floor stops it
                 if isinstance(self.char.action_stack[-2], Falling):
-                    if self.char.pos.y < self.char.ground.y:
-                        self.char.pos.y += 3
+                    self.char.pos.y += DRIFT_SPEED / Tools.TICK_RATE
             
     def draw(self):
-        meta = self.meta[self.animation_frame]
-        if self.char.facing == "right":
-            img = self.sprites[self.animation_frame]
-            rect = img.get_rect(bottomleft=(self.char.pos.x - meta["dx"], self.char.pos.y))
-        elif self.char.facing == "left":
-            img = pg.transform.flip(self.sprites[self.animation_frame], True, False)
-            rect = img.get_rect(bottomright=(self.char.pos.x + meta["dx"] + meta["off_w"], self.char.pos.y))
-        
-        self.char.image = img
-        self.char.rect = rect
+        self.show()
 
     def startup(self, presistent):
         super().startup(presistent)
@@ -485,176 +408,59 @@ class KnockDown(Action):
     pass
 
 
-class LightAerial(Action):
-    def __init__(self, char):
-        super().__init__(char)
-        self.frames = [frame for frame in self.char.all_frames["dangai"]["lightA"][:3] for _ in range(5)]  # last frame 14
-        self.frames.append(self.char.all_frames["dangai"]["lightA"][3])  # frame 15
-        self.frames.append(self.char.all_frames["dangai"]["lightA"][4])  # frame 16
+# an attack played entirely from its timelines. the status, movement and recovery of each part come from the
+# timeline data, a part with a combo can be chained into the next by pressing the attack's button again during
+# its cancel entries, and a part with a next timeline runs straight into it once finished
+class Attack(Action):
+    button = Tools.BTN_LIGHT
 
-        self.sprites = [frame["img"] for frame in self.frames]
-        self.meta = [frame["meta"] for frame in self.frames]
-    
     def update(self):
-
-        if self.animation_frame == 4:
-            self.char.status = "ATTACK"
-        
-        if self.animation_frame == 5:
-            self.char.status = "AERIAL"
-        
-        if self.animation_frame == 14:
-            if self.char.current_time - self.start_time > 400:
-                self.animation_frame = 15
+        entry = self.timeline[self.animation_frame]
+        if self.finished():
+            if self.timeline.next is not None:
+                self.begin(self.timeline.next)
             else:
-                self.animation_frame = 14
-        elif self.animation_frame == 16:
-            self.withdraw = True
+                self.withdraw = True
         else:
-            self.animation_frame += 1
-        
+            self.advance()
+
+        if entry["cancel"] and self.timeline.combo is not None and self.char.buttons.held & self.button:
+            # the chained part's first tick plays out on the update it is pressed
+            self.begin(self.timeline.combo)
+            self.advance()
+
     def draw(self):
-        meta = self.meta[self.animation_frame]
-        if self.char.facing == "right":
-            img = self.sprites[self.animation_frame]
-            rect = img.get_rect(bottomleft=(self.char.pos.x - meta["dx"], self.char.pos.y))
-        elif self.char.facing == "left":
-            img = pg.transform.flip(self.sprites[self.animation_frame], True, False)
-            rect = img.get_rect(bottomright=(self.char.pos.x + meta["dx"] + meta["off_w"], self.char.pos.y))
-        
-        self.char.image = img
-        self.char.rect = rect
- 
+        self.show()
+
+    def begin(self, track):
+        '''starts playing the timeline called "track" from its first tick'''
+        self.track = track
+        self.animation_frame = 0
+        self.start_time = self.char.current_time
+        if self.timeline.dmg is not None:
+            self.char.dmg = self.timeline.dmg
+            self.char.new_attack()
+        self.enter(self.timeline[0])
+
     def startup(self, presistent):
         super().startup(presistent)
-        self.start_time = self.char.current_time
+        self.begin(type(self).track)
         self.char.attack_time = self.start_time
-        self.char.dmg = 25
-    
+
     def cleanup(self):
+        self.track = type(self).track  # back to the first part
         self.animation_frame = 0
         self.char.dmg = 0
         self.char.attack_time = None
         return super().cleanup()
 
 
-class LightNeutral(Action):
-    def __init__(self, char):
-        super().__init__(char)
-        p1 = [frame for frame in self.char.all_frames["dangai"]["lightNa"][:3] for _ in range(4)]  # last frame 11
-        p1.append(self.char.all_frames["dangai"]["lightNa"][3])  # frame 12
-
-        p2 = [frame for frame in self.char.all_frames["dangai"]["lightNb"][:4] for _ in range(4)]  # last frame 15
-        p2.append(self.char.all_frames["dangai"]["lightNb"][4])  # frame 16
-        p2.append(self.char.all_frames["dangai"]["lightNb"][5])  # frame 17
+class LightAerial(Attack):
+    track = "lightA"
 
-        p3 = [frame for frame in self.char.all_frames["dangai"]["lightNc"][:4] for _ in range(4)]  # last frame 15
-        p3.append(self.char.all_frames["dangai"]["lightNc"][4])  # frame 16
 
-        self.frames = [p1, p2, p3]
-        self.sprites = [[frame["img"] for frame in part] for part in self.frames]
-        self.meta = [[frame["meta"] for frame in part] for part in self.frames]
-
-        self.part = 1
-        self.end_anim = False
-
-    def update(self):
-
-        if self.part == 1:
-            if self.animation_frame == 11:
-                self.char.status = "ATTACK"
-            if self.animation_frame == 12:
-                self.char.status = "GROUND"
-                if (self.char.current_time - self.start_time) > 600:
-                    self.withdraw = True
-                else:
-                    self.animation_frame = 12
-
-                if self.keys[self.btn("LIGHT")]:
-                    self.part = 2
-                    self.animation_frame = 0
-                    self.start_time = self.char.current_time
-                    if self.char.facing == "right":
-                        self.char.pos.x += 20
-                    elif self.char.facing == "left":
-                        self.char.pos.x -= 20
-
-            else:
-                self.animation_frame += 1
-
-        if self.part == 2:
-            if self.animation_frame == 15:
-                self.char.status = "ATTACK"
-
-            if self.animation_frame == 16:
-                self.char.status = "GROUND"
-                if (self.char.current_time - self.start_time) > 600:
-                    self.animation_frame = 17
-                else:
-                    self.animation_frame = 16
-
-                if self.keys[self.btn("LIGHT")]:
-                    self.part = 3
-                    self.animation_frame = 0
-                    self.start_time = self.char.current_time
-
-            elif self.animation_frame == 17:
-                self.withdraw = True
-            else:
-                self.animation_frame += 1
-                if (self.animation_frame % 4) == 0:
-                    if self.char.facing == "right":
-                        self.char.pos.x += 4
-                    elif self.char.facing == "left":
-                        self.char.pos.x -= 4
-        
-        if self.part == 3:
-            if self.animation_frame == 14:
-                self.char.status = "ATTACK"
-
-            if self.animation_frame == 15:
-                self.char.status = "GROUND"
-                if (self.char.current_time - self.start_time) > 500:
-                    self.animation_frame = 16
-                    self.start_time = self.char.current_time
-                    if self.char.facing == "right":
-                        self.char.pos.x += 50
-                    elif self.char.facing == "left":
-                        self.char.pos.x -= 50
-                else:
-                    self.animation_frame = 15
-            elif self.animation_frame == 16:
-                if self.char.current_time - self.start_time > 150:
-                    self.withdraw = True
-                else:
-                    self.animation_frame = 16
-            else:
-                self.animation_frame += 1
-        
-    def draw(self):
-        meta = self.meta[self.part - 1][self.animation_frame]
-        if self.char.facing == "right":
-            img = self.sprites[self.part - 1][self.animation_frame]
-            rect = img.get_rect(bottomleft=(self.char.pos.x - meta["dx"], self.char.pos.y))
-        elif self.char.facing == "left":
-            img = pg.transform.flip(self.sprites[self.part - 1][self.animation_frame], True, False)
-            rect = img.get_rect(bottomright=(self.char.pos.x + meta["dx"] + meta["off_w"], self.char.pos.y))
-        
-        self.char.image = img
-        self.char.rect = rect
-            
-    def startup(self, presistent):
-        super().startup(presistent)
-        self.start_time = self.char.current_time
-        self.char.attack_time = self.start_time
-        self.char.dmg = 250
-
-    def cleanup(self):
-        self.part = 1
-        self.animation_frame = 0
-        self.attack_time = None
-        self.char.dmg = 0
-        return super().cleanup()
+class LightNeutral(Attack):
+    track = "lightNa"
 
 
 class LightUp(Action):
@@ -713,7 +519,22 @@ class SpecialDown(Action):
     pass
 
 
+def find_actions(masters):
+    '''every action class below one of "masters" by its lower case name'''
+    return {action.__name__.lower(): action
+            for master in masters for action in master.__subclasses__() if action not in masters}
+
+
+# the action table and the actions a hit can interrupt are the same for every fighter, so they are
+# worked out once when the module is imported and each fighter only makes its own action instances
+MASTER_ACTIONS = (Action, GroundedAction, AerialAction, FallAction, Attack)
+ACTIONS = find_actions(MASTER_ACTIONS)
+VUL_ACTIONS = (Jumping, Falling, Idle, Walking, VulFall)
+
+
 class Dangai:
+    master_actions = MASTER_ACTIONS
+    vul_actions = VUL_ACTIONS
 
     def __init__(self, num, controls, ground_x, ground_y):
         self.player_num = num
@@ -721,39 +542,42 @@ class Dangai:
         self.energy = 0
         self.dmg = 0
         self.hit_count = 0
-        self.controls = {val: key for key, val in controls.items()}
+        self.controls = controls
+        self.buttons = Tools.Buttons(controls)
 
-        if self.player_num == 1:
+        # odd numbered players start on the left of the stage
+        if self.player_num % 2 == 1:
             self.facing = "right"
         else:
             self.facing = "left"
 
-        self.all_frames = SPRITES
+        art = Tools.GFX[ART]
+        self.all_frames = art.all_frames
+        self.timelines = art.timelines
         self.ground = Tools.VEC(ground_x, ground_y)
         self.pos = Tools.VEC(self.ground.x, self.ground.y)
-        self.vel = Tools.VEC(0, 20)
-        self.acc = Tools.VEC(0, 1)
+        self.vel = Tools.VEC(0, 0)
+        self.acc = Tools.VEC(0, GRAVITY / Tools.TICK_RATE ** 2)
+        self.gravity = False  # whether the physics world lets the fighter fall this update
+        self.grounded = True  # set by the physics world
         self.current_time = None
         self.delta_time = None
-        self.keys = None
         self.status = None
         self.attack_time = None
-        self.vul_actions = (Jumping, Falling, Idle, Walking, VulFall)
-        self.master_actions = (Action, GroundedAction, AerialAction)
+        self.attack_id = 0
+        self.attack_hits = []  # player numbers the current attack has already connected with
         self.action_dict = {}
         self.action_stack = []
         self.action_queue = []
         self.setup_actions()
 
     def setup_actions(self):
-        self.keys = pg.key.get_pressed()
-        for maction in self.master_actions:
-            for action in maction.__subclasses__():
-                if action not in self.master_actions:
-                    self.action_dict[action.__name__.lower()] = action(self)
+        self.action_dict = {name: action(self) for name, action in ACTIONS.items()}
 
         self.action_stack.append(self.action_dict["idle"])
         self.action_stack[-1].startup({})
+        # draw once so the fighter has an image and rect before its first update
+        self.action_stack[-1].draw()
 
     def switch_action(self, name):
         presistent = self.action_stack[-1].cleanup()
@@ -791,14 +615,60 @@ class Dangai:
         except IndexError:
             print("player %s action queue empty" % self.player_num)
 
-    def get_event(self, event):
-        if event.key in self.controls.values():
-            self.action_stack[-1].get_event(event)
-
-    def update(self, keys, current_time, delta_time):
-        self.keys = keys
+    def new_attack(self):
+        '''starts a new attack instance, which can connect at most once with each other fighter'''
+        self.attack_id += 1
+        self.attack_hits = []
+
+    def snapshot(self):
+        '''returns the fighter's whole mutable state as plain python values'''
+        return {
+            "hp": self.hp,
+            "energy": self.energy,
+            "dmg": self.dmg,
+            "hit_count": self.hit_count,
+            "facing": self.facing,
+            "pos": tuple(self.pos),
+            "vel": tuple(self.vel),
+            "gravity": self.gravity,
+            "grounded": self.grounded,
+            "status": self.status,
+            "attack_time": self.attack_time,
+            "attack_id": self.attack_id,
+            "attack_hits": list(self.attack_hits),
+            "current_time": self.current_time,
+            "held": self.buttons.held,
+            "frame": self.frame["key"],  # the frame on show, which drawing again wouldn't always pick
+            "topleft": self.rect.topleft,
+            "stack": [action.__class__.__name__.lower() for action in self.action_stack],
+            "queue": [action.__class__.__name__.lower() for action in self.action_queue],
+            "actions": {name: action.snapshot() for name, action in self.action_dict.items()},
+        }
+
+    def restore(self, snapshot):
+        for key in ("hp", "energy", "dmg", "hit_count", "facing", "gravity", "grounded", "status", "attack_time",
+                    "current_time"):
+            setattr(self, key, snapshot[key])
+        self.pos = Tools.VEC(snapshot["pos"])
+        self.vel = Tools.VEC(snapshot["vel"])
+        self.buttons.held = snapshot["held"]
+        self.attack_id = snapshot["attack_id"]
+        self.attack_hits = list(snapshot["attack_hits"])
+        self.action_stack = [self.action_dict[name] for name in snapshot["stack"]]
+        self.action_queue = [self.action_dict[name] for name in snapshot["queue"]]
+        for name, action in self.action_dict.items():
+            action.restore(snapshot["actions"][name])
+        self.frame = Tools.find_frame(self.all_frames, snapshot["frame"])
+        self.image = self.frame["img"]
+        self.rect = self.image.get_rect(topleft=snapshot["topleft"])
+
+    def update(self, held, current_time, delta_time):
+        '''"held" is the mask of buttons the player holds this update'''
         self.current_time = current_time
         self.delta_time = delta_time
+        self.buttons.update(held)
+        if self.buttons.pressed:
+            self.action_stack[-1].press(self.buttons.pressed)
         if self.action_stack[-1].suspend:
             self.push_action(self.action_stack[-1].next_action)
         elif self.action_stack[-1].withdraw:
@@ -817,9 +687,10 @@ class Dangai:
                     self.push_action("hurt")
 
         self.action_stack[-1].update()
-        self.action_stack[-1].draw()
 
-        self.mask = pg.mask.from_surface(self.image)
+    def draw(self):
+        '''picks the frame on show, once the physics world has moved the fighter'''
+        self.action_stack[-1].draw()
 
 
 def main(*args, **kwargs):
@@ -1,8 +1,11 @@
 from .charselect import CharSelect
 from .end import EndScreen
 from .game import GameState
+from .loading import LoadingScreen
 from .login import Login
 from .mainmenu import MainMenu
+from .netgame import NetGame
 from .pause import PauseMenu
+from .replay import ReplayViewer
 from .stats import StatsMenu
 from .title import TitleScreen
@@ -4,8 +4,9 @@ import os
 from .. import Tools
 
 
-class Grid:
+class Grid(Tools.Widget):
     def __init__(self, x_dim, y_dim, bg, alpha, x, y, slot_w, slot_h, slot_bg, characters, font, gap=0, outline=None, outline_colour=None):
+        super().__init__()
         self.x = x
         self.y = y
         self.width = x_dim * slot_w + (x_dim - 1) * gap
@@ -50,11 +51,7 @@ class Grid:
         self.pointer1 = Pointer(slot_w + 8, slot_h + 8, Tools.PLAYER_1_BLUE, self.grid, self.x - self.width // 2, self.y - self.height // 2, text, "left")
         text = font.render("P2", True, Tools.PLAYER_2_PURPLE).convert_alpha()
         self.pointer2 = Pointer(slot_w + 8, slot_h + 8, Tools.PLAYER_2_PURPLE, self.grid, self.x - self.width // 2, self.y - self.height // 2, text, "right")
-
-    def draw(self, surface):
-        surface.blit(self.image, self.image.get_rect(center=(self.x, self.y)))
-        self.pointer1.draw(surface)
-        self.pointer2.draw(surface)
+        self.rect = self.image.get_rect(center=(self.x, self.y))
 
 
 class Slot:
@@ -78,9 +75,9 @@ class Slot:
         surface.blit(self.image, (self.x - ((self.width + self.gap) // 2), self.y - ((self.height + self.gap) // 2)))
 
 
-class Pointer:
+class Pointer(Tools.Widget):
     def __init__(self, w, h, colour, slots, x_off, y_off, text, side):
-        self.show = True
+        super().__init__()
         self.width = w
         self.height = h
         self.colour = colour
@@ -102,46 +99,67 @@ class Pointer:
     def index(self, tup):
         self._index = Tools.VEC(tup)
     
-    def toggle(self):
-        self.show = not self.show
-    
     def get_slot(self):
         y = int(self.index.y) % len(self.slots)
         x = int(self.index.x) % len(self.slots[y])
         return self.slots[y][x]
+
+    def place(self):
+        '''where the box and the label go around the slot pointed at'''
+        slot = self.get_slot()
+        x = (slot.x - ((self.width - slot.width) // 2)) + self.x_off
+        y = (slot.y - ((self.height - slot.height) // 2)) + self.y_off
+        box = self.image.get_rect(center=(x, y))
+        if self.align == "right":
+            label = self.text.get_rect(bottomright=(box.right + 5, box.top - 10))
+        else:
+            label = self.text.get_rect(bottomleft=(box.left, box.top - 10))
+        return box, label
+
+    @property
+    def rect(self):
+        box, label = self.place()
+        return box.union(label)
     
     def draw(self, surface):
         if self.show:
-            slot = self.get_slot()
-            x = (slot.x - ((self.width - slot.width) // 2)) + self.x_off
-            y = (slot.y - ((self.height - slot.height) // 2)) + self.y_off
-            rect = self.image.get_rect(center=(x, y))
-            surface.blit(self.image, rect)
-            if self.align == "right":
-                rect = self.text.get_rect(bottomright=(rect.right + 5, rect.top - 10))
-            else:
-                rect = self.text.get_rect(bottomleft=(rect.left, rect.top - 10))
-            surface.blit(self.text, rect)
-
-
-class CharSelect(Tools.State):
+            box, label = self.place()
+            surface.blit(self.image, box)
+            surface.blit(self.text, label)
+            return box.union(label)
+
+
+class CharSelect(Tools.MenuState):
     def __init__(self):
         super().__init__()
+        self.next_state = "GAMESTATE"
 
         self.characters = [Tools.CHARS[k] for k in sorted(list(Tools.CHARS.keys()))]
 
-        self.font = pg.font.Font(Tools.FONTS["kenvector_future_thin"], 15)
-        self.font2 = pg.font.Font(Tools.FONTS["kenvector_future_thin"], 20)
+        self.font = Tools.FONT.get("kenvector_future_thin", 15)
+        self.font2 = Tools.FONT.get("kenvector_future_thin", 20)
+        font = Tools.FONT.get("kenvector_future", 50)
+        self.ready_label = Tools.Label(Tools.SCREEN_RECT.centerx, Tools.SCREEN_RECT.centery, 1280, 50, "READY!", font, Tools.SPACE_GREY, (0, 0, 0, 150), centred=True)
 
         self.grid = Grid(10, 2, Tools.BLACK, 50, Tools.SCREEN_RECT.centerx, Tools.SCREEN_RECT.centery + 200, 90, 90, Tools.BLACK, self.characters, self.font2, 10, 4, Tools.SPACE_GREY)
 
+        bar = pg.Surface((470, 40)).convert_alpha()
+        bar.fill((0, 0, 0, 150))
+        self.portraits = [Tools.Image(None, topleft=(40, 40)), Tools.Image(None, topleft=(915, 40))]
+        self.names = [Tools.Text(10, 385, "", self.font2, Tools.SPACE_GREY), Tools.Text(825, 385, "", self.font2, Tools.SPACE_GREY)]
+        self.ui.add(self.grid, self.grid.pointer1, self.grid.pointer2, Tools.Image(bar, topleft=(0, 375)),
+                    Tools.Image(bar, topleft=(815, 375)), *self.portraits, *self.names, self.ready_label)
+
     def get_event(self, event):
         if event.type in [pg.KEYDOWN, pg.KEYUP] and (
             event.key in Tools.PLAYER1_CONTROLS or event.key in Tools.PLAYER2_CONTROLS
         ):
             if event.type == pg.KEYUP and event.key in Tools.PLAYER1_CONTROLS:
                 if Tools.PLAYER1_CONTROLS[event.key] == "JUMP":
-                    if self._flags["P1Ready"]:
+                    if self.cpu and self._flags["P2Ready"]:
+                        self._flags["P2Ready"] = False
+                        self.grid.pointer2.toggle()
+                    elif self._flags["P1Ready"]:
                         self._flags["P1Ready"] = False
                         self.grid.pointer1.toggle()
                     elif not (self._flags["P1Ready"] and self._flags["P2Ready"]):
@@ -153,7 +171,10 @@ class CharSelect(Tools.State):
                     self._flags["P2Ready"] = False
                     self.grid.pointer2.toggle()
 
-            if event.type == pg.KEYDOWN and event.key in Tools.PLAYER1_CONTROLS:
+            if event.type == pg.KEYDOWN and event.key in Tools.PLAYER1_CONTROLS and self.cpu and self._flags["P1Ready"]:
+                self.pick_cpu(Tools.PLAYER1_CONTROLS[event.key])
+
+            elif event.type == pg.KEYDOWN and event.key in Tools.PLAYER1_CONTROLS:
 
                 if Tools.PLAYER1_CONTROLS[event.key] == "LIGHT" and not self._flags["P1Ready"]:
                     char = self.grid.pointer1.get_slot().char
@@ -192,6 +213,22 @@ class CharSelect(Tools.State):
             if self._flags["P1Ready"] and self._flags["P2Ready"]:
                 self._flags["Ready"] = True
 
+    def pick_cpu(self, button):
+        '''once player 1 is ready their keys move the cpu's pointer and pick its character'''
+        if self._flags["P2Ready"]:
+            return
+        if button == "LIGHT" and self.grid.pointer2.get_slot().char:
+            self._flags["P2Ready"] = True
+            self.grid.pointer2.toggle()
+        elif button == "UP":
+            self.grid.pointer2.index.y -= 1
+        elif button == "DOWN":
+            self.grid.pointer2.index.y += 1
+        elif button == "LEFT":
+            self.grid.pointer2.index.x -= 1
+        elif button == "RIGHT":
+            self.grid.pointer2.index.x += 1
+
     def update(self, surface, keys, current_time, delta_time):
         try:
             self.fade_caller()
@@ -207,34 +244,19 @@ class CharSelect(Tools.State):
                 self.next_state = "GAMESTATE"
                 self.wrap = self.fade_wrapper(self.fade_outs)
 
-            self.draw(surface)
-
-    def draw_portraits(self, surface):
-        temp = pg.Surface((470, 40)).convert_alpha()
-        temp.fill((0, 0, 0, 150))
-        surface.blit(temp, (0, 375))
-        surface.blit(temp, (815, 375))
-
-        char = self.grid.pointer1.get_slot().char
-        if char:
-            surface.blit(char.PORTRAIT, (40, 40))
-            name = Tools.Text(10, 385, char.NAME, self.font2, Tools.SPACE_GREY)
-            name.draw(surface)
-        
-        char = self.grid.pointer2.get_slot().char
-        if char:
-            surface.blit(char.PORTRAIT, (915, 40))
-            name = Tools.Text(825, 385, char.NAME, self.font2, Tools.SPACE_GREY)
-            name.draw(surface)
+    def show_picks(self):
+        '''points the portraits and names at the characters under each pointer'''
+        for portrait, name, pointer in zip(self.portraits, self.names, (self.grid.pointer1, self.grid.pointer2)):
+            char = pointer.get_slot().char
+            portrait.set(char.PORTRAIT if char else None)
+            name.show = char is not None
+            if char:
+                name.set(char.NAME)
 
     def draw(self, surface):
-        surface.blit(self.bg, (0, 0))
-        self.grid.draw(surface)
-        self.draw_portraits(surface)
-        if self._flags["P1Ready"] and self._flags["P2Ready"] and not self._flags["Ready"]:
-            font = pg.font.Font(Tools.FONTS["kenvector_future"], 50)
-            label = Tools.Label(Tools.SCREEN_RECT.centerx, Tools.SCREEN_RECT.centery, 1280, 50, "READY!", font, Tools.SPACE_GREY, (0, 0, 0, 150), centred=True)
-            label.draw(surface)
+        self.show_picks()
+        self.ready_label.show = self._flags["P1Ready"] and self._flags["P2Ready"] and not self._flags["Ready"]
+        return super().draw(surface)
 
     def startup(self, persistent, current_time):
         super().startup(persistent, current_time)
@@ -244,13 +266,12 @@ class CharSelect(Tools.State):
         self._flags["Ready"] = False
         self.player1 = None
         self.player2 = None
+        self.cpu = self.persist.get("CPU")
         self.grid.pointer1.show = True
         self.grid.pointer2.show = True
 
     def cleanup(self):
-        self.bg = Tools.GFX["bg"]
-        self.logo = Tools.GFX["logo"]
         if self._flags["Ready"]:
-            self.persist["CHAR1"] = self.player1
-            self.persist["CHAR2"] = self.player2
+            self.persist["CHARS"] = [self.player1, self.player2]
+            self.persist["TEAMS"] = None
         return super().cleanup()
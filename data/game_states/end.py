@@ -6,14 +6,14 @@ import datetime
 
 from .. import Tools
 
-class EndScreen(Tools.State):
+class EndScreen(Tools.MenuState):
     def __init__(self):
         super().__init__()
         self.next_state = "MAINMENU"
 
-        self.font = pg.font.Font(Tools.FONTS["kenvector_future_thin"], 20)
-        self.font2 = pg.font.Font(Tools.FONTS["kenvector_future_thin"], 30)
-        self.font3 = pg.font.Font(Tools.FONTS["kenvector_future_thin"], 40)
+        self.font = Tools.FONT.get("kenvector_future_thin", 20)
+        self.font2 = Tools.FONT.get("kenvector_future_thin", 30)
+        self.font3 = Tools.FONT.get("kenvector_future_thin", 40)
         
         grid = [[{"name": "Save P1", "label": "Save", "pos": (250 + 40, 650), "w": 500}, {"name": "Save P2", "label": "Save", "pos": (1280 - 250 - 40, 650), "w": 500}],
                 [{"name": "Exit", "label": "Exit", "pos": (80, 960 - 60), "w": 100}]]
@@ -22,6 +22,10 @@ class EndScreen(Tools.State):
 
         self.pointer = Tools.MenuPointer(Tools.SPACE_GREY, self.buttons)
 
+        # made once the result is known in startup, the winning team on the left and everyone else on the right
+        self.panels = [Tools.Image(None, topleft=(40, 40)), Tools.Image(None, topleft=(1280 - 40 - 500, 40))]
+        self.ui.add(*self.panels, *self.buttons[0], *self.buttons[1], self.pointer)
+
     def get_event(self, event):
         if event.type in [pg.KEYDOWN, pg.KEYUP] and event.key in Tools.PLAYER1_CONTROLS:
             if event.type == pg.KEYUP and Tools.PLAYER1_CONTROLS[event.key] == "LIGHT":
@@ -35,14 +39,14 @@ class EndScreen(Tools.State):
                         self.suspend = True
                         self.persist["P#"] = 1
                     else:
-                        self.save(self.users[0], self.players[0])
+                        self.save(self.users[0], self.get_player(1))
                 elif btn == "Save P2":
                     if self.users[1] is None:
                         self.higher_state = "LOGIN"
                         self.suspend = True
                         self.persist["P#"] = 2
                     else:
-                        self.save(self.users[1], self.players[1])
+                        self.save(self.users[1], self.get_player(2))
             
             if event.type == pg.KEYDOWN:
                 if Tools.PLAYER1_CONTROLS[event.key] == "UP":
@@ -60,8 +64,7 @@ class EndScreen(Tools.State):
         try:
             self.fade_caller()
         except TypeError:
-            self.pointer.update()
-            self.draw(surface)
+            self.ui.update()
         
     def save(self, user, player):
         stats = Tools.MASTER_DB.get_user_stats(user).fetchone()
@@ -87,16 +90,6 @@ class EndScreen(Tools.State):
 
         Tools.MASTER_DB.update_stats(user, wins, losses, draws, high_score, date, max_combo, games_played)
 
-    def draw(self, surface):
-        surface.blit(self.bg, (0, 0))
-        panels = self.make_player_panel(surface)
-        surface.blit(panels[0], (40, 40))
-        surface.blit(panels[1], (1280 - 40 - 500, 40))
-        for l in self.buttons:
-            for button in l:
-                button.draw(surface)
-        self.pointer.draw(surface)
-    
     def create_buttons(self, grid):
         temp = []
         for l in grid:
@@ -108,43 +101,70 @@ class EndScreen(Tools.State):
 
         return temp
 
-    def make_player_panel(self, surface):
-        panels = []
+    def get_player(self, num):
+        '''the fighter that player "num" controlled, the save buttons go by number not by panel'''
         for player in self.players:
-            panel = pg.Surface((500, 650)).convert_alpha()
-            panel.fill((*Tools.BLACK, 150))
-            x = 40
-            y = player.get_portrait().get_height() + 60
-            name = Tools.Text(x, y, player.get_name(), self.font, Tools.SPACE_GREY)
-            score = Tools.Text(x, y + 40, "Score: " + str(player.score), self.font, Tools.SPACE_GREY)
-            combo = Tools.Text(x, y + 60, "Combo: " + str(player.combo), self.font, Tools.SPACE_GREY)
-
-            if player.win:
-                winner = self.font3.render("Winner", True, Tools.SPACE_GREY)
-                panel.blit(winner, winner.get_rect(midtop=(250, 10)))
-                port = player.get_portrait()
-            else:
-                port = pg.transform.flip(player.get_portrait(), True, False)
-            
-            panel.blit(port, port.get_rect(midtop=(250, 50)))
-        
-            name.draw(panel)
-            score.draw(panel)
-            combo.draw(panel)
+            if player.num == num:
+                return player
+
+    def make_panel(self, players, win):
+        '''one side of the result. a lone player gets the full portrait, a team is listed a row each'''
+        if len(players) == 1:
+            return self.make_player_panel(players[0])
+        panel = pg.Surface((500, 650)).convert_alpha()
+        panel.fill((*Tools.BLACK, 150))
+        if win:
+            winner = Tools.TEXT.render(self.font3, "Winners", Tools.SPACE_GREY)
+            panel.blit(winner, winner.get_rect(midtop=(250, 10)))
+        for i, player in enumerate(players):
+            y = 70 + i * 140
+            thumb = player.get_thumb()
+            if not win:
+                thumb = pg.transform.flip(thumb, True, False)
+            panel.blit(thumb, (40, y))
+            x = 40 + thumb.get_width() + 30
+            Tools.Text(x, y, player.get_name(), self.font, Tools.SPACE_GREY).draw(panel)
+            Tools.Text(x, y + 40, "Score: " + str(player.score), self.font, Tools.SPACE_GREY).draw(panel)
+            Tools.Text(x, y + 60, "Combo: " + str(player.combo), self.font, Tools.SPACE_GREY).draw(panel)
+        return panel
+
+    def make_player_panel(self, player):
+        panel = pg.Surface((500, 650)).convert_alpha()
+        panel.fill((*Tools.BLACK, 150))
+        x = 40
+        y = player.get_portrait().get_height() + 60
+        name = Tools.Text(x, y, player.get_name(), self.font, Tools.SPACE_GREY)
+        score = Tools.Text(x, y + 40, "Score: " + str(player.score), self.font, Tools.SPACE_GREY)
+        combo = Tools.Text(x, y + 60, "Combo: " + str(player.combo), self.font, Tools.SPACE_GREY)
 
-            panels.append(panel)
+        if player.win:
+            winner = Tools.TEXT.render(self.font3, "Winner", Tools.SPACE_GREY)
+            panel.blit(winner, winner.get_rect(midtop=(250, 10)))
+            port = player.get_portrait()
+        else:
+            port = pg.transform.flip(player.get_portrait(), True, False)
         
-        return panels
+        panel.blit(port, port.get_rect(midtop=(250, 50)))
+    
+        name.draw(panel)
+        score.draw(panel)
+        combo.draw(panel)
+        return panel
 
     def startup(self, persistent, current_time):
         super().startup(persistent, current_time)
         self.wrap = self.fade_wrapper(self.fade_ins)
         self.users = [None, None]
         self.players = self.persist["PLAYERS"]
+        result = self.persist["RESULT"]
+        self.panels[0].set(self.make_panel(result["winners"], True))
+        self.panels[1].set(self.make_panel(result["losers"], False))
 
     def resume(self, persistent, current_time):
         super().resume(persistent, current_time)
         self.users[self.persist["P#"] - 1] = self.persist["UUID"]
 
     def cleanup(self):
+        for panel in self.panels:
+            panel.set(None)
         return super().cleanup()
@@ -3,6 +3,9 @@ import pygame.gfxdraw as pgfx
 import os
 import math
 from .. import Tools
+from .. import Replay
+from .. import Physics
+from .. import Cpu
 
 
 class Stage:
@@ -20,33 +23,79 @@ class Stage:
         surface.blit(self.stage_surface, (0, 0))
 
 
-class Player(pg.sprite.Sprite):
-    def __init__(self, char, num, x, y):
+class Player(pg.sprite.DirtySprite):
+    def __init__(self, char, num, x, y, team=None):
         super().__init__()
         self.num = num
+        self.team = num if team is None else team  # players on the same team can't hit each other
+        self.char_key = char.__name__.rsplit(".", 1)[-1]  # name of the character in Tools.CHARS
         self.char_name = char.NAME
         self.char_thumb = char.THUMB
         self.char_portrait = char.PORTRAIT
         self.char = char.main(self.num, Tools.CONTROLS[self.num - 1], x, y)
+        self.controller = self.char.buttons  # turns the key state into a button mask, unless a cpu plays
         self.score = 0
         self.combo = 0
         self.max_combo = 0
+        self.damage = 0  # hp taken off other players this match
         self.win = False
+        self.hit_by = None  # number of the player that last hit this one
+        self.prev_pos = Tools.VEC(self.pos)
     
-    def update(self, keys, current_time, delta_time):
-        self.char.update(keys, current_time, delta_time)
-        if self.pos.x < 0:
-            self.pos.x = 0
-        elif self.pos.x > (Tools.SCREEN_SIZE[0] + 60 - self.image.get_width()):
-            self.pos.x = (Tools.SCREEN_SIZE[0] + 60 - self.image.get_width())
-
+    def update(self, held, current_time, delta_time):
+        self.prev_pos.update(self.pos)
+        self.char.update(held, current_time, delta_time)
         if self.combo > self.max_combo:
             self.max_combo = self.combo
 
+    def knocked_out(self):
+        '''takes the place of update once the player has no hp left. it stops where it is and drops to the floor'''
+        self.prev_pos.update(self.pos)
+        self.char.vel.x = 0
+        self.char.gravity = True
+
+    def release(self):
+        '''lets go of the fighter once its match is over, and with it the character's sprite sheets. everything
+        the end screen shows is kept on the player itself'''
+        self.char = None
+        self.controller = None
+        self.image = None
+
+    def pose(self):
+        '''draws the character where the physics world left it'''
+        self.char.draw()
         self.image = self.char.image
         self.rect = self.char.rect
-        self.mask = self.char.mask
     
+    def snapshot(self):
+        return {
+            "score": self.score,
+            "combo": self.combo,
+            "max_combo": self.max_combo,
+            "damage": self.damage,
+            "win": self.win,
+            "hit_by": self.hit_by,
+            "prev_pos": tuple(self.prev_pos),
+            "char": self.char.snapshot(),
+        }
+
+    def restore(self, snapshot):
+        self.score = snapshot["score"]
+        self.combo = snapshot["combo"]
+        self.max_combo = snapshot["max_combo"]
+        self.damage = snapshot["damage"]
+        self.win = snapshot["win"]
+        self.hit_by = snapshot["hit_by"]
+        self.prev_pos = Tools.VEC(snapshot["prev_pos"])
+        self.char.restore(snapshot["char"])
+        self.image = self.char.image
+        self.rect = self.char.rect
+
+    def get_render_rect(self, alpha):
+        '''rect moved to where the player sits between its previous and current update position'''
+        offset = self.prev_pos.lerp(self.pos, alpha) - self.pos
+        return self.char.rect.move(round(offset.x), round(offset.y))
+
     def get_name(self):
         return self.char_name
     
@@ -57,16 +106,16 @@ class Player(pg.sprite.Sprite):
         return self.char_portrait
 
     def lose_hp(self, num):
-        self.hp -= num
+        self.char.hp -= num
     
     def gain_hp(self, num):
-        self.hp += num
+        self.char.hp += num
 
     def gain_energy(self, num):
-        self.energy += num
+        self.char.energy += num
 
     def lose_energy(self, num):
-        self.energy -= num
+        self.char.energy -= num
 
     def hit(self):
         self.char.hit_count += 1
@@ -100,55 +149,146 @@ class Player(pg.sprite.Sprite):
         return self.is_aerial() or self.is_ground() or self.is_hit()
     
     def __getattr__(self, name):
+        if name.startswith("_"):
+            # keeps sprite internals looked up before the char exists from recursing
+            raise AttributeError(name)
         return getattr(self.char, name)
 
 
+# the hud panel for one player. the parts that never change during a match are drawn once into a background
+# shared by every match, and the bars are only drawn again when hp or energy change or the damage trail moves
 class PlayerInfo:
+    pointers = {}  # the pointer drawn in each colour, shared by every match
+    backgrounds = {}  # the panel without its bars, and the portrait drawn over them, for each character and side
+
     def __init__(self, player):
         self.player = player
         self.max_hp = 1000
         self.max_energy = 300
         self.width = 520
         self.height = 150
-        self.hp_w = 400
+        self.hp_bar = pg.Rect(100, 11, 400, 28)
+        self.energy_bar = pg.Rect(145, 50, 300, 8)
+        self.trail_delay = 400  # ms the damage trail waits after a hit before it shrinks
+        self.trail_speed = 0.4  # pixels the damage trail shrinks by each ms
         self.y_off = 20
         self.x_off = 20
-        self.surf = pg.Surface((self.width, self.height)).convert_alpha()
-        self.surf.fill((0, 0, 0, 0))
-        self.pointer = pg.Surface((50, 40)).convert_alpha()
-        self.pointer.fill((0, 0, 0, 0))
-        self.pointer_colour = None
+        self.pointer_colour = Tools.PLAYER_COLOURS[self.player.num - 1]
+        self.pointer = self.make_pointer(self.pointer_colour)
+        # odd numbered players get the left column and even ones the right, with players 3 and 4 a row lower
+        self.left = self.player.num % 2 == 1
+        self.y_off += ((self.player.num - 1) // 2) * (self.height - 10)
         self.win = False
-
-    def update(self):
-        self.hp_w = (400 / self.max_hp) * (self.player.hp)
-        if self.player.num == 1:
-            self.pointer_colour = Tools.PLAYER_1_BLUE
+        self.background, self.portrait = self.make_background(self.player, self.left)
+        self.surf = self.background.copy()
+        self.hp_w = self.hp_bar.w
+        self.trail_w = self.hp_bar.w  # where the hp bar was before the last hits, shrinking down to it
+        self.trail_wait = 0
+        self.energy_w = 0
+        self.redraw = True
+
+        # the panel and pointer are dirty sprites so only the screen areas they change get redrawn
+        self.panel = pg.sprite.DirtySprite()
+        self.panel.image = self.surf
+        if self.left:
+            self.panel.rect = self.surf.get_rect(topleft=(self.x_off, self.y_off))
         else:
-            self.pointer_colour = Tools.PLAYER_2_PURPLE
-
-    def draw(self, surface):
-        pgfx.aapolygon(self.surf, [(70, 5), (520, 5), (500, 45), (50, 45)], Tools.SPACE_GREY)
-        pgfx.filled_polygon(self.surf, [(70, 5), (520, 5), (500, 45), (50, 45)], Tools.SPACE_GREY)
-        pgfx.box(self.surf, pg.Rect(100, 11, 400, 28), (75, 75, 75))
+            self.panel.rect = self.surf.get_rect(topright=(Tools.SCREEN_SIZE[0] - self.x_off, self.y_off))
+        self.marker = pg.sprite.DirtySprite()
+        self.marker.image = self.pointer
+        self.marker.rect = self.pointer.get_rect()
+
+    @classmethod
+    def make_pointer(cls, colour):
+        if colour not in cls.pointers:
+            pointer = pg.Surface((50, 40)).convert_alpha()
+            pointer.fill((0, 0, 0, 0))
+            pgfx.aatrigon(pointer, 0, 0, 50, 0, 25, 30, colour)
+            pgfx.filled_trigon(pointer, 0, 0, 50, 0, 25, 30, colour)
+            cls.pointers[colour] = pointer
+        return cls.pointers[colour]
+
+    @classmethod
+    def make_background(cls, player, left):
+        '''the panel with empty bars and the portrait on its own, which overlaps the hp bar and so goes back over
+        it whenever it is drawn. both are mirrored for players on the right'''
+        key = (player.char_key, left)
+        if key not in cls.backgrounds:
+            portrait = pg.Surface((520, 150)).convert_alpha()
+            portrait.fill((0, 0, 0, 0))
+            pgfx.aacircle(portrait, 70, 74, 70, Tools.SPACE_GREY)
+            pgfx.filled_circle(portrait, 70, 74, 70, Tools.SPACE_GREY)
+            pgfx.aacircle(portrait, 70, 74, 60, Tools.NICE_GREY)
+            pgfx.filled_circle(portrait, 70, 74, 60, Tools.NICE_GREY)
+            portrait.blit(player.get_thumb(), player.get_thumb().get_rect(center=(70, 74)))
+
+            surf = pg.Surface((520, 150)).convert_alpha()
+            surf.fill((0, 0, 0, 0))
+            pgfx.aapolygon(surf, [(70, 5), (520, 5), (500, 45), (50, 45)], Tools.SPACE_GREY)
+            pgfx.filled_polygon(surf, [(70, 5), (520, 5), (500, 45), (50, 45)], Tools.SPACE_GREY)
+            pgfx.box(surf, pg.Rect(100, 11, 400, 28), (75, 75, 75))
+            pgfx.box(surf, pg.Rect(145, 50, 300, 8), (75, 75, 75))
+            surf.blit(portrait, (0, 0))
+            if not left:
+                surf = pg.transform.flip(surf, True, False)
+                portrait = pg.transform.flip(portrait, True, False)
+            cls.backgrounds[key] = (surf, portrait)
+        return cls.backgrounds[key]
+
+    def update(self, delta_time=0):
+        '''works out the bar widths. the damage trail is moved by time rather than by update, so it shrinks
+        at the same speed whatever the tick rate'''
+        hp_w = int(self.hp_bar.w * max(self.player.hp, 0) / self.max_hp)
+        if hp_w != self.hp_w:
+            if hp_w < self.hp_w:
+                self.trail_wait = self.trail_delay
+            self.hp_w = hp_w
+            self.trail_w = max(self.trail_w, hp_w)
+            self.redraw = True
+
+        energy_w = int(self.energy_bar.w * min(max(self.player.energy, 0), self.max_energy) / self.max_energy)
+        if energy_w != self.energy_w:
+            self.energy_w = energy_w
+            self.redraw = True
+
+        if self.trail_w > self.hp_w:
+            if self.trail_wait > 0:
+                self.trail_wait -= delta_time
+            else:
+                self.trail_w = max(self.hp_w, self.trail_w - self.trail_speed * delta_time)
+                self.redraw = True
+
+    def bar(self, bar, w):
+        '''the filled part of a bar "w" pixels wide, which starts from the end of the bar by the portrait'''
+        if self.left:
+            return pg.Rect(bar.x, bar.y, w, bar.h)
+        return pg.Rect(self.width - bar.x - w, bar.y, w, bar.h)
+
+    def draw_bars(self):
+        for bar in (self.hp_bar, self.energy_bar):
+            area = self.bar(bar, bar.w)
+            self.surf.blit(self.background, area, area)
+        if int(self.trail_w) > self.hp_w:
+            pgfx.box(self.surf, self.bar(self.hp_bar, int(self.trail_w)), (170, 40, 40))
         if self.hp_w > 0:
-            pgfx.box(self.surf, pg.Rect(100, 11, self.hp_w, 28), (0, 128, 0))
-        pgfx.aacircle(self.surf, 70, 74, 70, Tools.SPACE_GREY)
-        pgfx.filled_circle(self.surf, 70, 74, 70, Tools.SPACE_GREY)
-        pgfx.aacircle(self.surf, 70, 74, 60, Tools.NICE_GREY)
-        pgfx.filled_circle(self.surf, 70, 74, 60, Tools.NICE_GREY)
-
-        self.surf.blit(self.player.get_thumb(), self.player.get_thumb().get_rect(center=(70, 74)))
-
-        pgfx.aatrigon(self.pointer, 0, 0, 50, 0, 25, 30, self.pointer_colour)
-        pgfx.filled_trigon(self.pointer, 0, 0, 50, 0, 25, 30, self.pointer_colour)
-
-        if self.player.num == 1:
-            surface.blit(self.surf, (self.x_off, self.y_off))
-        elif self.player.num == 2:
-            surface.blit(pg.transform.flip(self.surf, True, False), (Tools.SCREEN_SIZE[0] - self.x_off - self.width, self.y_off))
-        
-        surface.blit(self.pointer, self.pointer.get_rect(midbottom=(self.player.rect.centerx, self.player.rect.top - 20)))
+            pgfx.box(self.surf, self.bar(self.hp_bar, self.hp_w), (0, 128, 0))
+        if self.energy_w > 0:
+            pgfx.box(self.surf, self.bar(self.energy_bar, self.energy_w), (40, 110, 200))
+        area = self.bar(self.hp_bar, self.hp_bar.w)
+        self.surf.blit(self.portrait, area, area)
+
+    def draw(self):
+        '''redraws the bars if they changed and moves the pointer above the player, marking whichever changed
+        as dirty'''
+        if self.redraw:
+            self.draw_bars()
+            self.panel.dirty = 1
+            self.redraw = False
+
+        rect = self.pointer.get_rect(midbottom=(self.player.rect.centerx, self.player.rect.top - 20))
+        if rect != self.marker.rect:
+            self.marker.rect = rect
+            self.marker.dirty = 1
 
 
 class GameState(Tools.State):
@@ -158,111 +298,278 @@ class GameState(Tools.State):
         self.higher_state = "PAUSEMENU"
         self.stage = Stage()
         self.players = pg.sprite.Group()
+        self.fighters = []  # the players in player number order
+        self.sweep = []  # the players sorted by the left edge of their reach for the broadphase
+        self.world = Physics.World(self.stage.floor, 0, Tools.SCREEN_SIZE[0] + 60)
+        # everything drawn over the stage during a fight. the stage is only used to clear behind them
+        self.sprites = pg.sprite.LayeredDirty()
+        self.sprites.clear(Tools.SCREEN, self.stage.stage_surface)
+        self.font = Tools.FONT.get("kenvector_future", 50)
+        self.alpha = 1.0
+        self.repaint = True
+        self.record_replays = True
+        self.recorder = None
+        self.assets += ["stage/bg", "stage/fg"]
+        self.art = []  # GFX keys of the sheets of the characters in the match, pinned while it is on
 
     def get_event(self, event):
         if event.type in [pg.KEYUP, pg.KEYDOWN]:
             if event.type == pg.KEYUP and event.key == pg.K_ESCAPE:
                 self.suspend = True
-            else:
-                for player in self.players:
-                    player.get_event(event)
 
     def update(self, surface, keys, current_time, delta_time):
         try:
             self.fade_caller()
         except TypeError:
             if not self.end_game:
-                self.players.update(keys, current_time, delta_time)
-                self.main_collisions()
-                self.clac_scores()
-                self.check_game_end(current_time)
-
-                for i in self.infos:
-                    i.update()
+                inputs = self.read_input(keys)
+                if self.recorder is not None:
+                    self.recorder.record(inputs, self, current_time, delta_time)
+                self.step(inputs, current_time, delta_time)
             else:
                 if (current_time - self.end_time) > 2000:
                     self.next_state = "ENDSCREEN"
                     self.wrap = self.fade_wrapper(self.fade_outs)
+            self.update_infos(delta_time)
+
+    def update_infos(self, delta_time):
+        '''moves the hud on to the fight as it is now. this is done once per update of the state rather than in
+        step, which the cpu lookahead and rollbacks also call to try out updates that are then undone'''
+        for i in self.infos:
+            i.update(delta_time)
+
+    def read_input(self, keys):
+        '''packs the raw key state into each fighter's button mask, once per update. a knocked out fighter
+        gets nothing, so a cpu playing one doesn't think either'''
+        return [player.controller.pack(keys) if player.hp > 0 else 0 for player in self.fighters]
+
+    def step(self, inputs, current_time, delta_time):
+        '''advances the fight itself by one update. "inputs" holds each fighter's button mask'''
+        self.current_time = current_time
+        for player, held in zip(self.fighters, inputs):
+            if player.hp > 0:
+                player.update(held, current_time, delta_time)
+            else:
+                player.knocked_out()
+        self.world.step()
+        for player in self.fighters:
+            player.pose()
+        self.main_collisions()
+        self.clac_scores()
+        self.check_game_end(current_time)
+
+    def snapshot(self):
+        '''returns everything needed to put the fight back to this exact update as plain python values'''
+        return {
+            "current_time": self.current_time,
+            "players": [player.snapshot() for player in self.fighters],
+            "end_game": self.end_game,
+            "end_time": self.end_time,
+        }
+
+    def restore(self, snapshot):
+        self.current_time = snapshot["current_time"]
+        for player, player_snapshot in zip(self.fighters, snapshot["players"]):
+            player.restore(player_snapshot)
+        self.end_game = snapshot["end_game"]
+        self.end_time = snapshot["end_time"]
+        self.winners = []
+        self.losers = []
+        if self.end_game:
+            self.check_game_end(self.end_time)
+        elif self.banner is not None:
+            self.banner.kill()
+            self.banner = None
+
+    def collide(self, attacker, defender):
+        '''whether a hitbox of the attacker's frame overlaps a hurtbox of the defender's frame'''
+        hurtboxes = [box.move(defender.rect.topleft) for box in defender.frame["hurtboxes"]]
+        for box in attacker.frame["hitboxes"]:
+            if box.move(attacker.rect.topleft).collidelist(hurtboxes) != -1:
+                return True
+        return False
+
+    def strike(self, attacker, defender):
+        '''deals the attacker's damage if its current attack connects and hasn't already hit the defender'''
+        if defender.num not in attacker.attack_hits and self.collide(attacker, defender):
+            attacker.attack_hits.append(defender.num)
+            defender.hit_by = attacker.num
+            defender.lose_hp(attacker.dmg)
+            attacker.damage += attacker.dmg
+            defender.hit()
+
+    def broadphase(self):
+        '''sort and sweep along x over the reach of every player, returning the pairs from different teams
+        whose reaches overlap, ordered by player number. knocked out players are left out of the pairs.
+        the sweep order is kept between updates and barely changes, so the insertion sort that fixes it up
+        is close to a single pass'''
+        boxes = {player: player.frame["reach"].move(player.rect.topleft) for player in self.sweep}
+        for i in range(1, len(self.sweep)):
+            player = self.sweep[i]
+            j = i - 1
+            while j >= 0 and boxes[self.sweep[j]].left > boxes[player].left:
+                self.sweep[j + 1] = self.sweep[j]
+                j -= 1
+            self.sweep[j + 1] = player
+
+        pairs = []
+        for i, player in enumerate(self.sweep):
+            if player.hp <= 0:
+                continue
+            box = boxes[player]
+            for other in self.sweep[i + 1:]:
+                if boxes[other].left >= box.right:
+                    break
+                if player.team != other.team and other.hp > 0 and box.colliderect(boxes[other]):
+                    pairs.append(tuple(sorted((player, other), key=lambda p: p.num)))
+        pairs.sort(key=lambda pair: (pair[0].num, pair[1].num))
+        return pairs
+
+    def can_strike(self, attacker, defender):
+        '''an attack lands on a vulnerable player, or on an attacking one whose attack started earlier'''
+        if not attacker.is_attack():
+            return False
+        if defender.is_attack():
+            return attacker.attack_time > defender.attack_time
+        return defender.is_vulnerable()
 
-            self.draw(surface)
-    
     def main_collisions(self):
-        if self.player_1.is_attack() and self.player_2.is_attack():
-            if self.player_1.attack_time > self.player_2.attack_time:
-                if pg.sprite.collide_mask(self.player_1, self.player_2):
-                    self.player_2.lose_hp(self.player_1.dmg)
-                    self.player_2.hit()
-            elif self.player_2.attack_time > self.player_1.attack_time:
-                if pg.sprite.collide_mask(self.player_2, self.player_1):
-                    self.player_1.lose_hp(self.player_2.dmg)
-                    self.player_1.hit()
-        elif self.player_1.is_attack() and self.player_2.is_vulnerable():
-            if pg.sprite.collide_mask(self.player_1, self.player_2):
-                self.player_2.lose_hp(self.player_1.dmg)
-                self.player_2.hit()
-        elif self.player_2.is_attack() and self.player_1.is_vulnerable():
-            if pg.sprite.collide_mask(self.player_2, self.player_1):
-                self.player_1.lose_hp(self.player_2.dmg)
-                self.player_1.hit()
-    
+        for player_a, player_b in self.broadphase():
+            # one of them may have gone down to an earlier pair this update
+            if player_a.hp <= 0 or player_b.hp <= 0:
+                continue
+            if self.can_strike(player_a, player_b):
+                self.strike(player_a, player_b)
+            elif self.can_strike(player_b, player_a):
+                self.strike(player_b, player_a)
+
     def check_game_end(self, current_time):
-        if self.player_2.hp <= 0:
-            self.winner = self.player_1
-            self.loser = self.player_2
-            self.player_1.win = True
-            self.end_game = True
-            self.end_time = current_time
-        elif self.player_1.hp <= 0:
-            self.winner = self.player_2
-            self.loser = self.player_1
-            self.player_2.win = True
+        '''the match is over once only one team has anyone left standing. if the last players standing
+        go down on the same update, player 1's team wins'''
+        standing = [player for player in self.fighters if player.hp > 0]
+        teams = {player.team for player in standing}
+        if len(teams) <= 1:
+            team = teams.pop() if teams else self.fighters[0].team
+            self.winners = [player for player in self.fighters if player.team == team]
+            self.losers = [player for player in self.fighters if player.team != team]
+            for player in self.winners:
+                player.win = True
             self.end_game = True
             self.end_time = current_time
-    
+
     def clac_scores(self):
-        self.player_1.combo = self.player_2.hit_count
-        self.player_2.combo = self.player_1.hit_count
+        for p in self.fighters:
+            # a player's combo is how many hits in a row the players it last hit are on
+            p.combo = max((other.hit_count for other in self.fighters if other.hit_by == p.num), default=0)
 
         for p in self.players:
             p.score += 0.2 * p.combo
             p.score = round(p.score)
 
+    def render(self, surface, alpha):
+        self.alpha = alpha
+        if self.wrap is not None:
+            # a fade is painting the screen so everything has to be redrawn once it ends
+            self.repaint = True
+        return super().render(surface, alpha)
+
+    def invalidate(self, rect):
+        self.sprites.repaint_rect(rect)
+
     def draw(self, surface):
-        self.stage.draw(surface)
-        self.players.draw(surface)
+        '''only redraws the parts of the screen the sprites moved over or changed and returns those rects'''
+        for player in self.players:
+            player.rect = player.get_render_rect(self.alpha)
+            player.dirty = 1
         for i in self.infos:
-            i.draw(surface)
+            i.draw()
 
-        if self.end_game:
-            font = pg.font.Font(Tools.FONTS["kenvector_future"], 50)
-            label = Tools.Label(Tools.SCREEN_RECT.centerx, Tools.SCREEN_RECT.centery, 1280, 50, "GAME OVER!", font, Tools.SPACE_GREY, (0, 0, 0, 150), centred=True)
-            label.draw(surface)
+        if self.end_game and self.banner is None:
+            self.show_banner()
+
+        if self.repaint or not Tools.DIRTY_RECTS:
+            self.sprites.repaint_rect(Tools.SCREEN_RECT)
+            self.repaint = False
+        return self.sprites.draw(surface)
+
+    def show_banner(self):
+        label = Tools.Label(Tools.SCREEN_RECT.centerx, Tools.SCREEN_RECT.centery, 1280, 50, "GAME OVER!", self.font, Tools.SPACE_GREY, (0, 0, 0, 150), centred=True)
+        self.banner = pg.sprite.DirtySprite()
+        self.banner.image = label.image
+        self.banner.rect = label.image.get_rect(center=(label.x, label.y))
+        self.sprites.add(self.banner, layer=4)
+
+    def spawn_x(self, num):
+        '''odd numbered players start on the left and even ones on the right, later ones nearer the middle'''
+        offset = ((num - 1) // 2) * 240
+        return 100 + offset if num % 2 == 1 else 1180 - offset
 
     def startup(self, persistent, current_time):
         super().startup(persistent, current_time)
         self.start_time = current_time
         self.wrap = self.fade_wrapper(self.fade_ins)
-        self.player_1 = Player(self.persist["CHAR1"], 1, 100, self.stage.floor)
-        self.player_2 = Player(self.persist["CHAR2"], 2, 1180, self.stage.floor)
-        self.players.add(self.player_1)
-        self.players.add(self.player_2)
-        self.infos = [PlayerInfo(self.player_1), PlayerInfo(self.player_2)]
-        self.winner = None
-        self.loser = None
+        chars = self.persist["CHARS"]
+        if not 2 <= len(chars) <= Tools.MAX_PLAYERS:
+            raise ValueError("a match needs 2 to %d players, got %d" % (Tools.MAX_PLAYERS, len(chars)))
+        teams = self.persist.get("TEAMS")
+        if teams is None or len(teams) != len(chars):
+            teams = list(range(1, len(chars) + 1))  # free for all
+        # only the characters picked are loaded, and they stay loaded until the match is left
+        self.art = sorted({char.ART for char in chars})
+        Tools.GFX.pin(*self.art)
+        self.fighters = [Player(char, num, self.spawn_x(num), self.stage.floor, team)
+                         for num, (char, team) in enumerate(zip(chars, teams), 1)]
+        self.sweep = list(self.fighters)
+        # persistent["CPU"] maps the number of each player the cpu plays to its level
+        for num, level in (self.persist.get("CPU") or {}).items():
+            self.fighters[num - 1].controller = Cpu.Controller(self, self.fighters[num - 1], level)
+        for player in self.fighters:
+            self.world.add(player.char)
+        self.players.add(self.fighters)
+        self.infos = [PlayerInfo(player) for player in self.fighters]
+        self.sprites.add(self.players, layer=1)
+        for i in self.infos:
+            self.sprites.add(i.marker, layer=2)
+            self.sprites.add(i.panel, layer=3)
+        self.banner = None
+        self.repaint = True
+        self.winners = []
+        self.losers = []
         self.end_game = False
         self.end_time = None
         self.persist["EXIT_NOSAVE"] = False
+        if self.record_replays:
+            chars = [player.char_key for player in self.fighters]
+            teams = [player.team for player in self.fighters]
+            self.recorder = Replay.Recorder(chars, teams)
 
     def resume(self, persistent, current_time):
         super().resume(persistent, current_time)
+        self.repaint = True
         if self.persist["EXIT_NOSAVE"]:
             self.wrap = self.fade_wrapper(self.fade_outs)
             self.next_state = "MAINMENU"
 
     def cleanup(self):
         self.players.empty()
+        self.sprites.empty()
+        if self.recorder is not None and self.recorder.frame:
+            self.persist["REPLAY"] = self.recorder.save()
+        self.recorder = None
         if not self.persist["EXIT_NOSAVE"]:
-            self.persist["PLAYERS"] = (self.winner, self.loser)
+            self.persist["PLAYERS"] = tuple(self.winners + self.losers)
+            self.persist["RESULT"] = {"team": self.winners[0].team if self.winners else None,
+                                      "winners": tuple(self.winners), "losers": tuple(self.losers)}
         else:
             self.persist["EXIT_NOSAVE"] = False
+        for player in self.fighters:
+            player.release()
+        self.fighters = []
+        self.sweep = []
+        self.infos = []
+        self.winners = []
+        self.losers = []
+        self.world.clear()
+        Tools.GFX.unpin(*self.art)
+        self.art = []
         return super().cleanup()
@@ -0,0 +1,40 @@
+import pygame as pg
+
+from .. import Tools
+from .. import Loader
+
+
+# first state on screen. shows the splash and a progress bar while Loader fills in the assets
+class LoadingScreen(Tools.State):
+    def __init__(self):
+        super().__init__()
+        self.bg_key = "splash"
+        self.assets.append("splash")
+        self.font = Tools.FONT.get("kenvector_future_thin", 20)
+        self.bar = pg.Rect(0, 0, 600, 16)
+        self.bar.midbottom = (Tools.SCREEN_RECT.centerx, Tools.SCREEN_RECT.bottom - 60)
+        self.budget = 8  # ms of each update given to converting and storing what the workers loaded
+
+    def update(self, surface, keys, current_time, delta_time):
+        try:
+            self.fade_caller()
+        except TypeError:
+            if self.loader.pump(self.budget):
+                self.next_state = self.target
+                self.wrap = self.fade_wrapper(self.fade_outs)
+
+    def draw(self, surface):
+        surface.blit(self.bg, (0, 0))
+        pg.draw.rect(surface, Tools.NICE_GREY, self.bar)
+        pg.draw.rect(surface, Tools.SPACE_GREY, (*self.bar.topleft, round(self.bar.w * self.loader.progress), self.bar.h))
+        text = Tools.TEXT.render(self.font, "LOADING %d%%" % (self.loader.progress * 100), Tools.SPACE_GREY)
+        surface.blit(text, text.get_rect(midbottom=(self.bar.centerx, self.bar.top - 10)))
+
+    def startup(self, persistent, current_time):
+        '''persistent holds the state to go to once loading finishes and the data to hand it'''
+        super().startup(persistent, current_time)
+        self.target = persistent["START"]
+        self.persist = persistent["PERSIST"] or {}
+        self.next_state = None  # nothing is pre-warmed before the assets it needs exist
+        self.loader = Loader.AssetLoader()
+        self.loader.start()
@@ -5,12 +5,16 @@ import sgc
 from .. import Tools
 
 
-class Login(Tools.State):
+class Login(Tools.OverlayState):
     def __init__(self):
         super().__init__()
         self.next_state = "REGISTER"
+        self.font = Tools.FONT.get("kenvector_future_thin", 20)
         self.create_menu()
         self.pointer = Tools.MenuPointer(Tools.SPACE_GREY, self.buttons)
+        self.message = Tools.Text(Tools.SCREEN_RECT.centerx, Tools.SCREEN_RECT.centery - 80, "", self.font, Tools.RED, centred=True)
+        self.message.show = False
+        self.ui.add(self.menu, self.message, *self.buttons[0], self.pointer)
         self.user_id = None
         self._flags["login_error"] = False
         self._flags["reg_error"] = False
@@ -37,7 +41,7 @@ class Login(Tools.State):
                         self.pointer.index.x += 1
 
     def update(self, surface, keys, current_time, delta_time):
-        self.pointer.update()
+        self.ui.update()
         if self.user_id:
             self.persist["UUID"] = self.user_id
             self.persist["P#"] = self.player
@@ -45,36 +49,19 @@ class Login(Tools.State):
         elif self.user_id is False:
             self._flags["login_error"] = True
 
-        self.draw(surface)
-
     def draw(self, surface):
-        surface.blit(self.old_screen, (0, 0))
-
-        temp = pg.Surface(surface.get_size()).convert_alpha()
-        temp.fill(Tools.BLACK)
-        temp.set_alpha(50)
-        surface.blit(temp, (0, 0))
-
-        font = pg.font.Font(Tools.FONTS["kenvector_future_thin"], 20)
-        rect = self.menu.get_rect(center=Tools.SCREEN_RECT.center)
-        surface.blit(self.menu, rect)
-
-        text = None
-        if self._flags["login_error"]:
-            text = Tools.Text(Tools.SCREEN_RECT.centerx, Tools.SCREEN_RECT.centery - 80, "Invalid credentials...", font, Tools.RED, centred=True)
-        if self._flags["reg_error"]:
-            text = Tools.Text(Tools.SCREEN_RECT.centerx, Tools.SCREEN_RECT.centery - 80, "User already exists or invalid credentials", font, Tools.RED, centred=True)
         if self._flags["reg_success"]:
-            text = Tools.Text(Tools.SCREEN_RECT.centerx, Tools.SCREEN_RECT.centery - 80, "Successfully registered user", font, Tools.GREEN, centred=True)
-
-        if text is not None:
-            text.draw(surface)
-
-        for l in self.buttons:
-            for btn in l:
-                btn.draw(surface)
-
-        self.pointer.draw(surface)
+            self.message.set("Successfully registered user", Tools.GREEN)
+        elif self._flags["reg_error"]:
+            self.message.set("User already exists or invalid credentials", Tools.RED)
+        elif self._flags["login_error"]:
+            self.message.set("Invalid credentials...", Tools.RED)
+        self.message.show = self._flags["login_error"] or self._flags["reg_error"] or self._flags["reg_success"]
+
+        # sgc draws the input boxes over the menu after this, so they are put back and pushed every frame
+        for rect in self.box_rects:
+            self.ui.invalidate(rect)
+        return super().draw(surface)
     
     def register(self, user, password):
         for row in Tools.MASTER_DB.get_login_details():
@@ -97,23 +84,25 @@ class Login(Tools.State):
             self.user_id = False
     
     def create_menu(self):
-        self.user_box = sgc.InputBox((300, 50), pos=(Tools.SCREEN_RECT.centerx - 150, Tools.SCREEN_RECT.centery - 25 - 20), default="Input username...")
-        self.pass_box = sgc.InputBox((300, 50), pos=(Tools.SCREEN_RECT.centerx - 150, Tools.SCREEN_RECT.centery - 25 + 30), default="Input password...")
-        self.menu = pg.Surface((600, 400)).convert_alpha()
-        self.menu.fill((*Tools.BLACK, 150))
-
-        font = pg.font.Font(Tools.FONTS["kenvector_future_thin"], 50)
-        title = font.render("Login", True, Tools.SPACE_GREY)
-        self.menu.blit(title, (600 // 2 - title.get_width() // 2, 20))
-        pg.draw.line(self.menu, Tools.SPACE_GREY, (600 // 2 - title.get_width() - 20, 80), (600 // 2 + title.get_width() + 20, 80), 7)
+        self.box_rects = [pg.Rect(Tools.SCREEN_RECT.centerx - 150, Tools.SCREEN_RECT.centery - 25 - 20, 300, 50),
+                          pg.Rect(Tools.SCREEN_RECT.centerx - 150, Tools.SCREEN_RECT.centery - 25 + 30, 300, 50)]
+        self.user_box = sgc.InputBox((300, 50), pos=self.box_rects[0].topleft, default="Input username...")
+        self.pass_box = sgc.InputBox((300, 50), pos=self.box_rects[1].topleft, default="Input password...")
+        menu = pg.Surface((600, 400)).convert_alpha()
+        menu.fill((*Tools.BLACK, 150))
+
+        font = Tools.FONT.get("kenvector_future_thin", 50)
+        title = Tools.TEXT.render(font, "Login", Tools.SPACE_GREY)
+        menu.blit(title, (600 // 2 - title.get_width() // 2, 20))
+        pg.draw.line(menu, Tools.SPACE_GREY, (600 // 2 - title.get_width() - 20, 80), (600 // 2 + title.get_width() + 20, 80), 7)
+        self.menu = Tools.Image(menu, center=Tools.SCREEN_RECT.center)
         
-        font = pg.font.Font(Tools.FONTS["kenvector_future_thin"], 20)
+        font = Tools.FONT.get("kenvector_future_thin", 20)
         self.buttons = [[Tools.NamedBtn("Login", Tools.SCREEN_RECT.centerx - 300 + 110, Tools.SCREEN_RECT.centery + 150, "Login", font, Tools.SPACE_GREY, Tools.BLACK, 0, 120),
                         Tools.NamedBtn("Register", Tools.SCREEN_RECT.centerx + 300 - 60 - 50, Tools.SCREEN_RECT.centery + 150, "Register", font, Tools.SPACE_GREY, Tools.BLACK, 0, 120)]]
 
     def startup(self, persistent, current_time):
         super().startup(persistent, current_time)
-        self.old_screen = pg.display.get_surface().copy()
         self.pass_box.add(1, False, 2)
         self.user_box.add(0, False, 2)
         self.player = self.persist["P#"]
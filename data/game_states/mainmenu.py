@@ -4,24 +4,32 @@ import os
 from .. import Tools
 
 
-class MainMenu(Tools.State):
+class MainMenu(Tools.MenuState):
     def __init__(self):
         super().__init__()
         self.next_state = "CHARSELECT"
 
-        self.font = pg.font.Font(Tools.FONTS["kenvector_future"], 40)
+        self.font = Tools.FONT.get("kenvector_future", 40)
 
-        self.choice_names = ["PLAY", "STATS", "QUIT"]
+        self.choice_names = ["PLAY", "VS CPU", "STATS", "QUIT"]
 
         self.create_menu()
 
         self.pointer = Tools.MenuPointer(Tools.SPACE_GREY, self.buttons)
+
+        self.ui.add(self.logo_image, self.menu, *self.buttons[0], self.pointer)
  
     def get_event(self, event):
         if event.type in [pg.KEYDOWN, pg.KEYUP] and event.key in Tools.PLAYER1_CONTROLS:
             if event.type == pg.KEYUP and Tools.PLAYER1_CONTROLS[event.key] == "LIGHT":
                 btn = self.pointer.click()
                 if btn == "play":
+                    self.persist["CPU"] = None
+                    self.next_state = "CHARSELECT"
+                    self.wrap = self.fade_wrapper(self.fade_outs)
+                elif btn == "vs cpu":
+                    # player 2 is left to the cpu, at the level given on the command line
+                    self.persist["CPU"] = {2: self.persist.get("CPU_LEVEL", "normal")}
                     self.next_state = "CHARSELECT"
                     self.wrap = self.fade_wrapper(self.fade_outs)
                 elif btn == "stats":
@@ -43,20 +51,14 @@ class MainMenu(Tools.State):
         try:
             self.fade_caller()
         except TypeError:
-            self.pointer.update()
-            self.draw(surface)
-
-    def draw(self, surface):
-        surface.blit(self.bg, (0, 0))
-        surface.blit(self.logo, self.logo_rect)
-        surface.blit(self.menu, (0, Tools.SCREEN_RECT.centery - 15))
-        for choice in self.buttons[0]:
-            choice.draw(surface)
-        self.pointer.draw(surface)
-        
+            self.ui.update()
+
     def create_menu(self):
-        self.menu = pg.Surface((Tools.SCREEN_RECT.w, 300)).convert_alpha()
-        self.menu.fill((0, 0, 0, 116))
+        # the logo ends up where logo_anim leaves it
+        self.logo_image = Tools.Image(None, center=(Tools.SCREEN_RECT.centerx, Tools.SCREEN_RECT.centery - 15 * 15))
+        menu = pg.Surface((Tools.SCREEN_RECT.w, 70 * len(self.choice_names) + 90)).convert_alpha()
+        menu.fill((0, 0, 0, 116))
+        self.menu = Tools.Image(menu, topleft=(0, Tools.SCREEN_RECT.centery - 15))
 
         self.buttons = [[]]
         x_offset = Tools.SCREEN_RECT.centerx
@@ -66,8 +68,11 @@ class MainMenu(Tools.State):
             self.buttons[0].append(Tools.NamedBtn(name.lower(), x_offset, y_offset + ((i + 1) * 70), name, self.font, Tools.SPACE_GREY, Tools.BLACK, 0, Tools.SCREEN_SIZE[0]))
 
     def logo_anim(self):
-        for j in range(15):
-            self.logo_rect.centery -= 15
+        '''slides the logo 225 pixels up over 250ms'''
+        start = self.logo_rect.centery
+        steps = Tools.updates(250)
+        for j in range(steps):
+            self.logo_rect.centery = start - 225 * (j + 1) // steps
             Tools.SCREEN.blit(self.bg, (0, 0))
             Tools.SCREEN.blit(self.logo, self.logo_rect)
             yield
@@ -78,3 +83,8 @@ class MainMenu(Tools.State):
         self.wrap = self.fade_wrapper(self.fade_ins)
         self.pointer.index.x = 0
         self.logo_rect = self.logo.get_rect(center=Tools.SCREEN_RECT.center)
+        self.logo_image.set(self.logo)
+
+    def cleanup(self):
+        self.logo_image.set(None)
+        return super().cleanup()
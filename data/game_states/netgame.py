@@ -0,0 +1,74 @@
+import pygame as pg
+
+from .. import Tools
+from .. import Netplay
+from .game import GameState
+
+
+# a two player fight against someone on another machine, run through a rollback session. the local
+# player always plays on player 1's keys whichever side of the stage they are on
+class NetGame(GameState):
+    def __init__(self):
+        super().__init__()
+        self.higher_state = None  # the fight can't be paused while the other side keeps playing
+        self.record_replays = False  # rollbacks rewrite updates the recorder has already seen
+        self.keyboard = Tools.Buttons(Tools.CONTROLS[0])
+        self.session = None
+        self.over_time = None
+
+    def get_event(self, event):
+        if event.type == pg.KEYUP and event.key == pg.K_ESCAPE and self.wrap is None:
+            self.leave()
+
+    def leave(self):
+        '''drops the connection and goes back to the main menu'''
+        self.session.close()
+        self.persist["EXIT_NOSAVE"] = True
+        self.next_state = "MAINMENU"
+        self.wrap = self.fade_wrapper(self.fade_outs)
+
+    def update(self, surface, keys, current_time, delta_time):
+        try:
+            self.fade_caller()
+        except TypeError:
+            if self.session.disconnected and self.over_time is None:
+                print("netplay opponent left")
+                self.leave()
+                return
+
+            # updates keep going, with nothing left to simulate, until the last one of the fight is confirmed
+            # so an end that is rolled back still plays out
+            self.session.advance(self.keyboard.pack(keys))
+            if self.end_game and self.session.confirmed >= self.end_frame():
+                if self.over_time is None:
+                    self.over_time = current_time
+                elif current_time - self.over_time > 2000:
+                    self.next_state = "ENDSCREEN"
+                    self.wrap = self.fade_wrapper(self.fade_outs)
+            self.update_infos(delta_time)
+
+    def step(self, inputs, current_time, delta_time):
+        if not self.end_game:
+            super().step(inputs, current_time, delta_time)
+
+    def end_frame(self):
+        '''the update the fight ended on'''
+        return round(self.end_time / self.session.step) - 1
+
+    def startup(self, persistent, current_time):
+        '''persistent["NET"] holds the connection from Netplay.host or Netplay.join'''
+        connection = persistent["NET"]
+        persistent["CHARS"] = [Tools.CHARS[name] for name in connection["CHARS"]]
+        persistent["TEAMS"] = None
+        persistent["CPU"] = None
+        super().startup(persistent, current_time)
+        self.current_time = 0.0  # both sides count match time from the first update
+        self.over_time = None
+        self.session = Netplay.RollbackSession(self, connection)
+
+    def cleanup(self):
+        if not self.session.disconnected:
+            self.session.close()
+        self.session = None
+        del self.persist["NET"]
+        return super().cleanup()
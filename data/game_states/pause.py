@@ -4,14 +4,12 @@ import os
 from .. import Tools
 
 
-class PauseMenu(Tools.State):
+class PauseMenu(Tools.OverlayState):
     def __init__(self):
         super().__init__()
         self.next_state = "ENDSCREEN"
-        self.trans_bg = pg.Surface(Tools.SCREEN_SIZE).convert_alpha()
-        self.trans_bg.fill((0, 0, 0, 50))
 
-        self.font = pg.font.Font(Tools.FONTS["kenvector_future"], 40)
+        self.font = Tools.FONT.get("kenvector_future", 40)
 
         self.choice_names = ["BACK", "EXIT"]
 
@@ -19,7 +17,7 @@ class PauseMenu(Tools.State):
 
         self.cursor = Tools.MenuPointer(Tools.SPACE_GREY, self.choices)
 
-        self.dalpha = 15
+        self.ui.add(self.menu, *self.choices[0], self.cursor)
 
     def get_event(self, event):
         if event.type in [pg.KEYUP, pg.KEYDOWN] and (
@@ -42,29 +40,13 @@ class PauseMenu(Tools.State):
                     self.cursor.index.x += 1
 
     def update(self, surface, keys, current_time, delta_time):
-        self.cursor.update()
-        self.draw(surface)
-
-    def draw(self, surface):
-        surface.blit(self.old_screen, (0, 0))
-        surface.blit(self.trans_bg, (0, 0))
-        surface.blit(
-            self.menu_background,
-            self.menu_background.get_rect(
-                center=(Tools.SCREEN_SIZE[0] // 2, Tools.SCREEN_SIZE[1] // 2)
-            ),
-        )
-
-        for choice in self.choices[0]:
-            choice.draw(surface)
-
-        self.cursor.draw(surface)
+        self.ui.update()
 
     def create_menu(self):
         self.menu_background = pg.Surface((500, 350)).convert_alpha()
         self.menu_background.fill((0, 0, 0, 200))
 
-        self.title = self.font.render("PAUSED", True, Tools.SPACE_GREY).convert_alpha()
+        self.title = Tools.TEXT.render(self.font, "PAUSED", Tools.SPACE_GREY).convert_alpha()
         title_rect = self.title.get_rect(
             midtop=(self.menu_background.get_rect().centerx, self.menu_background.get_rect().top + 20))
         self.menu_background.blit(self.title, title_rect)
@@ -76,6 +58,7 @@ class PauseMenu(Tools.State):
             2,
         )
         pg.draw.rect(self.menu_background, Tools.SPACE_GREY, line_rect)
+        self.menu = Tools.Image(self.menu_background, center=Tools.SCREEN_RECT.center)
 
         self.choices = [[]]
         x_offset = Tools.SCREEN_RECT.centerx
@@ -86,5 +69,4 @@ class PauseMenu(Tools.State):
 
     def startup(self, persistent, current_time):
         super().startup(persistent, current_time)
-        self.old_screen = pg.display.get_surface().copy()
         self.cursor.index.x = 0
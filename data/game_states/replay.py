@@ -0,0 +1,88 @@
+import pygame as pg
+
+from .. import Tools
+from .. import Replay
+from .game import GameState
+
+SPEEDS = (1, 2, 4, 10, 20)  # updates simulated per tick at each playback speed
+SEEK_FRAMES = 300  # how far the arrow keys jump
+
+
+# plays back a recorded match. the fight is re-simulated from the recorded input rather than stored as video
+class ReplayViewer(GameState):
+    def __init__(self):
+        super().__init__()
+        self.next_state = "MAINMENU"
+        self.higher_state = None
+        self.record_replays = False
+        self.small_font = Tools.FONT.get("kenvector_future_thin", 20)
+
+    def get_event(self, event):
+        if event.type == pg.KEYDOWN:
+            if event.key == pg.K_ESCAPE:
+                self.wrap = self.fade_wrapper(self.fade_outs)
+            elif event.key == pg.K_SPACE:
+                self.paused = not self.paused
+            elif event.key == pg.K_RIGHT:
+                self.seek(self.frame + SEEK_FRAMES)
+            elif event.key == pg.K_LEFT:
+                self.seek(self.frame - SEEK_FRAMES)
+            elif event.key == pg.K_HOME:
+                self.seek(0)
+            elif event.key == pg.K_UP:
+                self.speed = min(self.speed + 1, len(SPEEDS) - 1)
+            elif event.key == pg.K_DOWN:
+                self.speed = max(self.speed - 1, 0)
+
+    def update(self, surface, keys, current_time, delta_time):
+        try:
+            self.fade_caller()
+        except TypeError:
+            if not self.paused:
+                for _ in range(SPEEDS[self.speed]):
+                    if self.frame >= self.replay.frames:
+                        break
+                    self.play_frame()
+            self.update_infos(delta_time)
+
+    def play_frame(self):
+        self.match_time = self.replay.times.get(self.frame, self.match_time + self.replay.step)
+        self.step(self.replay.input_at(self.frame), self.match_time, self.replay.step)
+        self.frame += 1
+
+    def seek(self, frame):
+        '''jumps to any frame by restoring the keyframe before it and simulating at most one keyframe
+        interval forward, so the cost does not depend on how far into the match the frame is'''
+        frame = max(0, min(frame, self.replay.frames))
+        key_frame, self.match_time, snapshot = self.replay.keyframe_before(frame)
+        self.restore(snapshot)
+        self.frame = key_frame
+        while self.frame < frame:
+            self.play_frame()
+
+    def draw(self, surface):
+        seconds = self.frame * self.replay.step / 1000
+        length = self.replay.frames * self.replay.step / 1000
+        speed = "PAUSED" if self.paused else "x%d" % SPEEDS[self.speed]
+        text = "REPLAY  %s  %.1fs / %.1fs" % (speed, seconds, length)
+        if text != self.info_text:
+            self.info_text = text
+            self.info_bar.image = self.small_font.render(text, True, Tools.SPACE_GREY)
+            self.info_bar.rect = self.info_bar.image.get_rect(midbottom=(Tools.SCREEN_RECT.centerx, Tools.SCREEN_RECT.bottom - 20))
+            self.info_bar.dirty = 1
+        return super().draw(surface)
+
+    def startup(self, persistent, current_time):
+        self.replay = Replay.Replay.load(persistent["REPLAY"])
+        persistent["CHARS"] = [Tools.CHARS[name] for name in self.replay.chars]
+        persistent["TEAMS"] = self.replay.teams
+        persistent["CPU"] = None  # the recorded inputs play everyone back
+        super().startup(persistent, current_time)
+        self.speed = 0
+        self.paused = False
+        self.info_text = None
+        self.info_bar = pg.sprite.DirtySprite()
+        self.info_bar.image = pg.Surface((0, 0))
+        self.info_bar.rect = pg.Rect(0, 0, 0, 0)
+        self.sprites.add(self.info_bar, layer=4)
+        self.seek(0)
@@ -4,11 +4,16 @@ import os
 from .. import Tools
 
 
-class StatsMenu(Tools.State):
+class StatsMenu(Tools.MenuState):
     def __init__(self):
         super().__init__()
         self.next_state = "MAINMENU"
 
+        # the panels are made in startup and filled in once someone logs in, which repaints the screen
+        self.panel_image = Tools.Image(None, topleft=(40, 40))
+        self.board_image = Tools.Image(None, topleft=(Tools.SCREEN_SIZE[0] - 600 - 40, 40))
+        self.ui.add(self.panel_image, self.board_image)
+
     def get_event(self, event):
         if event.type in [pg.KEYDOWN, pg.KEYUP] and event.key in Tools.PLAYER1_CONTROLS:
             if event.type == pg.KEYUP and Tools.PLAYER1_CONTROLS[event.key] == "JUMP":
@@ -22,27 +27,21 @@ class StatsMenu(Tools.State):
                 self.persist["P#"] = 1
                 self.higher_state = "LOGIN"
                 self.suspend = True
-            self.draw(surface)
             
-    def draw(self, surface):
-        surface.blit(self.bg, (0, 0))
-        surface.blit(self.panel, (40, 40))
-        surface.blit(self.board, (Tools.SCREEN_SIZE[0] - 600 - 40, 40))
-    
     def create_stats_panel(self):
         stats = Tools.MASTER_DB.get_user_stats(self.user).fetchone()
         self.panel.fill((*Tools.BLACK, 200))
     
-        font = pg.font.Font(Tools.FONTS["kenvector_future_thin"], 40)
-        title = font.render("STATS", True, Tools.SPACE_GREY)
+        font = Tools.FONT.get("kenvector_future_thin", 40)
+        title = Tools.TEXT.render(font, "STATS", Tools.SPACE_GREY)
         self.panel.blit(title, title.get_rect(center=(400 // 2, 30)))
 
         pg.draw.line(self.panel, Tools.SPACE_GREY, (400 // 2 - title.get_width(), 20 + title.get_height()), (400 // 2 + title.get_width(), 20 + title.get_height()), 7)
-        font = pg.font.Font(Tools.FONTS["kenvector_future_thin"], 32)
-        user_name = font.render(stats[7].upper(), True, Tools.SPACE_GREY)
+        font = Tools.FONT.get("kenvector_future_thin", 32)
+        user_name = Tools.TEXT.render(font, stats[7].upper(), Tools.SPACE_GREY)
         self.panel.blit(user_name, (50, 100))
 
-        font = pg.font.Font(Tools.FONTS["kenvector_future_thin"], 25)
+        font = Tools.FONT.get("kenvector_future_thin", 25)
         stat_names = "wins, losses, draws, highscore, date, max combo, total games"
         for i, (name, stat) in enumerate(zip(stat_names.split(", "), stats)):
             text = Tools.Text(50, 150 + (i * 50), name.upper() + ": " + str(stat), font, Tools.SPACE_GREY)
@@ -51,15 +50,15 @@ class StatsMenu(Tools.State):
     def create_leader(self):
         self.board.fill((*Tools.BLACK, 200))
 
-        font = pg.font.Font(Tools.FONTS["kenvector_future_thin"], 40)
-        title = font.render("LEADERBOARD", True, Tools.SPACE_GREY)
+        font = Tools.FONT.get("kenvector_future_thin", 40)
+        title = Tools.TEXT.render(font, "LEADERBOARD", Tools.SPACE_GREY)
         self.board.blit(title, title.get_rect(center=(600 // 2, 30)))
         pg.draw.line(self.board, Tools.SPACE_GREY, (600 // 2 - title.get_width() + 40, 20 + title.get_height()), (600 // 2 + title.get_width() - 40, 20 + title.get_height()), 7)
         
-        font = pg.font.Font(Tools.FONTS["kenvector_future_thin"], 25)
+        font = Tools.FONT.get("kenvector_future_thin", 25)
         for i, row in enumerate(Tools.MASTER_DB.get_leaderboard()):
-            text = font.render(row[0] + ": " + str(row[1]), True, Tools.SPACE_GREY)
-            date = font.render(str(row[2]), True, Tools.SPACE_GREY)
+            text = Tools.TEXT.render(font, row[0] + ": " + str(row[1]), Tools.SPACE_GREY)
+            date = Tools.TEXT.render(font, str(row[2]), Tools.SPACE_GREY)
             self.board.blit(text, (40, 100 + (i * 30)))
             self.board.blit(date, (600 - date.get_width() - 40, 100 + (i * 30)))
 
@@ -71,6 +70,8 @@ class StatsMenu(Tools.State):
         self.panel.fill((*Tools.BLACK, 0))
         self.board = pg.Surface((600, 880)).convert_alpha()
         self.board.fill((*Tools.BLACK, 0))
+        self.panel_image.set(self.panel)
+        self.board_image.set(self.board)
 
     def resume(self, persistent, current_time):
         super().resume(persistent, current_time)
@@ -4,15 +4,17 @@ import os
 from .. import Tools
 
 
-class TitleScreen(Tools.State):
+class TitleScreen(Tools.MenuState):
     def __init__(self):
         super().__init__()
 
         self.next_state = "MAINMENU"
-        font = pg.font.Font(Tools.FONTS["kenvector_future"], 30)
+        font = Tools.FONT.get("kenvector_future", 30)
         self.game_start = Tools.Label(Tools.SCREEN_RECT.centerx, Tools.SCREEN_RECT.centery + 150, 250, 100, "GAME START", font, Tools.SPACE_GREY, centred=True, blink=True)
         self.fade_outs = [self.screen_fade_out()]
         self.wrap = None
+        self.logo_image = Tools.Image(self.logo, center=Tools.SCREEN_RECT.center)  # also shown without startup
+        self.ui.add(self.logo_image, self.game_start)
 
     def get_event(self, event):
         if event.type == pg.KEYUP and event.key == pg.K_RETURN:
@@ -25,10 +27,12 @@ class TitleScreen(Tools.State):
         except Tools.FinishFadeOut:
             self.done = True
         except TypeError:
-            self.game_start.update()
-            self.draw(surface)
+            self.ui.update()
 
-    def draw(self, surface):
-        surface.blit(self.bg, (0, 0))
-        surface.blit(self.logo, self.logo.get_rect(center=Tools.SCREEN_RECT.center))
-        self.game_start.draw(surface)
+    def startup(self, persistent, current_time):
+        super().startup(persistent, current_time)
+        self.logo_image.set(self.logo)
+
+    def cleanup(self):
+        self.logo_image.set(None)
+        return super().cleanup()